@@ -0,0 +1,183 @@
+"""Batch endpoint: several API calls in one round trip.
+
+``POST /api/batch/`` with::
+
+    {"requests": [{"id": "me", "method": "GET", "path": "/api/auth/me/"},
+                  {"method": "POST", "path": "/api/posts/1/like/", "body": {...}}],
+     "parallel": true}
+
+returns ``{"responses": [{"id", "status", "headers", "body"}, ...]}`` in
+request order. Sub-requests are resolved with the URL resolver and run
+in-process with the caller's session, user and CSRF state, so they need
+no extra authentication. Without ``parallel`` they run one after another
+on the request's own database connection. With it, each run of consecutive
+GET/HEAD sub-requests is spread over a small thread pool (each thread uses
+its own connection), while writes still run in order.
+"""
+
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUESTS = 20
+MAX_WORKERS = 4
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'}
+SAFE_METHODS = {'GET', 'HEAD'}
+# Request headers a sub-request may set; everything else comes from the batch request.
+FORWARDED_HEADERS = {'accept', 'if-none-match', 'if-modified-since'}
+# Response headers copied into each result.
+RETURNED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Location')
+
+
+def _parse(item):
+    """Validate one sub-request spec; returns ``(spec, error)``."""
+    if not isinstance(item, dict):
+        return None, 'Each request must be an object'
+    method = str(item.get('method') or 'GET').upper()
+    path = item.get('path')
+    if method not in METHODS:
+        return None, f'Unsupported method: {method}'
+    if not isinstance(path, str) or not path.startswith('/'):
+        return None, 'path must be an absolute path such as /api/posts/'
+    headers = item.get('headers') or {}
+    if not isinstance(headers, dict) or set(map(str.lower, headers)) - FORWARDED_HEADERS:
+        return None, f"headers may only set: {', '.join(sorted(FORWARDED_HEADERS))}"
+    return {'id': item.get('id'), 'method': method, 'path': path, 'body': item.get('body'), 'headers': headers}, None
+
+
+def _sub_request(outer, spec):
+    url = urlsplit(spec['path'])
+    sub = HttpRequest()
+    sub.method = spec['method']
+    sub.path = sub.path_info = url.path
+    sub.META = {
+        key: value for key, value in outer.META.items()
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH') and not key.startswith('wsgi.')
+    }
+    sub.META.update(REQUEST_METHOD=sub.method, QUERY_STRING=url.query, PATH_INFO=url.path)
+    for name, value in spec['headers'].items():
+        sub.META['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    sub.GET = QueryDict(url.query)
+    sub.COOKIES = outer.COOKIES
+    sub.session = outer.session
+    sub.user = outer.user
+    # The batch request itself already passed the CSRF check.
+    sub._dont_enforce_csrf_checks = True
+    body = b'' if spec['body'] is None else json.dumps(spec['body']).encode('utf-8')
+    sub.META.update(CONTENT_TYPE='application/json', CONTENT_LENGTH=str(len(body)))
+    sub._stream = io.BytesIO(body)
+    sub._read_started = False
+    return sub
+
+
+def _result(spec, status, body, headers=None):
+    return {'id': spec['id'], 'status': status, 'headers': headers or {}, 'body': body}
+
+
+def _dispatch(outer, spec):
+    sub = _sub_request(outer, spec)
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return _result(spec, 404, {'detail': 'Not found.'}), sub
+    if match.func is batch_view:
+        return _result(spec, 400, {'detail': 'Batches cannot be nested.'}), sub
+    if iscoroutinefunction(match.func):
+        # Async views (the live stream) need the event loop, not a batch worker.
+        return _result(spec, 400, {'detail': 'Async endpoints cannot be batched.'}), sub
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if getattr(response, 'streaming', False):
+            response.close()
+            return _result(spec, 400, {'detail': 'Streaming endpoints cannot be batched.'}), sub
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        headers = {name: response[name] for name in RETURNED_HEADERS if response.has_header(name)}
+        body = None
+        if response.content:
+            text = response.content.decode(response.charset or 'utf-8', errors='replace')
+            body = json.loads(text) if 'json' in headers.get('Content-Type', '') else text
+    except Http404:
+        return _result(spec, 404, {'detail': 'Not found.'}), sub
+    except PermissionDenied:
+        return _result(spec, 403, {'detail': 'Permission denied.'}), sub
+    except Exception as exc:  # noqa: BLE001
+        # One failing call must not take the rest of the batch down with it.
+        logger.exception("[batch] path=%s error=%s", sub.path, exc)
+        return _result(spec, 500, {'error': 'server_error', 'detail': 'Internal error'}), sub
+    return {**_result(spec, response.status_code, body, headers), 'cookies': response.cookies}, sub
+
+
+def _dispatch_in_thread(outer, spec):
+    try:
+        return _dispatch(outer, spec)
+    finally:
+        # Worker threads open their own connections; don't leak them.
+        connections.close_all()
+
+
+def _groups(specs, parallel):
+    """Split into runs: consecutive reads form one run when ``parallel``, everything else runs alone."""
+    run = []
+    for spec in specs:
+        if parallel and spec['method'] in SAFE_METHODS:
+            run.append(spec)
+            continue
+        if run:
+            yield run
+            run = []
+        yield [spec]
+    if run:
+        yield run
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch_view(request):
+    """Run up to ``MAX_REQUESTS`` API calls in one request (see the module docstring)."""
+    items = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({'detail': 'requests must be a non-empty list'}, status=400)
+    if len(items) > MAX_REQUESTS:
+        return Response({'detail': f'At most {MAX_REQUESTS} requests per batch'}, status=400)
+    specs = []
+    for index, item in enumerate(items):
+        spec, error = _parse(item)
+        if error:
+            return Response({'detail': f'requests[{index}]: {error}'}, status=400)
+        specs.append(spec)
+
+    outer = request._request
+    outer.user = request.user
+    results = []
+    for run in _groups(specs, bool(request.data.get('parallel'))):
+        if len(run) == 1:
+            result, sub = _dispatch(outer, run[0])
+            # A sub-request may log in or out, or rotate the CSRF token; later ones see it.
+            outer.user = sub.user
+            for key in ('CSRF_COOKIE', 'CSRF_COOKIE_NEEDS_UPDATE'):
+                if key in sub.META:
+                    outer.META[key] = sub.META[key]
+            results.append(result)
+            continue
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(run))) as pool:
+            results.extend(result for result, _ in pool.map(lambda spec: _dispatch_in_thread(outer, spec), run))
+
+    response = Response({'responses': [{k: v for k, v in r.items() if k != 'cookies'} for r in results]})
+    for result in results:
+        for morsel in result.get('cookies', {}).values():
+            response.cookies[morsel.key] = morsel
+    return response
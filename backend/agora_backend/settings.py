@@ -155,6 +155,39 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# === Background tasks ===
+# core.tasks runs fan-out work on a small in-process thread pool after commit.
+CORE_TASK_WORKERS = int(os.getenv('CORE_TASK_WORKERS', 2))
+CORE_TASKS_ALWAYS_EAGER = os.getenv('CORE_TASKS_ALWAYS_EAGER', 'False').strip().lower() == 'true'
+# Number of recent posts copied into a timeline when a user signs up or joins a circle
+TIMELINE_BACKFILL_LIMIT = int(os.getenv('TIMELINE_BACKFILL_LIMIT', 500))
+# Chat messages move a circle's directory activity at most once per this many seconds
+CIRCLE_ACTIVITY_RESOLUTION_SECONDS = int(os.getenv('CIRCLE_ACTIVITY_RESOLUTION_SECONDS', 60))
+
+# === Caching ===
+# Seconds a shared (viewer-independent) post representation stays in the cache.
+# Entries are keyed by the post's version stamp, so writes invalidate them anyway.
+POST_REPRESENTATION_CACHE_TIMEOUT = int(os.getenv('POST_REPRESENTATION_CACHE_TIMEOUT', 300))
+# Seconds a reader's circle-id set stays cached (keyed by a version bumped on join/leave).
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv('MEMBERSHIP_CACHE_TIMEOUT', 600))
+# Buffer likes in the cache and apply them in batches (core.like_buffer). Needs a
+# cache shared by every process, e.g. Redis, when more than one serves requests.
+LIKE_WRITE_BEHIND = os.getenv('LIKE_WRITE_BEHIND', 'False').strip().lower() == 'true'
+# Seconds between background flushes of the like buffer; 0 leaves it to `flush_like_buffer`.
+LIKE_FLUSH_SECONDS = float(os.getenv('LIKE_FLUSH_SECONDS', 2))
+
+# === Realtime chat ===
+# Pub/sub broker behind circle chat WebSockets and live post updates (core.pubsub):
+# empty for in-process delivery (a single ASGI worker), or a redis:// URL shared by
+# every worker.
+CHAT_PUBSUB_URL = os.getenv('CHAT_PUBSUB_URL', '').strip()
+
+# === Live post updates ===
+# Server-Sent Events at /api/live/ (core.live): updates are coalesced into one
+# frame per tick, and idle streams get a heartbeat comment this often.
+LIVE_TICK_SECONDS = float(os.getenv('LIVE_TICK_SECONDS', '1'))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv('LIVE_HEARTBEAT_SECONDS', '15'))
+
 # === Default Primary Key ===
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
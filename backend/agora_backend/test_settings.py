@@ -13,3 +13,6 @@ DATABASES = {
 
 # Keep debug on for easier failure inspection
 DEBUG = True
+
+# Run background tasks (timeline fan-out, ...) inline so tests see their effects.
+CORE_TASKS_ALWAYS_EAGER = True
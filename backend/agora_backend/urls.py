@@ -8,11 +8,15 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.routers import DefaultRouter
 
-from backend.core.models import Comment, Post, Report
-from backend.core.views import PostViewSet
+from backend.core import membership, versions
+from backend.core.models import Circle, Comment, Message, Post, Report
+from backend.core.pagination import CIRCLE_ORDERINGS, CirclePagination, MessagePagination
+from backend.core.serializers import MessageSerializer
+from backend.core.views import PostViewSet, autocomplete_view, leaderboard_view, live_view, search_view
 
 from .abtest_views import abtest_view
 from .auth_views import debug_cookies_view, get_csrf_token, health_view, login_view, logout_view, me_view, register_view
+from .batch_views import batch_view
 
 
 @api_view(['POST'])
@@ -108,13 +112,24 @@ def favicon_view(request):
 def users_view(request, user_id=None):
     return Response({'detail': 'User endpoint not implemented'}, status=404)
 
+def _circles_versions(request, circle_id=None):
+    if circle_id is not None:
+        return None
+    keys = [versions.CIRCLES]
+    if request.user and request.user.is_authenticated:
+        keys.append(versions.member_key(request.user.id))
+    return keys
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@versions.conditional(_circles_versions)
 def circles_view(request, circle_id=None):
     """Simple circles API: list circles, join and leave actions.
 
     Routes wired in urls.py:
-      GET  /api/circles/                 -> list circles
+      GET  /api/circles/                 -> list circles (?name=, ?sort=name|size|activity,
+                                            ?cursor=/?page_size= for keyset pages)
       POST /api/circles/<id>/join/       -> join circle (auth required)
       POST /api/circles/<id>/leave/      -> leave circle (auth required)
 
@@ -123,23 +138,34 @@ def circles_view(request, circle_id=None):
     """
     from backend.core.models import Circle, CircleMembership
 
-    # LIST: /api/circles/
+    # LIST: /api/circles/ -- one query for the page (plus the cached membership set)
     if request.method == 'GET' and circle_id is None:
+        params = request.query_params
         circles = Circle.objects.all()
+        name = (params.get('name') or '').strip()
+        if name:
+            circles = circles.filter(name__icontains=name)
+        ordering = CIRCLE_ORDERINGS.get(params.get('sort'), CIRCLE_ORDERINGS['name'])
+        circles = circles.order_by(*ordering)
+
+        paginator = CirclePagination()
+        paginated = paginator.cursor_query_param in params or paginator.page_size_query_param in params
+        if paginated:
+            paginator.ordering = ordering
+            circles = paginator.paginate_queryset(circles, request)
+
+        member_of = membership.circle_ids(request)
         results = []
         for c in circles:
-            member_count = CircleMembership.objects.filter(circle=c).count()
-            is_member = False
-            if request.user and getattr(request.user, 'is_authenticated', False):
-                is_member = CircleMembership.objects.filter(circle=c, user=request.user).exists()
             results.append({
                 'id': c.id,
                 'name': c.name,
                 'description': c.description,
-                'member_count': member_count,
-                'is_member': is_member,
+                'member_count': c.member_count,
+                'is_member': c.id in member_of,
+                'last_activity_at': c.last_activity_at,
             })
-        return Response(results)
+        return paginator.get_paginated_response(results) if paginated else Response(results)
 
     # JOIN / LEAVE actions require a circle_id
     if circle_id is None:
@@ -165,6 +191,29 @@ def circles_view(request, circle_id=None):
     else:
         return Response({'detail': 'Unsupported action'}, status=400)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def circle_messages_view(request, circle_id=None):
+    """Circle chat history: ``GET /api/circles/<id>/messages/[?before=<cursor>][&page_size=N]``.
+
+    Newest first, ``MessagePagination.page_size`` per page; follow ``next``
+    (which carries ``before``) to scroll back. Each page is one range scan of
+    ``core_message_circle_idx``. Members (and staff) only; anonymous senders
+    are redacted as on posts. New messages arrive over the chat WebSocket.
+    """
+    if not request.user or not request.user.is_authenticated:
+        return Response({'detail': 'Authentication required'}, status=401)
+    if not Circle.objects.filter(pk=circle_id).exists():
+        return Response({'detail': 'Circle not found'}, status=404)
+    if circle_id not in membership.circle_ids(request) and not request.user.is_staff:
+        return Response({'detail': 'Only members can read this circle\'s messages.'}, status=403)
+
+    paginator = MessagePagination()
+    page = paginator.paginate_queryset(Message.objects.filter(circle_id=circle_id).select_related('user'), request)
+    serializer = MessageSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('favicon.ico', favicon_view, name='favicon'),
@@ -181,8 +230,14 @@ urlpatterns = [
     path('api/circles/', circles_view, name='circles-list'),
     path('api/circles/<int:circle_id>/join/', circles_view, name='circle-join'),
     path('api/circles/<int:circle_id>/leave/', circles_view, name='circle-leave'),
+    path('api/circles/<int:circle_id>/messages/', circle_messages_view, name='circle-messages'),
     path('api/posts/<int:post_id>/report/', report_post_view, name='report-post'),
     path('api/comments/<int:comment_id>/report/', report_comment_view, name='report-comment'),
+    path('api/search/', search_view, name='search'),
+    path('api/autocomplete/', autocomplete_view, name='autocomplete'),
+    path('api/leaderboard/', leaderboard_view, name='leaderboard'),
+    path('api/live/', live_view, name='live'),
+    path('api/batch/', batch_view, name='batch'),
     path('api/reports/', reports_admin_view, name='reports-admin'),
     path('api/reports/<int:report_id>/action/', reports_admin_view, name='report-action'),
     path('api/', include(router.urls)),
@@ -84,10 +84,12 @@ export const register = async (data) => {
   const res = await API.post('auth/register/', data);
   return res.data;
 };
-// fetchPosts supports pagination: page (1-based) and optional page_size
-export const fetchPosts = (type, page = 1, page_size = 10, circleId = null) => {
-  let url = `posts/?feed=${type}&page=${page}&page_size=${page_size}`;
+// fetchPosts supports cursor pagination: pass the `cursor` from the previous
+// page's `next` link (null for the first page) and an optional page_size
+export const fetchPosts = (type, cursor = null, page_size = 10, circleId = null) => {
+  let url = `posts/?feed=${type}&page_size=${page_size}`;
   if (circleId) url += `&circle=${encodeURIComponent(circleId)}`;
+  if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
   return API.get(url);
 };
 export const createPost = (postData) => {
@@ -119,12 +121,47 @@ export const fetchProfile = (userId) => API.get(`users/${userId}/`).catch(err =>
   throw err;
 });
 export const toggleLike = (postId) => API.post(`posts/${postId}/like/`);
+// Idempotent: safe to retry, unlike toggleLike.
+export const setLike = (postId, liked) =>
+  liked ? API.put(`posts/${postId}/like/`) : API.delete(`posts/${postId}/like/`);
+// Fresh likes/comments counts and liked flags for the posts on screen (up to 300 ids).
+export const fetchPostStates = (ids) => API.get('posts/state/', { params: { ids: ids.join(',') } });
 export const addComment = (postId, data) => API.post(`posts/${postId}/comment/`, data);
+// Full, cursor-paginated comment threads (feed items only carry a preview)
+export const fetchComments = (postId, cursor = null) =>
+  API.get(`posts/${postId}/comments/${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`);
+// The rest of one thread's replies: pass a comment's `replies_next` (then each page's `next`) URL.
+export const fetchReplies = (next) => API.get(next);
+export const searchPosts = (q, limit = 20) => API.get('search/', { params: { q, limit } });
+export const autocomplete = (q, type = null) =>
+  API.get('autocomplete/', { params: type ? { q, type } : { q } });
+// Realtime chat for one circle (members only; the session cookie signs the socket in).
+// Send JSON.stringify({ content, is_anonymous }); receive { type: 'message', message } events.
+export const openCircleChat = (circleId) => {
+  const origin = isDev ? window.location.origin : apiBaseUrl.replace(/\/api\/$/, '');
+  return new WebSocket(`${origin.replace(/^http/, 'ws')}/ws/circles/${circleId}/chat/`);
+};
+// Live counters for the posts on screen and new visible posts, as Server-Sent Events.
+// Listen for 'update' events: { posts: [{ id, likes_count, comments_count, new_comment_ids }], new_posts }.
+export const openLiveUpdates = (postIds) => {
+  const origin = isDev ? window.location.origin : apiBaseUrl.replace(/\/api\/$/, '');
+  return new EventSource(`${origin}/api/live/?ids=${postIds.join(',')}`, { withCredentials: true });
+};
+// Chat history, newest first; pass the previous page's `next` URL to scroll further back.
+export const fetchCircleMessages = (circleId, next = null) =>
+  next ? API.get(next) : API.get(`circles/${circleId}/messages/`);
+// Agora Sparks leaderboard (global, or a circle's when circleId is given) plus the viewer's rank.
+export const fetchLeaderboard = (circleId = null, limit = 20) =>
+  API.get('leaderboard/', { params: circleId ? { circle: circleId, limit } : { limit } });
 
 // Export the underlying axios instance so callers (e.g. src/index.js) can set
 // default headers (CSRF token) when needed. This avoids relying solely on
 // document.cookie which can be brittle in some dev setups.
 export { API };
+// Several API calls in one round trip: requests = [{ id, method, path, body }].
+// Resolves to the list of { id, status, headers, body } results, in order.
+export const batch = (requests, parallel = true) =>
+  API.post('batch/', { requests, parallel }).then(res => res.data.responses);
 export const reportPost = (postId, data) => API.post(`posts/${postId}/report/`, data);
 export const reportComment = (commentId, data) => API.post(`comments/${commentId}/report/`, data);
 export const fetchReports = () => API.get('reports/');
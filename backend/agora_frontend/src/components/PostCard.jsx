@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { toggleLike, deletePost, addComment, reportPost } from '../api';
+import { toggleLike, deletePost, addComment, reportPost, fetchComments, fetchReplies } from '../api';
 
 const PostCard = ({ post, onDelete, onOpen }) => {
   const [liked, setLiked] = useState(Boolean(post.liked));
@@ -12,12 +12,63 @@ const PostCard = ({ post, onDelete, onOpen }) => {
   const [commentText, setCommentText] = useState('');
   const [commentLoading, setCommentLoading] = useState(false);
   const [commentError, setCommentError] = useState('');
-  const [comments, setComments] = useState(post.comments || []);
+  const [comments, setComments] = useState(post.comments || post.comments_preview || []);
+  // Counted locally from here on so it follows the comments this reader adds
+  const [commentsCount, setCommentsCount] = useState(post.comments_count ?? comments.length);
+  // Feed items only include a preview; the full thread is fetched on demand
+  const [showingAll, setShowingAll] = useState(Boolean(post.comments));
+  const [threadLoading, setThreadLoading] = useState(false);
+  const [repliesLoading, setRepliesLoading] = useState(null); // comment id
   const [replyingTo, setReplyingTo] = useState(null); // comment id
   const [replyText, setReplyText] = useState('');
   const [replyLoading, setReplyLoading] = useState(false);
   const [replyError, setReplyError] = useState('');
 
+  const loadAllComments = async (e) => {
+    if (e && e.stopPropagation) e.stopPropagation();
+    setThreadLoading(true);
+    try {
+      const all = [];
+      let cursor = null;
+      do {
+        const res = await fetchComments(post.id, cursor);
+        all.push(...res.data.results);
+        cursor = res.data.next ? new URL(res.data.next, window.location.origin).searchParams.get('cursor') : null;
+      } while (cursor);
+      setComments(all);
+      setShowingAll(true);
+    } catch (err) {
+      console.error('Failed to load comments', err);
+    } finally {
+      setThreadLoading(false);
+    }
+  };
+
+  // Threads only carry their first few replies; `replies_next` pages through the rest
+  const loadMoreReplies = async (e, comment) => {
+    if (e && e.stopPropagation) e.stopPropagation();
+    setRepliesLoading(comment.id);
+    try {
+      const res = await fetchReplies(comment.replies_next);
+      setComments((prev) =>
+        prev.map((c) =>
+          c.id === comment.id
+            ? {
+                ...c,
+                // Skip replies this reader already added locally
+                replies: [...(c.replies || []), ...res.data.results.filter((r) => !(c.replies || []).some((x) => x.id === r.id))],
+                replies_next: res.data.next,
+              }
+            : c
+        )
+      );
+    } catch (err) {
+      console.error('Failed to load replies', err);
+    } finally {
+      setRepliesLoading(null);
+    }
+  };
+
   const onLike = async (e) => {
     if (e && e.stopPropagation) e.stopPropagation();
     if (loading) return;
@@ -175,8 +226,17 @@ const PostCard = ({ post, onDelete, onOpen }) => {
       <div style={{ marginTop: '1.5rem', paddingTop: '1rem', borderTop: '1px solid #f0f0f0' }}>
         <h4 style={{ fontSize: '0.95rem', fontWeight: '600', marginBottom: '1rem', color: '#333', display: 'flex', alignItems: 'center' }}>
           <span style={{ marginRight: '0.5rem' }}>💬</span>
-          Comments {comments.length > 0 && <span style={{ color: '#999', fontWeight: '400', marginLeft: '0.5rem' }}>({comments.length})</span>}
+          Comments {commentsCount > 0 && <span style={{ color: '#999', fontWeight: '400', marginLeft: '0.5rem' }}>({commentsCount})</span>}
         </h4>
+        {!showingAll && commentsCount > comments.length && (
+          <button
+            style={{ fontSize: '0.8rem', color: '#667eea', fontWeight: '500', background: 'none', border: 'none', cursor: 'pointer', padding: '0 0 0.75rem' }}
+            onClick={loadAllComments}
+            disabled={threadLoading}
+          >
+            {threadLoading ? 'Loading comments…' : `View all ${commentsCount} comments`}
+          </button>
+        )}
         {comments.length === 0 && (
           <div style={{ color: '#999', textAlign: 'center', padding: '1rem', fontSize: '0.875rem', fontStyle: 'italic' }}>
             No comments yet. Be the first to comment!
@@ -218,6 +278,15 @@ const PostCard = ({ post, onDelete, onOpen }) => {
                   ))}
                 </div>
               )}
+              {comment.replies_next && (
+                <button
+                  style={{ fontSize: '0.8rem', color: '#667eea', fontWeight: '500', background: 'none', border: 'none', cursor: 'pointer', padding: '0.5rem 0 0 2.5rem' }}
+                  onClick={(e) => loadMoreReplies(e, comment)}
+                  disabled={repliesLoading === comment.id}
+                >
+                  {repliesLoading === comment.id ? 'Loading replies…' : 'View more replies'}
+                </button>
+              )}
               {/* Reply form */}
               {replyingTo === comment.id && (
                 <form
@@ -237,6 +306,7 @@ const PostCard = ({ post, onDelete, onOpen }) => {
                             : c
                         )
                       );
+                      setCommentsCount((n) => n + 1);
                       setReplyText('');
                       setReplyingTo(null);
                     } catch (err) {
@@ -297,6 +367,7 @@ const PostCard = ({ post, onDelete, onOpen }) => {
             try {
               const res = await addComment(post.id, { content: commentText });
               setComments((prev) => [...prev, res.data]);
+              setCommentsCount((n) => n + 1);
               setCommentText('');
             } catch (err) {
               const errorMsg = err.response?.data?.detail || err.response?.data?.message || err.message || 'Failed to post comment';
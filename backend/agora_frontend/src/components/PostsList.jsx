@@ -15,6 +15,8 @@ const PostsList = ({ feedType = 'new', pageSize = 10, reloadSignal = 0, circleId
   const observerInstanceRef = useRef(null);
   // simple lock to prevent multiple simultaneous fetches/increments
   const isFetchingRef = useRef(false);
+  // cursor for the next page, taken from the server's `next` link
+  const nextCursorRef = useRef(null);
 
   const loadPage = useCallback(async (p) => {
     // mark fetching so observer won't trigger another increment
@@ -22,14 +24,15 @@ const PostsList = ({ feedType = 'new', pageSize = 10, reloadSignal = 0, circleId
     setLoading(true);
     setError(null);
     try {
-    const res = await fetchPosts(feedType, p, pageSize, circleId);
+    const res = await fetchPosts(feedType, p === 1 ? null : nextCursorRef.current, pageSize, circleId);
   const payload = res.data;
   // support DRF pagination (payload.results) or plain array
   const data = Array.isArray(payload) ? payload : (payload.results || []);
   if (p === 1) setPosts(data);
   else setPosts((prev) => [...prev, ...data]);
-  const nextExists = !Array.isArray(payload) && !!payload.next;
-  setHasMore(nextExists || data.length === pageSize);
+  const next = Array.isArray(payload) ? null : payload.next;
+  nextCursorRef.current = next ? new URL(next, window.location.origin).searchParams.get('cursor') : null;
+  setHasMore(!!nextCursorRef.current);
     } catch (err) {
       // If the server returns 404 (no such page) stop attempting further pages
       if (err.response && err.response.status === 404) {
@@ -52,10 +52,10 @@ class CircleMembershipAdmin(admin.ModelAdmin):
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'user', 'is_anonymous', 'circle', 'created_at')
+    list_display = ('id', 'title', 'user', 'is_anonymous', 'circle', 'likes_count', 'comments_count', 'created_at')
     list_filter = ('is_anonymous', 'circle')
     search_fields = ('title', 'content', 'user__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'likes_count', 'comments_count')
 
 
 @admin.register(Comment)
@@ -6,3 +6,6 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend.core'
     label = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers receivers)
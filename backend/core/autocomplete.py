@@ -0,0 +1,148 @@
+"""Typeahead suggestions for users and circles.
+
+Users are matched in the database. On PostgreSQL, trigram GIN indexes on
+``UPPER(username)``, ``UPPER(display_name)`` and ``UPPER(program)``
+(migration 0015) serve both the prefix and the substring lookups below.
+Short queries are matched by prefix only, since they contain no complete
+trigram to look up.
+
+Circles are few and read constantly, so they are served from an in-process
+prefix index over the words of each name. Local writes update it on commit
+(core.signals); it is also reloaded every ``RELOAD_SECONDS`` to pick up
+writes made by other processes.
+"""
+
+import bisect
+import re
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Length
+
+from .models import Circle
+
+MIN_QUERY_LENGTH = 1
+MAX_RESULTS = 10
+# Below this length a query has no full trigram, so only prefixes are matched.
+SUBSTRING_MIN_LENGTH = 3
+RELOAD_SECONDS = 60
+
+_USER_FIELDS = ('username', 'display_name', 'program')
+
+
+def _normalize(text):
+    return (text or '').casefold().strip()
+
+
+def suggest_users(query, limit=MAX_RESULTS):
+    """Active users whose username, display name or program matches ``query``.
+
+    Prefix matches on the username come first, then other prefix matches,
+    then substring matches; shorter usernames first within each group.
+    """
+    query = (query or '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    prefix = Q()
+    for field in _USER_FIELDS:
+        prefix |= Q(**{f'{field}__istartswith': query})
+    matches = prefix
+    if len(query) >= SUBSTRING_MIN_LENGTH:
+        for field in _USER_FIELDS:
+            matches |= Q(**{f'{field}__icontains': query})
+    rank = Case(
+        When(username__istartswith=query, then=Value(0)),
+        When(prefix, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    return list(
+        get_user_model().objects.filter(matches, is_active=True)
+        .annotate(match_rank=rank, name_length=Length('username'))
+        .order_by('match_rank', 'name_length', 'username')[:limit]
+    )
+
+
+class CirclePrefixIndex:
+    """Sorted ``(word, circle id)`` pairs for prefix lookups with ``bisect``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._words = []
+        self._loaded_at = None
+
+    def _load(self):
+        self._names = dict(Circle.objects.values_list('id', 'name'))
+        self._words = sorted(
+            (word, circle_id) for circle_id, name in self._names.items() for word in self._split(name)
+        )
+        self._loaded_at = time.monotonic()
+
+    @staticmethod
+    def _split(name):
+        # The full name is indexed too, so multi-word prefixes match.
+        name = _normalize(name)
+        return {name, *re.findall(r'\w+', name)} - {''}
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > RELOAD_SECONDS:
+            self._load()
+
+    def update(self, circle_id, name):
+        """Add or rename one circle."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._remove(circle_id)
+            self._names[circle_id] = name
+            for word in self._split(name):
+                bisect.insort(self._words, (word, circle_id))
+
+    def remove(self, circle_id):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(circle_id)
+
+    def _remove(self, circle_id):
+        name = self._names.pop(circle_id, None)
+        if name is None:
+            return
+        for word in self._split(name):
+            index = bisect.bisect_left(self._words, (word, circle_id))
+            if index < len(self._words) and self._words[index] == (word, circle_id):
+                del self._words[index]
+
+    def reset(self):
+        """Forget everything; the next lookup reloads from the database."""
+        with self._lock:
+            self._names, self._words, self._loaded_at = {}, [], None
+
+    def search(self, query, limit=MAX_RESULTS):
+        """``(id, name)`` of circles with a word starting with ``query``.
+
+        Circles whose whole name starts with the query come first, then
+        alphabetical order.
+        """
+        query = _normalize(query)
+        if len(query) < MIN_QUERY_LENGTH:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            found = set()
+            index = bisect.bisect_left(self._words, (query,))
+            while index < len(self._words) and self._words[index][0].startswith(query):
+                found.add(self._words[index][1])
+                index += 1
+            names = {circle_id: self._names[circle_id] for circle_id in found}
+
+        def rank(item):
+            circle_id, name = item
+            return not _normalize(name).startswith(query), _normalize(name), circle_id
+
+        return sorted(names.items(), key=rank)[:limit]
+
+
+circle_index = CirclePrefixIndex()
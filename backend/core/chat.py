@@ -0,0 +1,192 @@
+"""Realtime circle chat over WebSockets.
+
+``websocket_application`` handles every ``websocket`` connection on the ASGI
+entry point (agora_backend/asgi.py) and serves ``/ws/circles/<id>/chat/``:
+
+* The handshake is accepted only for a signed-in member of the circle. The
+  Django session cookie authenticates it, and a browser ``Origin`` must be
+  this site or one listed in ``CSRF_TRUSTED_ORIGINS``/``CORS_ALLOWED_ORIGINS``.
+* Each text frame ``{"content": "...", "is_anonymous": true}`` is saved as a
+  Message and published on the circle's core.pubsub channel. Every socket
+  subscribed to it, in any worker, pushes ``{"type": "message", "message":
+  {...}}`` to its client; anonymous senders are redacted for everyone but
+  themselves and staff. Invalid frames get ``{"type": "error", ...}`` back.
+* Leaving the circle, or the circle being deleted, closes the socket.
+
+Nothing polls the database: a socket only waits on its client and on the
+broker. Close codes: 4401 not signed in, 4403 not a member or untrusted
+origin, 4404 unknown path or circle (before the handshake is accepted,
+browsers only see the connection fail).
+"""
+
+import asyncio
+import copy
+import json
+import re
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+from django.http.cookie import parse_cookie
+
+from . import pubsub
+from .models import Circle, CircleMembership
+from .representation import reveal_author
+from .serializers import MessageSerializer
+
+ROUTE = re.compile(r'^/ws/circles/(?P<circle_id>\d+)/chat/$')
+
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key.decode('latin-1').lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _origin_allowed(origin, host):
+    """Cross-site WebSocket hijacking guard: the cookie alone must not be enough."""
+    if origin is None:
+        # Not a browser, so not a page on another site riding the user's cookie.
+        return True
+    parts = urlsplit(origin)
+    if parts.netloc and parts.netloc == host:
+        return True
+    for trusted in [*settings.CSRF_TRUSTED_ORIGINS, *getattr(settings, 'CORS_ALLOWED_ORIGINS', [])]:
+        allowed = urlsplit(trusted)
+        if allowed.scheme != parts.scheme:
+            continue
+        if allowed.netloc == parts.netloc:
+            return True
+        if allowed.netloc.startswith('*.') and parts.netloc.endswith(allowed.netloc[1:]):
+            return True
+    return False
+
+
+def _recycle_connections():
+    # Django does this around every HTTP request; one socket outlives many of them.
+    # Never inside a transaction (e.g. a test case's), which would be rolled back.
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def _authenticate(scope, circle_id):
+    """``(user, None)`` for a member of the circle, else ``(None, close code)``."""
+    _recycle_connections()
+    cookies = parse_cookie(_header(scope, 'cookie') or '')
+    session = import_module(settings.SESSION_ENGINE).SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    user = get_user(SimpleNamespace(session=session))
+    if not user.is_authenticated:
+        return None, CLOSE_UNAUTHENTICATED
+    if not Circle.objects.filter(pk=circle_id).exists():
+        return None, CLOSE_NOT_FOUND
+    if not CircleMembership.objects.filter(user=user, circle_id=circle_id).exists():
+        return None, CLOSE_FORBIDDEN
+    return user, None
+
+
+def _post(user, circle_id, payload):
+    """Save one chat message and publish it; returns validation errors, if any."""
+    _recycle_connections()
+    if not CircleMembership.objects.filter(user=user, circle_id=circle_id).exists():
+        raise PermissionDenied
+    serializer = MessageSerializer(data=payload)
+    if not serializer.is_valid():
+        return serializer.errors
+    message = serializer.save(user=user, circle_id=circle_id)
+    # Rendered once for every subscriber; each socket reveals the author for its own viewer.
+    data = MessageSerializer(message, context={'shared_representations': {}}).data
+    # Plain dicts, exactly as a shared broker would deliver them.
+    data = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    pubsub.publish(pubsub.circle_channel(circle_id), {'type': 'message', 'message': data})
+    return None
+
+
+async def _send_json(send, data):
+    await send({'type': 'websocket.send', 'text': json.dumps(data, cls=DjangoJSONEncoder)})
+
+
+async def _read(receive, send, user, circle_id):
+    """Save the client's messages until it disconnects (None) or may no longer post (a close code)."""
+    while True:
+        event = await receive()
+        if event['type'] == 'websocket.disconnect':
+            return None
+        if event['type'] != 'websocket.receive':
+            continue
+        try:
+            payload = json.loads(event.get('text') or '')
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            await _send_json(send, {'type': 'error', 'detail': 'Expected a JSON object.'})
+            continue
+        try:
+            errors = await sync_to_async(_post)(user, circle_id, payload)
+        except PermissionDenied:
+            return CLOSE_FORBIDDEN
+        if errors:
+            await _send_json(send, {'type': 'error', 'errors': errors})
+
+
+async def _forward(events, send, user):
+    """Push the circle's messages to the client until it must be disconnected (a close code)."""
+    async for event in events:
+        kind = event.get('type')
+        if kind == 'message':
+            message = reveal_author(copy.deepcopy(event['message']), user)
+            await _send_json(send, {'type': 'message', 'message': message})
+        elif kind == 'member_left' and event.get('user_id') == user.id:
+            return CLOSE_FORBIDDEN
+        elif kind == 'circle_deleted':
+            return CLOSE_NOT_FOUND
+    return None
+
+
+async def circle_chat(scope, receive, send, circle_id):
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    if not _origin_allowed(_header(scope, 'origin'), _header(scope, 'host')):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+    user, code = await sync_to_async(_authenticate)(scope, circle_id)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': code})
+        return
+
+    # Subscribe before accepting, so nothing published after the handshake is missed.
+    async with pubsub.broker().subscribe(pubsub.circle_channel(circle_id)) as events:
+        await send({'type': 'websocket.accept'})
+        tasks = [
+            asyncio.ensure_future(_read(receive, send, user, circle_id)),
+            asyncio.ensure_future(_forward(events, send, user)),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        code = next(iter(done)).result()
+    if code is not None:
+        await send({'type': 'websocket.close', 'code': code})
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for ``websocket`` connections."""
+    match = ROUTE.match(scope.get('path', ''))
+    if match is None:
+        await receive()
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    await circle_chat(scope, receive, send, int(match['circle_id']))
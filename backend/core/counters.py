@@ -0,0 +1,33 @@
+"""Chunked repair of denormalized counters.
+
+The ``reconcile_post_counters``, ``reconcile_circle_counters`` and
+``rebuild_user_stats`` commands all walk a table in primary-key order, one
+transaction per chunk, and rewrite the rows whose stored counts drifted.
+"""
+
+from operator import attrgetter
+
+from django.db import transaction
+
+
+def repair_in_chunks(queryset, chunk_size, repair, pk_of=attrgetter('pk')):
+    """Run ``repair(chunk)`` over ``queryset`` in primary-key chunks; returns ``(checked, fixed)``.
+
+    ``repair`` returns how many rows it fixed. Each chunk is fetched and
+    repaired in one transaction; lock the rows being rewritten (the queryset's
+    ``select_for_update()``, or inside ``repair``) so concurrent ``F()`` bumps
+    queue behind the rewrite instead of being lost. ``pk_of`` reads the
+    primary key of a row (e.g. ``itemgetter(0)`` for ``values_list`` rows).
+    """
+    chunk_size = max(1, chunk_size)
+    last_pk = 0
+    checked = fixed = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not chunk:
+                break
+            fixed += repair(chunk)
+        checked += len(chunk)
+        last_pk = pk_of(chunk[-1])
+    return checked, fixed
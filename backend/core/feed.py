@@ -0,0 +1,136 @@
+"""Page-level loaders used when serializing many posts at once.
+
+Serializers fall back to per-object queries when these are absent from the
+context, so single-object serialization keeps working unchanged.
+"""
+
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import like_buffer
+from .models import Comment, Like
+from .representation import SharedRepresentations
+
+# Rendered fields that make a post expensive enough to share its representation.
+SHARED_FIELDS = {'comments', 'comments_preview'}
+
+# Top-level comments embedded per post in feed lists, and replies shown per
+# thread before a "load more replies" cursor.
+COMMENT_PREVIEW_SIZE = 2
+REPLY_PREVIEW_SIZE = 3
+
+
+class CommentTree:
+    """All comments of a set of posts, indexed for nested serialization."""
+
+    def __init__(self, comments):
+        self._roots = defaultdict(list)
+        self._replies = defaultdict(list)
+        for comment in comments:
+            if comment.parent_id is None:
+                self._roots[comment.post_id].append(comment)
+            else:
+                self._replies[comment.parent_id].append(comment)
+        # Top-level comments read newest first, replies read as a conversation.
+        for roots in self._roots.values():
+            roots.reverse()
+
+    def roots(self, post_id):
+        return self._roots.get(post_id, [])
+
+    def replies(self, comment_id):
+        return self._replies.get(comment_id, [])
+
+
+def load_comment_tree(post_ids):
+    """Fetch every comment of ``post_ids`` (with authors), at any depth, in a single query."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return CommentTree([])
+    # Path order (core.threads) lists each thread depth-first, replies oldest first.
+    comments = (
+        Comment.objects.filter(post_id__in=post_ids)
+        .select_related('user')
+        .order_by('post_id', 'path')
+    )
+    return CommentTree(comments)
+
+
+def _order_expr(field):
+    return F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+
+
+def _first_per_group(queryset, group_field, ordering, size):
+    """Up to ``size`` rows per ``group_field`` value, in one windowed query."""
+    window = Window(RowNumber(), partition_by=[F(group_field)], order_by=[_order_expr(f) for f in ordering])
+    ranked = queryset.annotate(rank=window)
+    grouped = defaultdict(list)
+    for row in ranked.filter(rank__lte=size).select_related('user').order_by(group_field, *ordering):
+        grouped[getattr(row, group_field)].append(row)
+    return grouped
+
+
+def load_comment_previews(post_ids, size=COMMENT_PREVIEW_SIZE):
+    """Latest ``size`` top-level comments of each post, keyed by post id."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+    roots = Comment.objects.filter(post_id__in=post_ids, parent__isnull=True)
+    return _first_per_group(roots, 'post_id', ('-created_at', '-id'), size)
+
+
+def load_reply_previews(parent_ids, size=REPLY_PREVIEW_SIZE):
+    """First ``size`` replies of each thread, keyed by parent comment id.
+
+    Callers ask for one extra row to find out whether a thread has more.
+    """
+    parent_ids = list(parent_ids)
+    if not parent_ids:
+        return {}
+    replies = Comment.objects.filter(parent_id__in=parent_ids)
+    return _first_per_group(replies, 'parent_id', ('created_at', 'id'), size)
+
+
+def load_liked_post_ids(user, post_ids):
+    """Ids among ``post_ids`` that ``user`` has liked, in one query.
+
+    Likes still sitting in the write-behind buffer count too.
+    """
+    post_ids = list(post_ids)
+    if not post_ids or not user or not getattr(user, 'is_authenticated', False):
+        return set()
+    liked = set(Like.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True))
+    if like_buffer.enabled():
+        for post_id, state in like_buffer.pending_states(user.id, post_ids).items():
+            if state:
+                liked.add(post_id)
+            else:
+                liked.discard(post_id)
+    return liked
+
+
+def build_page_context(posts, request, fields, shape=None):
+    """Serializer context entries that replace per-post queries for ``posts``.
+
+    Only the data behind the rendered ``fields`` is loaded. With a ``shape``
+    (the serializer's name), posts that render comments use cached shared
+    representations, and comment data is loaded only for cache misses.
+    """
+    post_ids = [post.id for post in posts]
+    context = {}
+    if 'liked' in fields:
+        context['liked_post_ids'] = load_liked_post_ids(getattr(request, 'user', None), post_ids)
+    if 'likes_count' in fields and like_buffer.enabled():
+        context['pending_like_deltas'] = like_buffer.pending_deltas(post_ids)
+    if shape and post_ids and SHARED_FIELDS & set(fields):
+        shared = SharedRepresentations(posts, request, shape, fields)
+        shared.liked_post_ids = context.get('liked_post_ids', set())
+        context['shared_representations'] = shared
+        post_ids = shared.misses()
+    if 'comments' in fields:
+        context['comment_tree'] = load_comment_tree(post_ids)
+    if 'comments_preview' in fields:
+        context['comment_previews'] = load_comment_previews(post_ids)
+    return context
@@ -0,0 +1,159 @@
+"""Write-behind buffer for likes (``LIKE_WRITE_BEHIND = True``).
+
+When a post goes viral, writing every Like row and moving its counter makes
+each request queue on that one post row. In write-behind mode core.likes
+records the reader's intent here instead, and ``core.likes.flush`` applies
+it in batches from a background thread (or ``manage.py flush_like_buffer``).
+
+Everything lives in the Django cache, so configure a shared cache (Redis,
+Memcached) when several processes serve requests:
+
+* ``like-buf:seq`` and ``like-buf:log:<n>``: an append log of
+  ``(user, post, liked, delta)`` entries, applied in order
+* ``like-buf:state:<user>:<post>``: the latest intended state and its log
+  slot, so repeated toggles coalesce and reads see the reader's own like
+* ``like-buf:delta:<post>``: likes not yet reflected in ``likes_count``
+* ``like-buf:user:<user>``: the reader's last slot, folded into
+  conditional-GET ETags so a 304 never hides a pending like
+
+The buffer is best effort: entries lost with the cache are simply not
+applied, and ``reconcile_post_counters`` repairs counters either way.
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+SEQ = 'like-buf:seq'
+FLUSHED = 'like-buf:flushed'
+LOCK = 'like-buf:lock'
+# A flusher that dies holding the lock releases it after this many seconds.
+LOCK_SECONDS = 60
+
+# Slots a flusher found missing: a writer may still be between taking the slot
+# and storing it. A slot still missing on the next pass is given up on.
+_gaps = set()
+_gaps_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'LIKE_WRITE_BEHIND', False)
+
+
+def _log_key(n):
+    return f'like-buf:log:{n}'
+
+
+def _state_key(user_id, post_id):
+    return f'like-buf:state:{user_id}:{post_id}'
+
+
+def _delta_key(post_id):
+    return f'like-buf:delta:{post_id}'
+
+
+def _user_key(user_id):
+    return f'like-buf:user:{user_id}'
+
+
+def _incr(key, delta):
+    cache.add(key, 0, None)
+    return cache.incr(key, delta)
+
+
+def record(user_id, post_id, liked, delta):
+    """Append one intended like state; ``delta`` is its effect on the post's count."""
+    n = _incr(SEQ, 1)
+    cache.set(_log_key(n), (user_id, post_id, liked, delta), None)
+    cache.set(_state_key(user_id, post_id), (liked, n), None)
+    if delta:
+        _incr(_delta_key(post_id), delta)
+    cache.set(_user_key(user_id), n, None)
+    return n
+
+
+def pending_state(user_id, post_id):
+    """The user's buffered like state for the post, or None if nothing is pending."""
+    state = cache.get(_state_key(user_id, post_id))
+    return None if state is None else state[0]
+
+
+def pending_states(user_id, post_ids):
+    """``{post_id: liked}`` for the posts with a buffered state, in one round trip."""
+    keys = {_state_key(user_id, post_id): post_id for post_id in post_ids}
+    found = cache.get_many(list(keys)) if keys else {}
+    return {keys[key]: state[0] for key, state in found.items()}
+
+
+def pending_deltas(post_ids):
+    """``{post_id: delta}`` of likes not yet counted in ``likes_count``."""
+    keys = {_delta_key(post_id): post_id for post_id in post_ids}
+    found = cache.get_many(list(keys)) if keys else {}
+    return {keys[key]: delta for key, delta in found.items() if delta}
+
+
+def viewer_token(user_id):
+    """Changes whenever the user buffers a like; empty when write-behind is off."""
+    if not enabled():
+        return ''
+    n = cache.get(_user_key(user_id))
+    return '' if n is None else f':likes={n}'
+
+
+def claim():
+    """Take the flush lock; only one process drains the log at a time."""
+    return cache.add(LOCK, 1, LOCK_SECONDS)
+
+
+def release():
+    cache.delete(LOCK)
+
+
+def drain(limit):
+    """Up to ``limit`` unapplied log entries, oldest first, as ``(n, user, post, liked, delta)``.
+
+    Stops early at a slot that is not stored yet, unless it was already
+    missing on the previous pass.
+    """
+    start = (cache.get(FLUSHED) or 0) + 1
+    end = min(cache.get(SEQ) or 0, start + limit - 1)
+    if end < start:
+        return []
+    found = cache.get_many([_log_key(n) for n in range(start, end + 1)])
+    entries = []
+    with _gaps_lock:
+        for n in range(start, end + 1):
+            entry = found.get(_log_key(n))
+            if entry is None:
+                if n not in _gaps:
+                    _gaps.add(n)
+                    break
+                _gaps.discard(n)
+                entries.append((n, None, None, None, 0))
+                continue
+            entries.append((n, *entry))
+    return entries
+
+
+def acknowledge(entries):
+    """Forget ``entries`` once they have been applied to the database."""
+    if not entries:
+        return
+    deltas = {}
+    latest = {}
+    for n, user_id, post_id, _liked, delta in entries:
+        if post_id is None:
+            continue
+        deltas[post_id] = deltas.get(post_id, 0) + delta
+        latest[(user_id, post_id)] = n
+    cache.set(FLUSHED, entries[-1][0], None)
+    cache.delete_many([_log_key(entry[0]) for entry in entries])
+    for post_id, delta in deltas.items():
+        if delta:
+            _incr(_delta_key(post_id), -delta)
+    # Keep states that a newer, still buffered entry has overwritten.
+    states = cache.get_many([_state_key(*pair) for pair in latest])
+    cache.delete_many([
+        _state_key(*pair) for pair, n in latest.items() if states.get(_state_key(*pair), (None, n))[1] == n
+    ])
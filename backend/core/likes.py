@@ -0,0 +1,283 @@
+"""Like writes without loading the post.
+
+``toggle``, ``like`` and ``unlike`` insert or delete the Like row and move
+``Post.likes_count`` in the same transaction, returning the new state and
+count straight from the UPDATE. On PostgreSQL each is a single statement
+(``INSERT ... ON CONFLICT DO NOTHING`` and ``DELETE`` in data-modifying CTEs
+feeding the counter UPDATE, which also recomputes the hot score); elsewhere
+it is a short sequence of the same statements inside ``transaction.atomic()``,
+plus a second UPDATE for the hot score, since SQLite's date arithmetic stops
+at milliseconds and would not match core.ranking.
+
+These writes bypass the Like model signals, so the derived data core.signals
+would otherwise maintain (the hot score, the author's ``likes_received`` and
+the version stamps) is updated here. ``reconcile_post_counters`` repairs any drift either way.
+
+With ``LIKE_WRITE_BEHIND = True`` the writes go to core.like_buffer instead
+and ``flush`` applies them in batches: from a daemon thread every
+``LIKE_FLUSH_SECONDS``, or from ``manage.py flush_like_buffer``.
+"""
+
+import logging
+import threading
+import time
+from datetime import UTC
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from . import like_buffer, live, ranking, sparks, versions
+from .models import Like, Post
+
+logger = logging.getLogger(__name__)
+
+# Log entries applied per flush transaction.
+FLUSH_BATCH = 500
+
+_RETURNING = 'RETURNING likes_count, comments_count, created_at, circle_id, user_id, is_anonymous'
+
+_INSERT = (
+    'INSERT INTO core_like (user_id, post_id) SELECT %s, id FROM core_post WHERE id = %s '
+    'ON CONFLICT (user_id, post_id) DO NOTHING RETURNING id'
+)
+_DELETE = 'DELETE FROM core_like WHERE user_id = %s AND post_id = %s RETURNING id'
+_COUNT = f'UPDATE core_post SET likes_count = likes_count + %s WHERE id = %s {_RETURNING}'
+
+
+def _counters(likes):
+    """``SET`` clause moving ``likes_count`` to the ``likes`` expression, with core.ranking.hot_score to match."""
+    hot = (
+        f'ROUND((LOG(GREATEST({likes} + {ranking.COMMENT_WEIGHT} * comments_count, 1)) + '
+        f"EXTRACT(EPOCH FROM created_at - TIMESTAMPTZ '{ranking.EPOCH.isoformat()}') / {ranking.DECAY_SECONDS}"
+        ')::numeric, 7)'
+    )
+    return f'likes_count = {likes}, hot_score = {hot}'
+
+
+_POSTGRES_SQL = {
+    'like': f"""
+        WITH ins AS ({_INSERT})
+        UPDATE core_post SET {_counters('likes_count + (SELECT COUNT(*) FROM ins)')}
+        WHERE id = %s {_RETURNING}, TRUE, EXISTS (SELECT 1 FROM ins)
+    """,
+    'unlike': f"""
+        WITH del AS ({_DELETE})
+        UPDATE core_post SET {_counters('likes_count - (SELECT COUNT(*) FROM del)')}
+        WHERE id = %s {_RETURNING}, FALSE, EXISTS (SELECT 1 FROM del)
+    """,
+    # The DELETE only runs when the INSERT hit an existing like; both CTEs see the
+    # same snapshot, so exactly one of them takes effect.
+    'toggle': f"""
+        WITH ins AS ({_INSERT}),
+        del AS (
+            DELETE FROM core_like WHERE user_id = %s AND post_id = %s AND NOT EXISTS (SELECT 1 FROM ins)
+            RETURNING id
+        )
+        UPDATE core_post SET {_counters('likes_count + (SELECT COUNT(*) FROM ins) - (SELECT COUNT(*) FROM del)')}
+        WHERE id = %s {_RETURNING}, EXISTS (SELECT 1 FROM ins), TRUE
+    """,
+}
+
+
+def _as_datetime(value):
+    # Raw cursors on SQLite hand back the stored text.
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if settings.USE_TZ and value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value
+
+
+def _postgres(mode, user_id, post_id):
+    params = {
+        'like': [user_id, post_id, post_id],
+        'unlike': [user_id, post_id, post_id],
+        'toggle': [user_id, post_id, user_id, post_id, post_id],
+    }[mode]
+    with connection.cursor() as cursor:
+        cursor.execute(_POSTGRES_SQL[mode], params)
+        return cursor.fetchone()
+
+
+def _generic(mode, user_id, post_id):
+    with connection.cursor() as cursor:
+        delta = 0
+        if mode in ('like', 'toggle'):
+            cursor.execute(_INSERT, [user_id, post_id])
+            delta = len(cursor.fetchall())
+        liked = mode == 'like' or delta == 1
+        if mode == 'unlike' or (mode == 'toggle' and not delta):
+            cursor.execute(_DELETE, [user_id, post_id])
+            delta = -len(cursor.fetchall())
+        cursor.execute(_COUNT, [delta, post_id])
+        row = cursor.fetchone()
+    return None if row is None else (*row, liked, delta != 0)
+
+
+def _buffered(mode, user_id, post_id):
+    likes_count = Post.objects.filter(pk=post_id).values_list('likes_count', flat=True).first()
+    if likes_count is None:
+        return None
+    current = like_buffer.pending_state(user_id, post_id)
+    if current is None:
+        current = Like.objects.filter(user_id=user_id, post_id=post_id).exists()
+    liked = not current if mode == 'toggle' else mode == 'like'
+    if liked != current:
+        like_buffer.record(user_id, post_id, liked, 1 if liked else -1)
+        live.post_changed(post_id)
+        _start_flusher()
+    return liked, likes_count + like_buffer.pending_deltas([post_id]).get(post_id, 0)
+
+
+def _write(mode, user_id, post_id):
+    if like_buffer.enabled():
+        return _buffered(mode, user_id, post_id)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            row = _postgres(mode, user_id, post_id)
+        else:
+            row = _generic(mode, user_id, post_id)
+        if row is None:
+            return None
+        likes_count, comments_count, created_at, circle_id, author_id, anonymous, liked, changed = row
+        if not changed:
+            # A repeated PUT/DELETE: nothing the caches or the ranking depend on moved.
+            return bool(liked), likes_count
+        if connection.vendor != 'postgresql':
+            # PostgreSQL already set it in the counter UPDATE.
+            Post.objects.filter(pk=post_id).update(
+                hot_score=ranking.hot_score(likes_count, comments_count, _as_datetime(created_at))
+            )
+        sparks.bump(author_id, public=not anonymous, likes=1 if liked else -1)
+        live.post_changed(post_id)
+        keys = [versions.FEED, versions.post_key(post_id)]
+        if circle_id is not None:
+            keys.append(versions.circle_key(circle_id))
+        versions.bump(*keys)
+    return bool(liked), likes_count
+
+
+def toggle(user_id, post_id):
+    """Flip the user's like. ``(liked, likes_count)``, or None if the post does not exist."""
+    return _write('toggle', user_id, post_id)
+
+
+def like(user_id, post_id):
+    """Like the post; a repeat is a no-op. ``(True, likes_count)`` or None."""
+    return _write('like', user_id, post_id)
+
+
+def unlike(user_id, post_id):
+    """Remove the like; a repeat is a no-op. ``(False, likes_count)`` or None."""
+    return _write('unlike', user_id, post_id)
+
+
+def _apply(entries):
+    # Only the last entry per (user, post) matters.
+    final = {}
+    for _n, user_id, post_id, liked, _delta in entries:
+        if post_id is not None:
+            final[(user_id, post_id)] = liked
+    if not final:
+        return
+    post_ids = set(Post.objects.filter(pk__in={p for _, p in final}).values_list('id', flat=True))
+    user_ids = set(get_user_model().objects.filter(pk__in={u for u, _ in final}).values_list('id', flat=True))
+    final = {pair: liked for pair, liked in final.items() if pair[0] in user_ids and pair[1] in post_ids}
+    if not final:
+        return
+    with transaction.atomic():
+        # Diff against the batch's own (user, post) rows, so the counters move by exactly
+        # what this flush changed: a batch replayed after a lost acknowledgement changes
+        # nothing, and a viral post is never recounted.
+        existing = set(
+            Like.objects.filter(user_id__in={u for u, _ in final}, post_id__in={p for _, p in final})
+            .values_list('user_id', 'post_id')
+        )
+        added = [pair for pair, liked in final.items() if liked and pair not in existing]
+        removed = [pair for pair, liked in final.items() if not liked and pair in existing]
+        Like.objects.bulk_create(
+            [Like(user_id=user_id, post_id=post_id) for user_id, post_id in added],
+            ignore_conflicts=True,
+            batch_size=FLUSH_BATCH,
+        )
+        if removed:
+            with connection.cursor() as cursor:
+                cursor.executemany('DELETE FROM core_like WHERE user_id = %s AND post_id = %s', removed)
+        deltas = {}
+        for pairs, step in ((added, 1), (removed, -1)):
+            for _, post_id in pairs:
+                deltas[post_id] = deltas.get(post_id, 0) + step
+        changed = {}
+        for post_id, delta in deltas.items():
+            if delta:
+                changed.setdefault(delta, []).append(post_id)
+        if not changed:
+            return
+        # One UPDATE per distinct delta (a handful), not one per post.
+        for delta, ids in changed.items():
+            Post.objects.filter(pk__in=ids).update(likes_count=F('likes_count') + delta)
+        posts = list(Post.objects.filter(pk__in=[pk for ids in changed.values() for pk in ids]).only(
+            'id', 'likes_count', 'comments_count', 'created_at', 'circle_id', 'user_id', 'is_anonymous'
+        ))
+        received = {}
+        for post in posts:
+            post.hot_score = ranking.hot_score(post.likes_count, post.comments_count, post.created_at)
+            author = (post.user_id, not post.is_anonymous)
+            received[author] = received.get(author, 0) + deltas[post.id]
+        Post.objects.bulk_update(posts, ['hot_score'])
+        for (author_id, public), delta in received.items():
+            sparks.bump(author_id, public=public, likes=delta)
+        keys = {versions.FEED}
+        for post in posts:
+            keys.add(versions.post_key(post.id))
+            if post.circle_id is not None:
+                keys.add(versions.circle_key(post.circle_id))
+        versions.bump(*keys)
+
+
+def flush(limit=FLUSH_BATCH):
+    """Apply up to ``limit`` buffered likes; returns how many log entries were applied.
+
+    Returns 0 without doing anything while another process is flushing.
+    """
+    if not like_buffer.claim():
+        return 0
+    try:
+        entries = like_buffer.drain(limit)
+        _apply(entries)
+        like_buffer.acknowledge(entries)
+    finally:
+        like_buffer.release()
+    return len(entries)
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            while flush() == FLUSH_BATCH:
+                pass
+        except Exception:  # noqa: BLE001
+            logger.exception("[likes] flushing the like buffer failed")
+        finally:
+            close_old_connections()
+
+
+def _start_flusher():
+    global _flusher
+    interval = getattr(settings, 'LIKE_FLUSH_SECONDS', 2)
+    if _flusher is not None or not interval:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flush_forever, args=(interval,), name='core-like-flusher', daemon=True
+            )
+            _flusher.start()
@@ -0,0 +1,146 @@
+"""Live post updates streamed as Server-Sent Events.
+
+Writes announce what changed with ``post_created`` / ``post_changed``: after
+commit, each event is logged on the ``posts`` channel of core.pubsub, which
+numbers it, keeps it for replay and publishes it. Numbers and the replay log
+live in the broker, so with a shared one (``CHAT_PUBSUB_URL``) every worker's
+streams hear every event and agree on its number.
+
+``GET /api/live/?ids=1,2,3`` (core.views.live_view) streams updates for those
+posts and for new posts the reader may see. It only works under the ASGI
+entry point, where the response is an async generator. Each stream:
+
+* collects the events it hears and, once per ``LIVE_TICK_SECONDS``, turns
+  them into at most one ``update`` frame. A post liked a thousand times in
+  a tick is one entry in it, with its counters read fresh in one query
+  (which also drops posts the reader may no longer see).
+* sends a comment line every ``LIVE_HEARTBEAT_SECONDS`` while idle, so
+  proxies keep the connection open.
+* labels each frame with the newest event number it has sent. A client
+  that reconnects with ``Last-Event-ID`` first gets what it missed, for as
+  long as the replay log keeps it (``pubsub.LOG_SIZE`` events,
+  ``pubsub.LOG_SECONDS``); older gaps simply resume live.
+
+An ``update`` frame's data is ``{"posts": [{"id", "likes_count",
+"comments_count", "new_comment_ids"}], "new_posts": [{"id", "circle_id"}]}``.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from . import like_buffer, pubsub, timeline
+from .models import Post
+
+CHANNEL = 'posts'
+RETRY_MS = 3000
+
+
+def _publish(event):
+    pubsub.log(CHANNEL, event)
+
+
+def announce(event):
+    """Publish ``event`` once the current transaction commits (right away outside one)."""
+    transaction.on_commit(lambda: _publish(event))
+
+
+def post_created(post):
+    announce({'type': 'post_created', 'post_id': post.id, 'circle_id': post.circle_id})
+
+
+def post_changed(post_id, comment_id=None):
+    """Counters (likes, comments) of ``post_id`` moved; ``comment_id`` names a new comment."""
+    announce({'type': 'post_changed', 'post_id': post_id, 'comment_id': comment_id})
+
+
+def missed(last_id):
+    """Logged events after ``last_id``, oldest first."""
+    return pubsub.broker().replay(CHANNEL, last_id)
+
+
+def tick_seconds():
+    return getattr(settings, 'LIVE_TICK_SECONDS', 1.0)
+
+
+def heartbeat_seconds():
+    return getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15.0)
+
+
+def _frame(events, user, followed, frame_id):
+    """Coalesce one tick's ``events`` into an ``update`` frame, or None if none concern the reader."""
+    changed, comments, created = set(), {}, {}
+    for event in events:
+        post_id = event['post_id']
+        if event['type'] == 'post_created':
+            created[post_id] = event['circle_id']
+        elif post_id in followed:
+            changed.add(post_id)
+            if event.get('comment_id') is not None:
+                comments.setdefault(post_id, []).append(event['comment_id'])
+    if not (changed or created):
+        return None
+    posts = Post.objects.filter(pk__in=changed | set(created))
+    if not (user.is_authenticated and user.is_staff):
+        posts = timeline.filter_visible(posts, user.id)
+    visible = {row[0]: row[1:] for row in posts.values_list('id', 'likes_count', 'comments_count')}
+    pending = like_buffer.pending_deltas(visible) if like_buffer.enabled() else {}
+    new_posts = [
+        {'id': post_id, 'circle_id': circle_id} for post_id, circle_id in created.items() if post_id in visible
+    ]
+    # New posts are followed from now on.
+    followed.update(post['id'] for post in new_posts)
+    updates = [
+        {
+            'id': post_id,
+            'likes_count': visible[post_id][0] + pending.get(post_id, 0),
+            'comments_count': visible[post_id][1],
+            'new_comment_ids': comments.get(post_id, []),
+        }
+        for post_id in sorted(changed) if post_id in visible
+    ]
+    if not (updates or new_posts):
+        return None
+    data = json.dumps({'posts': updates, 'new_posts': new_posts}, separators=(',', ':'))
+    return f"id: {frame_id}\nevent: update\ndata: {data}\n\n"
+
+
+async def stream(user, post_ids, last_id=None):
+    """The SSE body: missed events first (after ``last_id``), then live updates, forever."""
+    followed = set(post_ids)
+    async with pubsub.broker().subscribe(CHANNEL) as events:
+        # Subscribed first, so nothing falls between the replay and the live events.
+        heard = await sync_to_async(missed)(last_id) if last_id is not None else []
+        replayed = {event['id'] for event in heard}
+        floor = last_id or 0
+
+        async def listen():
+            async for event in events:
+                if event['id'] > floor and event['id'] not in replayed:
+                    heard.append(event)
+
+        listener = asyncio.ensure_future(listen())
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            idle, sent = 0.0, floor
+            while True:
+                batch = list(heard)
+                heard.clear()
+                if batch:
+                    # Workers publish in their own order, so a late event may carry a
+                    # lower number; keep frame ids rising so a resume never goes back.
+                    sent = max(sent, *(event['id'] for event in batch))
+                    frame = await sync_to_async(_frame)(batch, user, followed, sent)
+                    if frame:
+                        yield frame
+                        idle = 0.0
+                if idle >= heartbeat_seconds():
+                    yield ': heartbeat\n\n'
+                    idle = 0.0
+                await asyncio.sleep(tick_seconds())
+                idle += tick_seconds()
+        finally:
+            listener.cancel()
@@ -0,0 +1,169 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.core import sparks, threads
+from backend.core.models import (
+    Circle,
+    CircleMembership,
+    Comment,
+    Like,
+    Message,
+    Post,
+    Report,
+    TimelineEntry,
+    UserStats,
+)
+from backend.core.pagination import CIRCLE_ORDERINGS, MESSAGE_ORDERING, REPLY_ORDERING, seek
+from backend.core.ranking import HOT_ORDERING
+from backend.core.timeline import timeline_posts
+
+PAGE = 21
+
+# Plan lines that mean "read the whole table" or "sort the rows", per backend.
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)$'),
+}
+SORT = {
+    'postgresql': re.compile(r'(?:^|->\s*)(?:Incremental )?Sort\b'),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)'),
+}
+
+
+def hot_queries(user, circle, post, thread):
+    """``(name, queryset)`` for every access path that must stay index-only."""
+    return [
+        ('feed: everything, newest first', Post.objects.order_by('-created_at', '-id')[:PAGE]),
+        ('feed: circle, newest first', Post.objects.filter(circle=circle).order_by('-created_at', '-id')[:PAGE]),
+        ('feed: home timeline', timeline_posts(Post.objects.all(), user)[:PAGE]),
+        ('feed: top', Post.objects.order_by(*HOT_ORDERING)[:PAGE]),
+        ('comments: top-level threads',
+         Comment.objects.filter(post=post, parent__isnull=True).order_by('-created_at', '-id')[:PAGE]),
+        ('comments: replies', Comment.objects.filter(parent=thread).order_by(*REPLY_ORDERING)[:PAGE]),
+        ('comments: subtree', threads.subtree(thread)),
+        ('comments: whole post', Comment.objects.filter(post=post).order_by('post_id', 'path')),
+        ('likes: viewer flags', Like.objects.filter(user=user, post_id__in=[post.id, thread.post_id])),
+        ('reports: pending queue', Report.objects.filter(status='pending').order_by('-created_at')[:50]),
+        ('messages: circle history', Message.objects.filter(circle=circle).order_by(*MESSAGE_ORDERING)[:50]),
+        ('messages: history before a point', Message.objects.filter(circle=circle).filter(
+            seek(MESSAGE_ORDERING, [timezone.now(), 2 ** 31])
+        ).order_by(*MESSAGE_ORDERING)[:50]),
+        ('circles: largest first', Circle.objects.order_by(*CIRCLE_ORDERINGS['size'])[:50]),
+        ('circles: most active first', Circle.objects.order_by(*CIRCLE_ORDERINGS['activity'])[:50]),
+        ('sparks: leaderboard', sparks.leaders().select_related('user')[:50]),
+        ('sparks: rank', sparks.leaders().filter(score__gt=10)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN each hot query and fail if the plan reads a whole table or sorts where an index "
+        "should serve it. Seeds synthetic rows inside a rolled-back transaction unless --no-seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Synthetic posts to seed (comments, etc. scale with it).')
+        parser.add_argument('--no-seed', action='store_true', help='Audit the existing data as is.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only failing ones.')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SEQ_SCAN:
+            raise CommandError(f"[audit_query_plans] Unsupported database backend: {vendor}")
+        failures = []
+        with transaction.atomic():
+            fixtures = self._existing() if options['no_seed'] else self._seed(max(100, options['rows']))
+            if fixtures is None:
+                raise CommandError("[audit_query_plans] Nothing to audit: seed data or drop --no-seed.")
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            for name, queryset in hot_queries(*fixtures):
+                plan = queryset.explain()
+                problems = self._problems(vendor, plan)
+                status = 'FAIL' if problems else 'ok'
+                self.stdout.write(f"[audit_query_plans] {status:4} {name}" + (f": {', '.join(problems)}" if problems else ''))
+                if problems or options['verbose_plans']:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+                if problems:
+                    failures.append(name)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f"[audit_query_plans] {len(failures)} query plan(s) need an index: {'; '.join(failures)}")
+        self.stdout.write("[audit_query_plans] All hot queries are served by indexes.")
+
+    def _problems(self, vendor, plan):
+        problems = []
+        for line in plan.splitlines():
+            line = line.strip()
+            scan = SEQ_SCAN[vendor].search(line)
+            if scan:
+                problems.append(f"full scan of {scan.group(1)}")
+            if SORT[vendor].search(line):
+                problems.append('sort')
+        return problems
+
+    def _existing(self):
+        thread = Comment.objects.filter(parent__isnull=False).first() or Comment.objects.first()
+        circle = Circle.objects.first()
+        user = get_user_model().objects.first()
+        if not (thread and circle and user):
+            return None
+        return user, circle, thread.post, thread.parent or thread
+
+    def _seed(self, rows):
+        user_model = get_user_model()
+        users = user_model.objects.bulk_create([
+            user_model(username=f'audit-{i}', netid=f'audit-{i}', email=f'audit-{i}@example.com') for i in range(20)
+        ])
+        circles = Circle.objects.bulk_create([Circle(name=f'Audit circle {i}') for i in range(10)])
+        posts = Post.objects.bulk_create([
+            Post(
+                user=users[i % len(users)], title=f'Audit post {i}', content='Seeded for the query plan audit',
+                circle=circles[i % len(circles)] if i % 3 == 0 else None, hot_score=i / rows,
+            )
+            for i in range(rows)
+        ])
+        roots = Comment.objects.bulk_create([
+            Comment(post=posts[i % len(posts)], user=users[i % len(users)], content='Root')
+            for i in range(rows)
+        ])
+        replies = Comment.objects.bulk_create([
+            Comment(post=roots[i % len(roots)].post, parent=roots[i % len(roots)], user=users[i % len(users)],
+                    content='Reply')
+            for i in range(rows)
+        ])
+        # bulk_create skips the signal that assigns materialized paths.
+        for comment in roots:
+            comment.path = threads.path_for(comment.id)
+        for comment in replies:
+            comment.path, comment.depth = threads.path_for(comment.id, comment.parent.path), 1
+        Comment.objects.bulk_update(roots + replies, ['path', 'depth'], batch_size=500)
+        Like.objects.bulk_create([Like(user=user, post=post) for user in users for post in posts[:50]])
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=user, post=post, created_at=post.created_at) for user in users[:5] for post in posts
+        ])
+        Report.objects.bulk_create([
+            Report(user=users[0], content_type='post', object_id=post.id, reason='Audit',
+                   status='pending' if i % 10 == 0 else 'resolved')
+            for i, post in enumerate(posts)
+        ])
+        Message.objects.bulk_create([
+            Message(circle=circles[i % len(circles)], user=users[i % len(users)], content='Hi') for i in range(rows)
+        ])
+        # Leaderboards rank every user, so give them a realistic population of their own.
+        ranked = users + user_model.objects.bulk_create([
+            user_model(username=f'audit-r{i}', netid=f'audit-r{i}', email=f'audit-r{i}@example.com')
+            for i in range(rows)
+        ])
+        UserStats.objects.bulk_create(
+            [UserStats(user=user, score=i % 997) for i, user in enumerate(ranked)], batch_size=500
+        )
+        CircleMembership.objects.bulk_create(
+            [CircleMembership(user=user, circle=circles[i % len(circles)]) for i, user in enumerate(ranked)],
+            batch_size=500,
+        )
+        return users[0], circles[0], posts[0], roots[0]
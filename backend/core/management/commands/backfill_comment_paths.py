@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from backend.core import threads
+from backend.core.models import Comment
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in Comment.path / Comment.depth (core.threads) for comments that lack them. "
+        "Replies nested deeper than threads.MAX_DEPTH are moved up to the deepest allowed level."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Comments written per batch.')
+        parser.add_argument('--all', action='store_true', help='Recompute every comment, not only missing paths.')
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        comments = Comment.objects.all() if options['all'] else Comment.objects.filter(path='')
+        comments = comments.order_by('pk').only('pk', 'parent_id', 'path', 'depth')
+        last_pk = 0
+        filled = 0
+        flattened = 0
+        while True:
+            chunk = list(comments.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            # Replies always have larger ids than their parents, so a parent is either
+            # earlier in this chunk or already written.
+            in_chunk = {comment.pk for comment in chunk}
+            parents = {
+                parent.pk: (parent.path, parent.depth)
+                for parent in Comment.objects.filter(
+                    pk__in={c.parent_id for c in chunk if c.parent_id is not None} - in_chunk
+                ).only('pk', 'path', 'depth')
+            }
+            for comment in chunk:
+                if comment.parent_id is None or comment.parent_id not in parents:
+                    parent_path, depth = '', 0
+                else:
+                    parent_id, parent_path, parent_depth = threads.reply_position(*parents[comment.parent_id])
+                    if parent_id != comment.parent_id:
+                        comment.parent_id = parent_id
+                        flattened += 1
+                    depth = parent_depth + 1
+                comment.path = threads.path_for(comment.pk, parent_path)
+                comment.depth = depth
+                parents[comment.pk] = (comment.path, comment.depth)
+            Comment.objects.bulk_update(chunk, ['path', 'depth', 'parent'])
+            filled += len(chunk)
+            last_pk = chunk[-1].pk
+        self.stdout.write(
+            f"[backfill_comment_paths] Wrote paths for {filled} comment(s); "
+            f"moved {flattened} over-deep reply(ies) up to depth {threads.MAX_DEPTH}."
+        )
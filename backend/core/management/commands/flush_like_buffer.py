@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from backend.core import like_buffer, likes
+
+
+class Command(BaseCommand):
+    help = "Apply every like buffered by LIKE_WRITE_BEHIND (e.g. before a deploy or from cron)."
+
+    def handle(self, *args, **options):
+        if not like_buffer.enabled():
+            self.stdout.write("[flush_like_buffer] LIKE_WRITE_BEHIND is off; nothing is buffered.")
+            return
+        applied = 0
+        while True:
+            batch = likes.flush()
+            applied += batch
+            if batch < likes.FLUSH_BATCH:
+                break
+        self.stdout.write(f"[flush_like_buffer] Applied {applied} buffered like(s).")
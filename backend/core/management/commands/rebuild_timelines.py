@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from backend.core import timeline
+from backend.core.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines (all users, --user ids, or only --missing ones). Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only rebuild this user id.')
+        parser.add_argument('--missing', action='store_true', help='Only seed users whose timeline is empty.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+        if options['missing']:
+            users = users.exclude(Exists(TimelineEntry.objects.filter(user=OuterRef('pk'))))
+        rebuilt = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            timeline.rebuild_user(user_id)
+            rebuilt += 1
+        self.stdout.write(f"[rebuild_timelines] Rebuilt {rebuilt} timeline(s).")
@@ -0,0 +1,53 @@
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from backend.core.counters import repair_in_chunks
+from backend.core.models import UserStats
+from backend.core.sparks import actual_counts, score
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute UserStats (posts, comments, likes received, score) in primary-key chunks and fix any drift. "
+        "Also repairs scores after a post or comment changed anonymity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users recomputed per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        fields = ['posts_count', 'comments_count', 'likes_received', 'score']
+
+        def repair(users):
+            # The stats rows are the ones rewritten, so they are the ones locked.
+            stored = {
+                row.pk: row for row in
+                UserStats.objects.select_for_update().filter(pk__in=[pk for pk, *_ in users]).only('pk', *fields)
+            }
+            missing, drifted = [], []
+            for pk, posts, comments, likes, *public in users:
+                # Only named content scores (core.sparks).
+                actual = [posts, comments, likes, score(*public)]
+                row = stored.get(pk)
+                if row is None:
+                    missing.append(UserStats(user_id=pk, **dict(zip(fields, actual, strict=True))))
+                elif [getattr(row, field) for field in fields] != actual:
+                    for field, value in zip(fields, actual, strict=True):
+                        setattr(row, field, value)
+                    drifted.append(row)
+            if not dry_run:
+                UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+                UserStats.objects.bulk_update(drifted, fields)
+            return len(missing) + len(drifted)
+
+        users = actual_counts(get_user_model().objects.all()).values_list(
+            'pk', 'actual_posts', 'actual_comments', 'actual_likes',
+            'actual_public_posts', 'actual_public_comments', 'actual_public_likes',
+        )
+        checked, fixed = repair_in_chunks(users, options['chunk_size'], repair, pk_of=itemgetter(0))
+        verb = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(f"[rebuild_user_stats] Checked {checked} user(s); {verb} {fixed}.")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from backend.core.counters import repair_in_chunks
+from backend.core.models import Circle, CircleMembership
+
+
+def _member_count():
+    counts = (
+        CircleMembership.objects.filter(circle=OuterRef('pk')).order_by()
+        .values('circle').annotate(n=Count('pk')).values('n')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Circle.member_count in primary-key chunks and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Circles recomputed per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        def repair(chunk):
+            drifted = []
+            for circle in chunk:
+                if circle.member_count != circle.actual_members:
+                    circle.member_count = circle.actual_members
+                    drifted.append(circle)
+            if drifted and not dry_run:
+                Circle.objects.bulk_update(drifted, ['member_count'])
+            return len(drifted)
+
+        circles = Circle.objects.select_for_update().annotate(actual_members=_member_count()).only('pk', 'member_count')
+        checked, fixed = repair_in_chunks(circles, options['chunk_size'], repair)
+        verb = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(f"[reconcile_circle_counters] Checked {checked} circle(s); {verb} {fixed}.")
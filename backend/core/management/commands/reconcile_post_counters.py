@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from backend.core import versions
+from backend.core.counters import repair_in_chunks
+from backend.core.models import Comment, Like, Post
+from backend.core.ranking import hot_score
+
+
+def _count_of(model):
+    counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Post.likes_count / Post.comments_count in primary-key chunks and fix any drift "
+        "(with the hot score and version stamps of the posts it fixes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Posts recomputed per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        def repair(chunk):
+            drifted = []
+            for post in chunk:
+                if post.likes_count != post.actual_likes or post.comments_count != post.actual_comments:
+                    post.likes_count = post.actual_likes
+                    post.comments_count = post.actual_comments
+                    post.hot_score = hot_score(post.likes_count, post.comments_count, post.created_at)
+                    drifted.append(post)
+            if drifted and not dry_run:
+                Post.objects.bulk_update(drifted, ['likes_count', 'comments_count', 'hot_score'])
+                # Cached ETags and representations still carry the old counts.
+                keys = [versions.FEED]
+                for post in drifted:
+                    keys.append(versions.post_key(post.pk))
+                    if post.circle_id is not None:
+                        keys.append(versions.circle_key(post.circle_id))
+                versions.bump(*keys)
+            return len(drifted)
+
+        posts = (
+            Post.objects.select_for_update()
+            .annotate(actual_likes=_count_of(Like), actual_comments=_count_of(Comment))
+            .only('pk', 'likes_count', 'comments_count', 'created_at', 'circle_id')
+        )
+        checked, fixed = repair_in_chunks(posts, options['chunk_size'], repair)
+        verb = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(f"[reconcile_post_counters] Checked {checked} post(s); {verb} {fixed}.")
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.core import versions
+from backend.core.models import Post
+from backend.core.ranking import hot_score
+
+
+class Command(BaseCommand):
+    help = "Periodic pass that recomputes Post.hot_score for recent posts (run from cron/scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Only posts newer than this many days (0 = all).')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        posts = Post.objects.only('id', 'likes_count', 'comments_count', 'created_at', 'hot_score').order_by('pk')
+        if options['days'] > 0:
+            posts = posts.filter(created_at__gte=timezone.now() - timedelta(days=options['days']))
+        last_pk = 0
+        checked = updated = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            changed = []
+            for post in chunk:
+                score = hot_score(post.likes_count, post.comments_count, post.created_at)
+                if score != post.hot_score:
+                    post.hot_score = score
+                    changed.append(post)
+            Post.objects.bulk_update(changed, ['hot_score'])
+            checked += len(chunk)
+            updated += len(changed)
+            last_pk = chunk[-1].pk
+        if updated:
+            # "top" feeds are ordered by the scores just rewritten.
+            versions.bump(versions.FEED)
+        self.stdout.write(f"[refresh_hot_scores] Checked {checked} post(s); updated {updated}.")
@@ -0,0 +1,52 @@
+"""The viewer's circle memberships, looked up once and cached.
+
+``circle_ids(request)`` returns the set of circle ids the signed-in user
+belongs to. The set is memoized on the request and kept in the cache under
+the user's ``member:<id>`` version stamp (core.versions), which core.signals
+bumps on every join and leave, so a stale set is never served. Reading the
+stamp is free when the request was already validated against it (the post
+list does this), and otherwise a single primary-key lookup.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import versions
+from .models import CircleMembership
+
+TIMEOUT = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 600)
+
+
+def _user(request):
+    user = getattr(request, 'user', None)
+    if not user or not getattr(user, 'is_authenticated', False):
+        return None
+    return user
+
+
+def circle_ids(request):
+    """Frozen set of the ids of the circles the request's user belongs to."""
+    cached = getattr(request, '_circle_ids', None)
+    if cached is not None:
+        return cached
+    user = _user(request)
+    if user is None:
+        ids = frozenset()
+    else:
+        key = f"circle-ids:{user.id}:{versions.current(request, versions.member_key(user.id))}"
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(CircleMembership.objects.filter(user=user).values_list('circle_id', flat=True))
+            cache.set(key, ids, TIMEOUT)
+    request._circle_ids = ids
+    return ids
+
+
+def is_member(request, circle_id):
+    return circle_id in circle_ids(request)
+
+
+def can_see_circle(request, circle_id):
+    """Staff see every circle; everyone else only the circles they belong to."""
+    user = _user(request)
+    return user is not None and (user.is_staff or is_member(request, circle_id))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:39
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Seed the new counters from the existing Like/Comment rows."""
+    Post = apps.get_model('core', 'Post')
+    Like = apps.get_model('core', 'Like')
+    Comment = apps.get_model('core', 'Comment')
+
+    def count_of(model):
+        counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Post.objects.update(likes_count=count_of(Like), comments_count=count_of(Comment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_customuser_display_name_customuser_is_verified_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:44
+
+import math
+from datetime import UTC, datetime
+
+from django.db import migrations, models
+
+
+def backfill_hot_scores(apps, schema_editor):
+    """Score existing posts (formula frozen from core.ranking at this point)."""
+    Post = apps.get_model('core', 'Post')
+    epoch = datetime(2025, 1, 1, tzinfo=UTC)
+    batch = []
+    for post in Post.objects.only('id', 'likes_count', 'comments_count', 'created_at').iterator(chunk_size=1000):
+        engagement = max(post.likes_count + 2 * post.comments_count, 1)
+        post.hot_score = round(math.log10(engagement) + (post.created_at - epoch).total_seconds() / 45000, 7)
+        batch.append(post)
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['hot_score'])
+            batch = []
+    Post.objects.bulk_update(batch, ['hot_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='core_post_hot_idx'),
+        ),
+        migrations.RunPython(backfill_hot_scores, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# PostgreSQL: weighted tsvectors maintained by the database as stored generated columns.
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE core_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX core_post_search_idx ON core_post USING gin (search_vector)",
+    """
+    ALTER TABLE core_comment ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX core_comment_search_idx ON core_comment USING gin (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "ALTER TABLE core_comment DROP COLUMN search_vector",
+    "ALTER TABLE core_post DROP COLUMN search_vector",
+]
+
+# SQLite: one FTS5 table. Rowids are 2 * post id for posts and 2 * comment id + 1
+# for comments. The triggers keeping it current are (re)installed after every
+# migrate by core.signals, because SQLite drops them whenever a table is rebuilt.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_search_fts USING fts5(
+        title, body, kind UNINDEXED, post_id UNINDEXED, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    INSERT INTO core_search_fts (rowid, title, body, kind, post_id)
+    SELECT id * 2, title, content, 'post', id FROM core_post
+    """,
+    """
+    INSERT INTO core_search_fts (rowid, title, body, kind, post_id)
+    SELECT id * 2 + 1, '', content, 'comment', post_id FROM core_comment
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS core_search_fts",
+]
+
+
+def _run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_contentversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Trigram GIN indexes matching Django's case-insensitive lookups
+# (UPPER(col::text) LIKE UPPER(...)), used by core.autocomplete and the admin search.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX core_user_username_trgm ON core_customuser USING gin (UPPER(username::text) gin_trgm_ops)",
+    "CREATE INDEX core_user_display_trgm ON core_customuser USING gin (UPPER(display_name::text) gin_trgm_ops)",
+    "CREATE INDEX core_user_program_trgm ON core_customuser USING gin (UPPER(program::text) gin_trgm_ops)",
+    "CREATE INDEX core_circle_name_trgm ON core_circle USING gin (UPPER(name::text) gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS core_circle_name_trgm",
+    "DROP INDEX IF EXISTS core_user_program_trgm",
+    "DROP INDEX IF EXISTS core_user_display_trgm",
+    "DROP INDEX IF EXISTS core_user_username_trgm",
+]
+
+
+def _run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for sql in statements:
+                schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(POSTGRES_FORWARD), _run(POSTGRES_REVERSE)),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:18
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_circle_stats(apps, schema_editor):
+    """Count members and date each circle's latest post or message."""
+    Circle = apps.get_model('core', 'Circle')
+    circles = Circle.objects.annotate(
+        members=Count('circlemembership', distinct=True),
+        last_post=Max('post__created_at'),
+        last_message=Max('messages__timestamp'),
+    )
+    for circle in circles.iterator(chunk_size=500):
+        circle.member_count = circle.members
+        latest = [t for t in (circle.last_post, circle.last_message) if t is not None]
+        if latest:
+            circle.last_activity_at = max(latest)
+        circle.save(update_fields=['member_count', 'last_activity_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='circle',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='circle',
+            name='member_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='circle',
+            index=models.Index(fields=['-member_count', 'id'], name='core_circle_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='circle',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='core_circle_activity_idx'),
+        ),
+        migrations.RunPython(backfill_circle_stats, reverse_code=migrations.RunPython.noop),
+    ]
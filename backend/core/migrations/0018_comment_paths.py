@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+SEGMENT_WIDTH = 10
+# core.threads.MAX_DEPTH when this migration was written; the path column holds MAX_DEPTH + 1 segments.
+MAX_DEPTH = 24
+
+
+def backfill_comment_paths(apps, schema_editor):
+    """Give every comment its materialized path; parents always have smaller ids.
+
+    Replies nested deeper than MAX_DEPTH are re-attached to their deepest
+    allowed ancestor, as core.threads.reply_position does.
+    """
+    Comment = apps.get_model('core', 'Comment')
+    known = {}
+    batch = []
+    for comment in Comment.objects.order_by('pk').only('pk', 'parent_id').iterator(chunk_size=1000):
+        parent_path, depth = known.get(comment.parent_id, ('', -1))
+        if depth >= MAX_DEPTH:
+            parent_path, depth = parent_path[:-SEGMENT_WIDTH], depth - 1
+            comment.parent_id = int(parent_path[-SEGMENT_WIDTH:])
+        comment.path = parent_path + str(comment.pk).zfill(SEGMENT_WIDTH)
+        comment.depth = depth + 1
+        known[comment.pk] = (comment.path, comment.depth)
+        batch.append(comment)
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path', 'depth', 'parent'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path', 'depth', 'parent'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_circle_directory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=250),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='core_comment_path_idx'),
+        ),
+        migrations.RunPython(backfill_comment_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_user_stats(apps, schema_editor):
+    """Count each user's posts, comments and likes received."""
+    user_model = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('core', 'Post')
+    Comment = apps.get_model('core', 'Comment')
+    Like = apps.get_model('core', 'Like')
+    UserStats = apps.get_model('core', 'UserStats')
+
+    def per_user(queryset, field):
+        return dict(queryset.order_by().values(field).annotate(n=Count('pk')).values_list(field, 'n'))
+
+    posts = per_user(Post.objects.all(), 'user')
+    comments = per_user(Comment.objects.all(), 'user')
+    likes = per_user(Like.objects.all(), 'post__user')
+    UserStats.objects.bulk_create(
+        [
+            UserStats(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                comments_count=comments.get(user_id, 0),
+                likes_received=likes.get(user_id, 0),
+            )
+            for user_id in user_model.objects.values_list('pk', flat=True).iterator(chunk_size=500)
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_comment_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.IntegerField(default=0)),
+                ('comments_count', models.IntegerField(default=0)),
+                ('likes_received', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_user_stats, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:51
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_scores(apps, schema_editor):
+    """Score every user from the counters 0019 filled in."""
+    UserStats = apps.get_model('core', 'UserStats')
+    UserStats.objects.update(score=F('posts_count') * 5 + F('comments_count') * 2 + F('likes_received'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_user_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-score', 'user'], name='core_userstats_score_idx'),
+        ),
+        migrations.RunPython(backfill_scores, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, user_field):
+    counted = queryset.filter(**{user_field: OuterRef('pk')}).order_by().values(user_field)
+    return Coalesce(Subquery(counted.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), 0)
+
+
+def rescore_named_content(apps, schema_editor):
+    """Score only non-anonymous posts, comments and likes (core.sparks); counters are unchanged."""
+    UserStats = apps.get_model('core', 'UserStats')
+    Post = apps.get_model('core', 'Post')
+    Comment = apps.get_model('core', 'Comment')
+    Like = apps.get_model('core', 'Like')
+    UserStats.objects.update(
+        score=_count(Post.objects.filter(is_anonymous=False), 'user') * 5
+        + _count(Comment.objects.filter(is_anonymous=False), 'user') * 2
+        + _count(Like.objects.filter(post__is_anonymous=False), 'post__user')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_sparks_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(rescore_named_content, reverse_code=migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ import bleach
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -43,6 +44,17 @@ class CustomUser(AbstractUser):
 class Circle(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Denormalized by core.signals on join/leave and on new posts/messages
+    # (see the reconcile_circle_counters command for repairing drift).
+    member_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Directory sort orders: by size and by recent activity.
+            models.Index(fields=["-member_count", "id"], name="core_circle_size_idx"),
+            models.Index(fields=["-last_activity_at", "-id"], name="core_circle_activity_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -59,6 +71,20 @@ class Post(models.Model):
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
     circle = models.ForeignKey(Circle, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized counters, kept in step with Like/Comment writes by core.signals
+    # (see the reconcile_post_counters command for repairing drift).
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    # Precomputed "top" feed rank (see core.ranking), refreshed on like/comment writes.
+    hot_score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-hot_score", "-id"], name="core_post_hot_idx"),
+            # Newest-first feeds: everything (staff, public) and per circle.
+            models.Index(fields=["-created_at", "-id"], name="core_post_created_idx"),
+            models.Index(fields=["circle", "-created_at", "-id"], name="core_post_circle_feed_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} by {'Anonymous' if self.is_anonymous else self.user}"
@@ -71,6 +97,18 @@ class Comment(models.Model):
     is_anonymous = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    # Materialized path (ancestor ids, root first) and nesting level; see core.threads
+    path = models.CharField(max_length=250, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Top-level threads of a post (parent IS NULL) by date, and reply threads.
+            models.Index(fields=["post", "parent", "created_at", "id"], name="core_comment_thread_idx"),
+            models.Index(fields=["parent", "created_at", "id"], name="core_comment_replies_idx"),
+            # Whole posts and any subtree, in display order, with one range scan.
+            models.Index(fields=["post", "path"], name="core_comment_path_idx"),
+        ]
 
     def __str__(self):
         return f"Comment by {'Anonymous' if self.is_anonymous else self.user}"
@@ -87,6 +125,27 @@ class Like(models.Model):
         return f"{self.user} likes {self.post}"
 
 
+class TimelineEntry(models.Model):
+    """Materialized home feed: one row per (reader, post visible to them).
+
+    Rows are written by core.timeline when posts are created and when
+    memberships change, so reading a home feed is a single range scan over
+    ``(user, created_at, post)``. ``created_at`` mirrors ``Post.created_at``.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="core_timeline_feed_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.user_id}'s timeline"
+
+
 class CircleMembership(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     circle = models.ForeignKey(Circle, on_delete=models.CASCADE)
@@ -106,6 +165,11 @@ class Message(models.Model):
     is_anonymous = models.BooleanField(default=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["circle", "-timestamp", "-id"], name="core_message_circle_idx"),
+        ]
+
     def __str__(self):
         return f"Message in {self.circle} by {'Anonymous' if self.is_anonymous else self.user}"
 
@@ -130,6 +194,52 @@ class Report(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-created_at"], name="core_report_status_idx"),
+        ]
+
     def __str__(self):
         return f"Report by {self.user} on {self.content_type} {self.object_id}"
 
+
+
+class ContentVersion(models.Model):
+    """Monotonic version stamp for a cacheable resource (``feed``, ``post:12``, ...).
+
+    Bumped by core.signals whenever the resource's representation may have
+    changed; core.versions turns the stamps into ETag/Last-Modified headers.
+    Kept in the database (not the per-process cache) so every worker agrees.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key}@{self.version}"
+
+
+class UserStats(models.Model):
+    """Per-user counters behind the Agora Sparks score.
+
+    Moved by core.signals (and core.likes, which writes likes directly) as
+    content is created and deleted, so a profile reads one row instead of
+    counting. ``score`` is stored and indexed alongside them so leaderboards
+    and a user's rank are index range scans (see core.sparks).
+    ``rebuild_user_stats`` recomputes everything from the content tables.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    posts_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    likes_received = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "user"], name="core_userstats_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.user_id}"
@@ -0,0 +1,191 @@
+"""Keyset (cursor) pagination for the core API.
+
+Pages are addressed by the sort key of the last row a client has seen
+instead of an OFFSET, so fetching page 1000 costs the same index range
+scan as fetching page 1. Cursors are opaque base64 tokens; clients should
+only ever echo back the ``next`` URL they were given.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_position(obj, ordering):
+    """Opaque cursor pointing just past ``obj`` in a listing sorted by ``ordering``."""
+    values = []
+    for field in ordering:
+        value = getattr(obj, field.lstrip('-'))
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def seek(ordering, position):
+    """Rows strictly after ``position`` in ``ordering``: ``(a, b, c) > (va, vb, vc)`` per direction.
+
+    Expanded as ``a > va OR (a = va AND b > vb) OR ...`` so mixed
+    directions work, and ANDed with the redundant ``a >= va`` so the database
+    starts an index range scan at the position instead of filtering its way
+    there from the first row.
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, position, strict=True):
+        name = field.lstrip('-')
+        op = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal_prefix & Q(**{f'{name}__{op}': value})
+        equal_prefix &= Q(**{name: value})
+    leading = ordering[0]
+    bound = 'lte' if leading.startswith('-') else 'gte'
+    return Q(**{f'{leading.lstrip("-")}__{bound}': position[0]}) & condition
+
+
+class KeysetCursorPagination(BasePagination):
+    """Paginate a queryset by a composite, unique sort key.
+
+    ``ordering`` lists the sort fields (``-`` prefix for descending) and must
+    end with a unique column (normally ``id``) so every row has a distinct
+    position. Views may override it per request by setting
+    ``cursor_ordering``; each field must be readable as an attribute on the
+    returned objects (use ``annotate`` for joined columns).
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'cursor_ordering', None) or self.ordering)
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw:
+            try:
+                size = int(raw)
+            except (TypeError, ValueError):
+                size = 0
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering_fields = self.get_ordering(view)
+        self.page_size_value = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering_fields)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+
+        # Fetch one extra row to learn whether another page exists without a COUNT(*).
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    # --- cursor encoding -------------------------------------------------
+
+    def encode_cursor(self, obj):
+        return encode_position(obj, self.ordering_fields)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            if not isinstance(values, list) or len(values) != len(self.ordering_fields):
+                raise ValueError(encoded)
+            return [parse_datetime(v) or v if isinstance(v, str) else v for v in values]
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message) from None
+
+    def _after(self, position):
+        return seek(self.ordering_fields, position)
+
+
+class PostCursorPagination(KeysetCursorPagination):
+    """Newest-first feed pages keyed on ``(created_at, id)``."""
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    max_page_size = 100
+
+
+class CommentCursorPagination(KeysetCursorPagination):
+    """Top-level comments newest first; reply threads pass ``REPLY_ORDERING``."""
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    max_page_size = 100
+
+
+REPLY_ORDERING = ('created_at', 'id')
+
+
+class CirclePagination(KeysetCursorPagination):
+    """Circle directory pages; the view picks one of ``CIRCLE_ORDERINGS``."""
+
+    ordering = ('name', 'id')
+    page_size = 50
+    max_page_size = 100
+
+
+MESSAGE_ORDERING = ('-timestamp', '-id')
+
+
+class MessagePagination(KeysetCursorPagination):
+    """Circle chat history, newest first; ``?before=`` is the oldest message already loaded."""
+
+    ordering = MESSAGE_ORDERING
+    page_size = 50
+    max_page_size = 100
+    cursor_query_param = 'before'
+
+
+CIRCLE_ORDERINGS = {
+    'name': ('name', 'id'),
+    'size': ('-member_count', 'id'),
+    'activity': ('-last_activity_at', '-id'),
+}
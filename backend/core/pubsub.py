@@ -0,0 +1,194 @@
+"""Publish/subscribe for realtime features (circle chat, live post updates).
+
+``broker()`` returns the process-wide broker chosen by ``CHAT_PUBSUB_URL``:
+
+* empty or ``memory://``: ``InProcessBroker``, for tests and single-process
+  deployments; only sockets served by this process see a message
+* ``redis://`` / ``rediss://``: ``RedisBroker``, shared by every worker
+  (needs the ``redis`` package)
+
+Other schemes can be added to ``BROKERS``. A broker has these methods:
+``publish(channel, message)``, a plain (sync) call usable from views,
+signal handlers and ``sync_to_async`` code, and ``subscribe(channel)``, an
+async context manager yielding an async iterator of messages. Messages are
+JSON-compatible dicts.
+
+Channels whose readers resume after a disconnect also keep a replay log:
+``log(channel, message)`` numbers the message (``message['id']``, rising
+across every process sharing the broker), keeps the last ``LOG_SIZE`` for
+``LOG_SECONDS`` and publishes it; ``replay(channel, after)`` returns the
+kept messages numbered above ``after``, oldest first.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+# Messages a slow subscriber may fall behind by before the oldest are dropped.
+SUBSCRIBER_BUFFER = 100
+# Replay logs keep this many of a channel's latest messages, for this many seconds.
+LOG_SIZE = 1000
+LOG_SECONDS = 300
+
+
+def circle_channel(circle_id):
+    return f'circle:{circle_id}'
+
+
+class InProcessBroker:
+    """Fans messages out to subscribers in this process, on whatever event loop they run."""
+
+    def __init__(self, url=''):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._logs = {}
+        # Start from the clock so numbers keep rising across restarts.
+        self._last_id = int(time.time() * 1000)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down; its context manager never will.
+                self._remove(channel, (loop, queue))
+
+    def log(self, channel, message):
+        with self._lock:
+            self._last_id += 1
+            message['id'] = self._last_id
+            self._logs.setdefault(channel, deque(maxlen=LOG_SIZE)).append((time.monotonic(), message))
+        self.publish(channel, message)
+
+    def replay(self, channel, after):
+        cutoff = time.monotonic() - LOG_SECONDS
+        with self._lock:
+            kept = list(self._logs.get(channel, ()))
+        return [message for at, message in kept if at >= cutoff and message['id'] > after]
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def _remove(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(SUBSCRIBER_BUFFER))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            yield _drain(subscriber[1])
+        finally:
+            self._remove(channel, subscriber)
+
+
+async def _drain(queue):
+    while True:
+        yield await queue.get()
+
+
+class RedisBroker:
+    """Redis PUBLISH/SUBSCRIBE, so every worker process sees every message."""
+
+    def __init__(self, url):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise ImproperlyConfigured("CHAT_PUBSUB_URL points at Redis, but redis is not installed.") from exc
+        self._url = url
+        self._asyncio = redis.asyncio
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(channel, json.dumps(message))
+
+    def log(self, channel, message):
+        # The sequence never expires, so numbers only ever rise; the log itself is a
+        # sorted set scored by number, trimmed to LOG_SIZE and dropped when idle.
+        message['id'] = self._client.incr(f'{channel}:seq')
+        data = json.dumps(message)
+        key = f'{channel}:log'
+        pipe = self._client.pipeline()
+        pipe.zadd(key, {data: message['id']})
+        pipe.zremrangebyrank(key, 0, -LOG_SIZE - 1)
+        pipe.expire(key, LOG_SECONDS)
+        pipe.publish(channel, data)
+        pipe.execute()
+
+    def replay(self, channel, after):
+        return [json.loads(raw) for raw in self._client.zrangebyscore(f'{channel}:log', f'({after}', '+inf')]
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        client = self._asyncio.from_url(self._url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            yield _listen(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+async def _listen(pubsub):
+    async for raw in pubsub.listen():
+        if raw['type'] == 'message':
+            yield json.loads(raw['data'])
+
+
+BROKERS = {'': InProcessBroker, 'memory': InProcessBroker, 'redis': RedisBroker, 'rediss': RedisBroker}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """The process-wide broker for ``CHAT_PUBSUB_URL``."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = getattr(settings, 'CHAT_PUBSUB_URL', '')
+                scheme = urlsplit(url).scheme
+                if scheme not in BROKERS:
+                    raise ImproperlyConfigured(f"Unsupported CHAT_PUBSUB_URL scheme: {scheme!r}")
+                _broker = BROKERS[scheme](url)
+    return _broker
+
+
+def publish(channel, message):
+    """Publish ``message``, logging rather than raising if the broker is unreachable."""
+    try:
+        broker().publish(channel, message)
+    except Exception:  # noqa: BLE001
+        logger.exception("[pubsub] publishing to %s failed", channel)
+
+
+def log(channel, message):
+    """``broker().log()``, logging rather than raising if the broker is unreachable."""
+    try:
+        broker().log(channel, message)
+    except Exception:  # noqa: BLE001
+        logger.exception("[pubsub] logging to %s failed", channel)
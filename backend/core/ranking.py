@@ -0,0 +1,40 @@
+"""Hot ranking for the "top" feed.
+
+Scores follow the log-engagement-plus-age scheme popularised by Reddit:
+``log10(likes + 2 * comments) + age / DECAY_SECONDS``. Every post's age term
+grows at the same rate, so relative order decays with time without having
+to rewrite old rows; a post needs 10x the engagement to outrank one posted
+``DECAY_SECONDS`` later. Scores only change when engagement does, which the
+signal handlers apply per post; ``refresh_hot_scores`` is the periodic pass
+that recomputes recent posts in bulk.
+"""
+
+import math
+from datetime import UTC, datetime
+
+from django.utils import timezone
+
+from .models import Post
+
+HOT_ORDERING = ('-hot_score', '-id')
+EPOCH = datetime(2025, 1, 1, tzinfo=UTC)
+DECAY_SECONDS = 45000
+COMMENT_WEIGHT = 2
+
+
+def hot_score(likes_count, comments_count, created_at):
+    engagement = max(likes_count + COMMENT_WEIGHT * comments_count, 1)
+    age = (created_at - EPOCH).total_seconds()
+    return round(math.log10(engagement) + age / DECAY_SECONDS, 7)
+
+
+def score_new_post(post):
+    """Initial score for an unsaved post (``created_at`` is not set yet)."""
+    post.hot_score = hot_score(post.likes_count, post.comments_count, post.created_at or timezone.now())
+
+
+def refresh_post(post_id):
+    """Recompute one post's score from its current counters."""
+    row = Post.objects.filter(pk=post_id).values_list('likes_count', 'comments_count', 'created_at').first()
+    if row is not None:
+        Post.objects.filter(pk=post_id).update(hot_score=hot_score(*row))
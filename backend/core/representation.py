@@ -0,0 +1,109 @@
+"""Shared post representations with a per-viewer overlay.
+
+Most of a rendered post (fields, author, comment tree or preview) is the
+same for every reader. It is rendered once in a viewer-independent form,
+with anonymous authors always redacted, and cached under the post's
+version stamp (core.versions), so post, comment and like writes invalidate
+it. Each request then applies a cheap overlay: the ``liked`` flag, and the
+real author of anonymous posts and comments for their owner and staff.
+
+A write that commits while a page is being rendered can leave a stale
+entry behind; it expires after ``POST_REPRESENTATION_CACHE_TIMEOUT``
+seconds at the latest.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import versions
+
+TIMEOUT = getattr(settings, 'POST_REPRESENTATION_CACHE_TIMEOUT', 300)
+
+ANONYMOUS_USER = {'id': None, 'username': 'Anonymous', 'display_name': 'Anonymous'}
+# The real author of a redacted node; only ever present in the cached form.
+AUTHOR_KEY = '_author'
+# Keys holding nested comment lists.
+_CHILDREN = ('comments', 'comments_preview', 'replies')
+
+
+def can_see_author(viewer, author_id):
+    """Whether ``viewer`` may see who wrote an anonymous post or comment."""
+    if not viewer or not getattr(viewer, 'is_authenticated', False):
+        return False
+    return bool(viewer.is_staff) or viewer.id == author_id
+
+
+def redact_author(data, instance, context):
+    """Replace the author of an anonymous ``instance`` in its rendered ``data``.
+
+    Per-request renders keep the author for the owner and staff; shared
+    renders always redact and stash the author for the overlay.
+    """
+    if not instance.is_anonymous or 'user' not in data:
+        return data
+    if context.get('shared_representations') is not None:
+        data[AUTHOR_KEY] = data['user']
+    else:
+        request = context.get('request')
+        if can_see_author(getattr(request, 'user', None), instance.user_id):
+            return data
+    data['user'] = dict(ANONYMOUS_USER)
+    return data
+
+
+def _reveal(node, viewer):
+    author = node.pop(AUTHOR_KEY, None)
+    if author is not None and can_see_author(viewer, author.get('id')):
+        node['user'] = author
+    for name in _CHILDREN:
+        for child in node.get(name) or ():
+            _reveal(child, viewer)
+
+
+def reveal_author(data, viewer):
+    """Restore the author redacted from a shared render if ``viewer`` may see it (in place)."""
+    _reveal(data, viewer)
+    return data
+
+
+class SharedRepresentations:
+    """Cached shared renders of one page of posts, looked up in one round trip.
+
+    ``shape`` names the serializer and ``fields`` the rendered field names;
+    both are part of the cache key along with the post and author versions.
+    """
+
+    def __init__(self, posts, request, shape, fields):
+        self.viewer = getattr(request, 'user', None)
+        self.liked_post_ids = set()
+        stamps = versions.read([versions.post_key(post.id) for post in posts] + [versions.USERS])
+        users = versions.token(stamps, versions.USERS)
+        origin = f"{request.scheme}://{request.get_host()}" if request is not None else ''
+        signature = '|'.join([shape, ','.join(sorted(set(fields) - {'liked'})), origin])
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+        self._keys = {
+            post.id: f"post-repr:{digest}:{post.id}:{versions.token(stamps, versions.post_key(post.id))}:{users}"
+            for post in posts
+        }
+        self._hits = cache.get_many(list(self._keys.values())) if self._keys else {}
+
+    def misses(self):
+        """Ids of posts that still have to be rendered."""
+        return [post_id for post_id, key in self._keys.items() if key not in self._hits]
+
+    def get(self, post_id):
+        return self._hits.get(self._keys.get(post_id))
+
+    def store(self, post_id, data):
+        key = self._keys.get(post_id)
+        if key is not None:
+            cache.set(key, data, TIMEOUT)
+
+    def personalize(self, data):
+        """Apply the viewer's overlay to a shared render (in place)."""
+        if 'liked' in data:
+            data['liked'] = data['id'] in self.liked_post_ids
+        _reveal(data, self.viewer)
+        return data
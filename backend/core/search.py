@@ -0,0 +1,136 @@
+"""Full-text search over post titles, post bodies and comments.
+
+PostgreSQL keeps a weighted ``search_vector`` tsvector as a stored generated
+column on core_post and core_comment, each with a GIN index. SQLite (tests,
+local development) mirrors the same text into the ``core_search_fts`` FTS5
+table through triggers. Either way the database updates the index on every
+write, so there is nothing to rebuild. The index is created by migration
+0014; the SQLite triggers are (re)installed by ``install_triggers`` after
+every migrate, since SQLite drops them whenever Django rebuilds a table.
+
+A comment match counts towards its post, so results are always posts,
+ranked by relevance and restricted to what the reader may see.
+"""
+
+import re
+
+from django.db import connection, connections
+
+MAX_RESULTS = 50
+# A comment match is worth this fraction of a match in the post itself.
+COMMENT_WEIGHT = 0.5
+
+_POSTGRES_SQL = """
+    WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+    hits AS (
+        SELECT p.id AS post_id, ts_rank(p.search_vector, q.query) AS rank
+        FROM core_post p, q WHERE p.search_vector @@ q.query
+        UNION ALL
+        SELECT c.post_id, ts_rank(c.search_vector, q.query) * %s
+        FROM core_comment c, q WHERE c.search_vector @@ q.query
+    )
+    SELECT h.post_id, SUM(h.rank) AS score
+    FROM hits h JOIN core_post p ON p.id = h.post_id
+    WHERE {visibility}
+    GROUP BY h.post_id
+    ORDER BY score DESC, h.post_id DESC
+    LIMIT %s
+"""
+
+# bm25() is lower-is-better; titles weigh twice as much as bodies. The CTE is
+# materialized because bm25() is only valid in a query that is not flattened.
+_SQLITE_SQL = """
+    WITH h AS MATERIALIZED (
+        SELECT post_id, -bm25(core_search_fts, 2.0, 1.0) * (CASE kind WHEN 'comment' THEN %s ELSE 1.0 END) AS rank
+        FROM core_search_fts WHERE core_search_fts MATCH %s
+    )
+    SELECT h.post_id, SUM(h.rank) AS score
+    FROM h JOIN core_post p ON p.id = h.post_id
+    WHERE {visibility}
+    GROUP BY h.post_id
+    ORDER BY score DESC, h.post_id DESC
+    LIMIT %s
+"""
+
+
+# Rowids: 2 * post id for posts, 2 * comment id + 1 for comments.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_post_search_ai AFTER INSERT ON core_post BEGIN
+        INSERT INTO core_search_fts (rowid, title, body, kind, post_id)
+        VALUES (new.id * 2, new.title, new.content, 'post', new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_post_search_au AFTER UPDATE OF title, content ON core_post BEGIN
+        UPDATE core_search_fts SET title = new.title, body = new.content WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_post_search_ad AFTER DELETE ON core_post BEGIN
+        DELETE FROM core_search_fts WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_comment_search_ai AFTER INSERT ON core_comment BEGIN
+        INSERT INTO core_search_fts (rowid, title, body, kind, post_id)
+        VALUES (new.id * 2 + 1, '', new.content, 'comment', new.post_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_comment_search_au AFTER UPDATE OF content ON core_comment BEGIN
+        UPDATE core_search_fts SET body = new.content WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_comment_search_ad AFTER DELETE ON core_comment BEGIN
+        DELETE FROM core_search_fts WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+
+def install_triggers(using):
+    """Install the SQLite triggers feeding ``core_search_fts`` (no-op elsewhere)."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite' or 'core_search_fts' not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
+
+
+def _visibility(user):
+    """SQL condition on ``p`` (core_post) limiting results to what ``user`` may see."""
+    if not user or not getattr(user, 'is_authenticated', False):
+        return 'p.circle_id IS NULL', []
+    if user.is_staff:
+        return '1 = 1', []
+    return (
+        '(p.circle_id IS NULL OR p.circle_id IN '
+        '(SELECT circle_id FROM core_circlemembership WHERE user_id = %s))'
+    ), [user.id]
+
+
+def _fts5_query(text):
+    # Quote every word so user input can't use (or break) FTS5 query syntax.
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def search_post_ids(text, user, limit=MAX_RESULTS):
+    """Ids of the posts matching ``text`` that ``user`` may see, best first."""
+    text = (text or '').strip()
+    limit = max(1, min(limit, MAX_RESULTS))
+    visibility, visibility_params = _visibility(user)
+    if connection.vendor == 'postgresql':
+        sql = _POSTGRES_SQL.format(visibility=visibility)
+        params = [text, COMMENT_WEIGHT, *visibility_params, limit]
+    else:
+        text = _fts5_query(text)
+        sql = _SQLITE_SQL.format(visibility=visibility)
+        params = [COMMENT_WEIGHT, text, *visibility_params, limit]
+    if not text:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,6 +1,12 @@
 from rest_framework import serializers
 
-from .models import Comment, Post
+from . import threads
+from .feed import COMMENT_PREVIEW_SIZE, CommentTree, load_comment_tree
+from .models import Comment, Message, Post
+from .representation import redact_author
+from .threads import MAX_DEPTH
+
+MAX_MESSAGE_LENGTH = 2000
 
 
 class UserLiteSerializer(serializers.Serializer):
@@ -33,69 +39,155 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'post', 'content', 'is_anonymous', 'created_at', 'parent', 'replies']
-        read_only_fields = ['id', 'user', 'post', 'created_at', 'replies']
+        fields = ['id', 'user', 'post', 'content', 'is_anonymous', 'created_at', 'parent', 'depth', 'replies']
+        read_only_fields = ['id', 'user', 'post', 'created_at', 'depth', 'replies']
 
     def get_replies(self, obj):
-        if obj.parent is None:
-            replies = obj.replies.all()
-            if replies.exists():
-                return CommentSerializer(replies, many=True, context=self.context).data
+        # Replies always nest to any depth. Pages preload their comment tree; a lone
+        # comment loads its own subtree with one range query over comment paths.
+        context = self.context
+        if context.get('comment_tree') is None:
+            context = {**context, 'comment_tree': CommentTree(threads.subtree(obj).select_related('user'))}
+        replies = context['comment_tree'].replies(obj.id)
+        if replies:
+            return CommentSerializer(replies, many=True, context=context).data
         return []
 
+    def validate_parent(self, parent):
+        if parent is not None and parent.depth >= MAX_DEPTH:
+            raise serializers.ValidationError(f'Replies can nest at most {MAX_DEPTH} levels deep.')
+        return parent
+
     def to_representation(self, instance):
-        # Base representation
-        data = super().to_representation(instance)
-        request = self.context.get('request')
-        viewer = getattr(request, 'user', None)
         # Redact author details if the comment is anonymous and viewer is not author/staff
-        if instance.is_anonymous:
-            is_owner = bool(viewer and viewer.is_authenticated and viewer.id == getattr(instance.user, 'id', None))
-            is_staff = bool(viewer and getattr(viewer, 'is_staff', False))
-            if not (is_owner or is_staff):
-                data['user'] = {
-                    'id': None,
-                    'username': 'Anonymous',
-                    'display_name': 'Anonymous',
-                }
+        return redact_author(super().to_representation(instance), instance, self.context)
+
+
+class CommentPreviewSerializer(CommentSerializer):
+    """A comment without its reply thread (feed previews)."""
+
+    class Meta(CommentSerializer.Meta):
+        fields = [f for f in CommentSerializer.Meta.fields if f != 'replies']
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    """A circle chat message. Anonymous senders are redacted like comment authors."""
+    user = UserLiteSerializer(read_only=True)
+    circle = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Message
+        fields = ['id', 'circle', 'user', 'content', 'is_anonymous', 'timestamp']
+        read_only_fields = ['id', 'circle', 'user', 'timestamp']
+        extra_kwargs = {'content': {'max_length': MAX_MESSAGE_LENGTH}}
+
+    def to_representation(self, instance):
+        return redact_author(super().to_representation(instance), instance, self.context)
+
+
+class SparseFieldsMixin:
+    """Render only the fields a client asked for.
+
+    Reads two sets from the serializer context: ``fields`` (``?fields=``, a
+    whitelist; ``id`` is always kept) and ``include`` (``?include=``, opt-in
+    extras). Fields listed in ``Meta.optional_fields`` are only rendered when
+    included or explicitly requested.
+
+    The whitelist only shapes output: when the serializer is validating
+    input, writable fields are always kept and the rendered result is
+    trimmed instead.
+    """
+
+    def _keep(self, name):
+        wanted = self.context.get('fields')
+        include = self.context.get('include') or set()
+        if wanted is not None:
+            return name == 'id' or name in wanted or name in include
+        return name not in getattr(self.Meta, 'optional_fields', ()) or name in include
+
+    def get_fields(self):
+        fields = super().get_fields()
+        writing = hasattr(self, 'initial_data')
+        for name, field in list(fields.items()):
+            if not self._keep(name) and not (writing and not field.read_only):
+                fields.pop(name)
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(self, 'initial_data'):
+            for name in [name for name in data if name in self.fields and not self._keep(name)]:
+                data.pop(name)
         return data
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserLiteSerializer(read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
     liked = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
     image = serializers.ImageField(required=False, allow_null=True)
 
     class Meta:
         model = Post
-        fields = ['id', 'user', 'title', 'content', 'is_anonymous', 'image_url', 'image', 'circle', 'created_at', 'likes_count', 'liked', 'comments']
+        fields = ['id', 'user', 'title', 'content', 'is_anonymous', 'image_url', 'image', 'circle', 'created_at', 'likes_count', 'comments_count', 'liked', 'comments']
 
     def get_liked(self, obj):
         request = self.context.get('request')
         if not request or not request.user or not request.user.is_authenticated:
             return False
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
         return obj.likes.filter(user=request.user).exists()
 
     def get_comments(self, obj):
         try:
-            top_level_comments = obj.comments.filter(parent=None).order_by('-created_at')
-            return CommentSerializer(top_level_comments, many=True, context=self.context).data
+            # Same nesting with or without the page's preloaded tree.
+            context = self.context
+            if context.get('comment_tree') is None:
+                context = {**context, 'comment_tree': load_comment_tree([obj.id])}
+            return CommentSerializer(context['comment_tree'].roots(obj.id), many=True, context=context).data
         except Exception:
             return []
 
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        request = self.context.get('request')
-        viewer = getattr(request, 'user', None)
-        if instance.is_anonymous:
-            is_owner = bool(viewer and viewer.is_authenticated and viewer.id == getattr(instance.user, 'id', None))
-            is_staff = bool(viewer and getattr(viewer, 'is_staff', False))
-            if not (is_owner or is_staff):
-                data['user'] = {
-                    'id': None,
-                    'username': 'Anonymous',
-                    'display_name': 'Anonymous',
-                }
+        # Pages prepared by the view reuse a cached viewer-independent render and
+        # only overlay the viewer's bits; anything else is rendered per request.
+        shared = self.context.get('shared_representations')
+        if shared is None:
+            return self._merge_pending_likes(redact_author(super().to_representation(instance), instance, self.context))
+        data = shared.get(instance.id)
+        if data is None:
+            data = redact_author(super().to_representation(instance), instance, self.context)
+            shared.store(instance.id, data)
+        return self._merge_pending_likes(shared.personalize(data))
+
+    def _merge_pending_likes(self, data):
+        # Likes buffered by write-behind mode (core.like_buffer) are not in likes_count yet.
+        deltas = self.context.get('pending_like_deltas')
+        if deltas and 'likes_count' in data:
+            data['likes_count'] += deltas.get(data['id'], 0)
         return data
+
+
+class PostListSerializer(PostSerializer):
+    """Feed representation: comment count and a short preview instead of the full tree.
+
+    The complete, paginated thread lives at ``/api/posts/{id}/comments/``;
+    ``?include=comments`` embeds it anyway.
+    """
+    comments_preview = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['comments_preview']
+        optional_fields = ['comments']
+
+    def get_comments_preview(self, obj):
+        previews = self.context.get('comment_previews')
+        if previews is not None:
+            latest = previews.get(obj.id, [])
+        else:
+            latest = obj.comments.filter(parent=None).select_related('user').order_by('-created_at', '-id')[:COMMENT_PREVIEW_SIZE]
+        return CommentPreviewSerializer(latest, many=True, context=self.context).data
@@ -0,0 +1,177 @@
+"""Signal handlers that keep denormalized data in step with content writes.
+
+Handlers run inside the caller's transaction, so wrap multi-step writes in
+``transaction.atomic()`` to commit the row and its derived data together.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import live, pubsub, ranking, search, sparks, threads, timeline, versions
+from .autocomplete import circle_index
+from .models import Circle, CircleMembership, Comment, Like, Message, Post
+from .tasks import enqueue
+
+
+def _bump(post_id, field, delta):
+    Post.objects.filter(pk=post_id).update(**{field: F(field) + delta})
+    ranking.refresh_post(post_id)
+
+
+def _touch_post(post):
+    # Invalidate conditional GETs of the post itself and of every list showing it.
+    keys = [versions.FEED, versions.post_key(post.id)]
+    if post.circle_id is not None:
+        keys.append(versions.circle_key(post.circle_id))
+    versions.bump(*keys)
+
+
+def _circle_active(circle_id, at, resolution=timedelta(0)):
+    # Directory "activity" order: only ever move last_activity_at forward, and by at least
+    # `resolution`. The stamps (and so every reader's directory ETag) only move with it.
+    stale = Circle.objects.filter(pk=circle_id, last_activity_at__lt=at - resolution)
+    if stale.update(last_activity_at=at):
+        versions.bump(versions.CIRCLES, versions.circle_key(circle_id))
+
+
+def _touch_circle(circle_id, feed=False, member_id=None):
+    keys = [versions.CIRCLES, versions.circle_key(circle_id)]
+    if feed:
+        # Memberships (and deleting a circle) change which posts a feed contains.
+        keys.append(versions.FEED)
+    if member_id is not None:
+        keys.append(versions.member_key(member_id))
+    versions.bump(*keys)
+
+
+@receiver(post_save, sender=Like)
+def like_saved(sender, instance, created, **kwargs):
+    if created:
+        _bump(instance.post_id, 'likes_count', 1)
+        sparks.bump(instance.post.user_id, public=not instance.post.is_anonymous, likes=1)
+        live.post_changed(instance.post_id)
+        _touch_post(instance.post)
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    _bump(instance.post_id, 'likes_count', -1)
+    sparks.bump(instance.post.user_id, public=not instance.post.is_anonymous, likes=-1)
+    live.post_changed(instance.post_id)
+    _touch_post(instance.post)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        threads.assign_path(instance)
+        _bump(instance.post_id, 'comments_count', 1)
+        sparks.bump(instance.user_id, public=not instance.is_anonymous, comments=1)
+        live.post_changed(instance.post_id, comment_id=instance.id)
+    _touch_post(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    _bump(instance.post_id, 'comments_count', -1)
+    sparks.bump(instance.user_id, public=not instance.is_anonymous, comments=-1)
+    live.post_changed(instance.post_id)
+    _touch_post(instance.post)
+
+
+@receiver(pre_save, sender=Post)
+def post_scored(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        ranking.score_new_post(instance)
+    elif update_fields is None or 'circle' in update_fields:
+        # Remember where the post was, so post_saved can re-deliver a moved post.
+        instance._saved_circle_id = Post.objects.filter(pk=instance.pk).values_list('circle_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author_entry(instance)
+        sparks.bump(instance.user_id, public=not instance.is_anonymous, posts=1)
+        live.post_created(instance)
+        enqueue(timeline.fan_out_post, instance.id)
+        if instance.circle_id is not None:
+            _circle_active(instance.circle_id, instance.created_at)
+    else:
+        moved_from = getattr(instance, '_saved_circle_id', instance.circle_id)
+        if moved_from != instance.circle_id:
+            # Readers who lost sight of the post lose it now; the new audience gets it later.
+            timeline.prune_post(instance)
+            enqueue(timeline.fan_out_post, instance.id)
+            if moved_from is not None:
+                versions.bump(versions.circle_key(moved_from))
+    _touch_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    sparks.bump(instance.user_id, public=not instance.is_anonymous, posts=-1)
+    _touch_post(instance)
+
+
+@receiver(post_save, sender=Circle)
+def circle_saved(sender, instance, **kwargs):
+    _touch_circle(instance.id)
+    circle_id, name = instance.id, instance.name
+    transaction.on_commit(lambda: circle_index.update(circle_id, name))
+
+
+@receiver(post_delete, sender=Circle)
+def circle_deleted(sender, instance, **kwargs):
+    _touch_circle(instance.id, feed=True)
+    circle_id = instance.id
+    transaction.on_commit(lambda: circle_index.remove(circle_id))
+    transaction.on_commit(lambda: pubsub.publish(pubsub.circle_channel(circle_id), {'type': 'circle_deleted'}))
+
+
+@receiver(post_save, sender=CircleMembership)
+def membership_saved(sender, instance, created, **kwargs):
+    if created:
+        Circle.objects.filter(pk=instance.circle_id).update(member_count=F('member_count') + 1)
+        enqueue(timeline.backfill_user, instance.user_id, instance.circle_id)
+    _touch_circle(instance.circle_id, feed=True, member_id=instance.user_id)
+
+
+@receiver(post_delete, sender=CircleMembership)
+def membership_deleted(sender, instance, **kwargs):
+    # Pruned inline: a former member must stop seeing the circle immediately.
+    timeline.prune_circle(instance.user_id, instance.circle_id)
+    Circle.objects.filter(pk=instance.circle_id).update(member_count=F('member_count') - 1)
+    _touch_circle(instance.circle_id, feed=True, member_id=instance.user_id)
+    # ... and drop out of the circle's chat (core.chat closes their open sockets).
+    event = {'type': 'member_left', 'user_id': instance.user_id}
+    channel = pubsub.circle_channel(instance.circle_id)
+    transaction.on_commit(lambda: pubsub.publish(channel, event))
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    if created:
+        # A busy chat would otherwise rewrite the circle row on every message.
+        resolution = timedelta(seconds=getattr(settings, 'CIRCLE_ACTIVITY_RESOLUTION_SECONDS', 60))
+        _circle_active(instance.circle_id, instance.timestamp, resolution)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        enqueue(timeline.backfill_user, instance.id)
+    # Logins only touch last_login, which no post representation shows.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        versions.bump(versions.USERS)
+
+
+@receiver(post_migrate)
+def search_triggers_installed(sender, using, **kwargs):
+    if sender.label == 'core':
+        search.install_triggers(using)
@@ -0,0 +1,105 @@
+"""Per-user content counters and the Agora Sparks score (``UserStats``).
+
+``bump`` moves a user's counters and their stored ``score`` together with a
+single ``F()`` update; the signal handlers in core.signals call it on every
+post, comment and like write. The counters (shown only to the user
+themselves) count everything; the score, which leaderboards show to
+everyone, only counts what was posted under the user's name. Otherwise
+liking an anonymous post and watching whose score moves would unmask its
+author. Rows are created on first use. A missing row
+is never created just to be decremented, since that happens while the user
+themselves is being deleted.
+
+Leaderboards read the ``(-score, user)`` index: ``top`` takes the first rows
+of it, and ``rank`` counts the rows scoring higher, so neither sorts the
+user table. A circle's board starts from its memberships instead, so it
+only ever sorts or counts that circle's members. Ties share a rank
+("1, 2, 2, 4").
+"""
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import CircleMembership, Comment, Like, Post, UserStats
+
+FIELDS = {'posts': 'posts_count', 'comments': 'comments_count', 'likes': 'likes_received'}
+WEIGHTS = {'posts': 5, 'comments': 2, 'likes': 1}
+# Largest leaderboard page.
+MAX_LEADERS = 100
+
+
+def score(posts=0, comments=0, likes=0):
+    """Agora Sparks score: posts x 5 + comments x 2 + likes received."""
+    return posts * WEIGHTS['posts'] + comments * WEIGHTS['comments'] + likes * WEIGHTS['likes']
+
+
+def bump(user_id, public=True, **deltas):
+    """Add ``posts=``, ``comments=`` and/or ``likes=`` (received) to the user's counters.
+
+    The score moves too unless the content is anonymous (``public=False``).
+    """
+    changes = {FIELDS[name]: F(FIELDS[name]) + delta for name, delta in deltas.items() if delta}
+    if not changes or user_id is None:
+        return
+    if public:
+        changes['score'] = F('score') + score(**deltas)
+    if UserStats.objects.filter(pk=user_id).update(**changes):
+        return
+    if all(delta >= 0 for delta in deltas.values()):
+        UserStats.objects.bulk_create([UserStats(user_id=user_id)], ignore_conflicts=True)
+        UserStats.objects.filter(pk=user_id).update(**changes)
+
+
+def counts(user):
+    """``{'posts', 'comments', 'likes'}`` for ``user`` (zeros for anonymous users), one lookup."""
+    if not user or not getattr(user, 'is_authenticated', False):
+        return {'posts': 0, 'comments': 0, 'likes': 0}
+    row = UserStats.objects.filter(pk=user.pk).values_list(*FIELDS.values()).first() or (0, 0, 0)
+    return dict(zip(FIELDS, row, strict=True))
+
+
+def _count(queryset, user_field):
+    counted = queryset.filter(**{user_field: OuterRef('pk')}).order_by().values(user_field)
+    return Coalesce(Subquery(counted.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), 0)
+
+
+def actual_counts(users):
+    """Annotate ``users`` with the true ``actual_posts``, ``actual_comments`` and ``actual_likes``.
+
+    ``actual_public_posts``, ``actual_public_comments`` and
+    ``actual_public_likes`` count only non-anonymous content: the score's inputs.
+    """
+    return users.annotate(
+        actual_posts=_count(Post.objects.all(), 'user'),
+        actual_comments=_count(Comment.objects.all(), 'user'),
+        actual_likes=_count(Like.objects.all(), 'post__user'),
+        actual_public_posts=_count(Post.objects.filter(is_anonymous=False), 'user'),
+        actual_public_comments=_count(Comment.objects.filter(is_anonymous=False), 'user'),
+        actual_public_likes=_count(Like.objects.filter(post__is_anonymous=False), 'post__user'),
+    )
+
+
+def leaders(circle_id=None):
+    """Active users' stats, best score first (members of ``circle_id`` only, when given)."""
+    stats = UserStats.objects.filter(user__is_active=True)
+    if circle_id is not None:
+        stats = stats.filter(user__circlemembership__circle_id=circle_id)
+    return stats.order_by('-score', 'user_id')
+
+
+def top(limit, circle_id=None):
+    """The ``limit`` highest-scoring users as ``[(rank, stats)]``, ``stats.user`` loaded."""
+    leaders_page = list(leaders(circle_id).select_related('user')[:limit])
+    ranked = []
+    for position, stats in enumerate(leaders_page, start=1):
+        tied = ranked and ranked[-1][1].score == stats.score
+        ranked.append((ranked[-1][0] if tied else position, stats))
+    return ranked
+
+
+def rank(user, circle_id=None):
+    """``(rank, score)`` of ``user``; None if they are not on that leaderboard."""
+    if circle_id is not None and not CircleMembership.objects.filter(user=user, circle_id=circle_id).exists():
+        return None
+    own = UserStats.objects.filter(pk=user.pk).values_list('score', flat=True).first() or 0
+    return leaders(circle_id).filter(score__gt=own).count() + 1, own
@@ -0,0 +1,44 @@
+"""Minimal in-process background task runner.
+
+Work that should not hold up a request (timeline fan-out, ...) is handed to
+a small thread pool once the surrounding transaction commits. Set
+``CORE_TASKS_ALWAYS_EAGER = True`` (as the test settings do) to run tasks
+inline instead. Tasks must be idempotent: anything lost to a crash is
+repaired by the matching management command (e.g. ``rebuild_timelines``).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'CORE_TASK_WORKERS', 2)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='core-task')
+    return _executor
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:  # noqa: BLE001
+        logger.exception("[task] %s%r failed", getattr(func, '__name__', func), args)
+    finally:
+        # Worker threads own their DB connections; don't leak them.
+        close_old_connections()
+
+
+def enqueue(func, *args):
+    """Run ``func(*args)`` in the background after the current transaction commits."""
+    if getattr(settings, 'CORE_TASKS_ALWAYS_EAGER', False):
+        func(*args)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, func, args))
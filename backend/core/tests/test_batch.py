@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import Circle, Like, Post
+
+User = get_user_model()
+
+
+class BatchEndpointTest(TestCase):
+    """Test /api/batch/: several API calls answered in one response"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='batcher', password='pass', netid='batcher1')
+        self.post = Post.objects.create(user=self.user, title='Batched', content='Body')
+        Circle.objects.create(name='Batch Circle')
+        self.client.force_authenticate(self.user)
+
+    def _batch(self, requests, **extra):
+        return self.client.post('/api/batch/', {'requests': requests, **extra}, format='json')
+
+    def test_startup_calls_in_one_response(self):
+        """The SPA's startup reads come back in request order with their own statuses"""
+        resp = self._batch([
+            {'id': 'me', 'path': '/api/auth/me/'},
+            {'id': 'circles', 'path': '/api/circles/'},
+            {'id': 'posts', 'path': '/api/posts/?page_size=5'},
+            {'id': 'missing', 'path': '/api/nowhere/'},
+        ])
+        self.assertEqual(resp.status_code, 200)
+        results = resp.data['responses']
+        self.assertEqual([r['id'] for r in results], ['me', 'circles', 'posts', 'missing'])
+        self.assertEqual([r['status'] for r in results], [200, 200, 200, 404])
+        self.assertEqual(results[0]['body']['user']['username'], 'batcher')
+        self.assertEqual(results[1]['body'][0]['name'], 'Batch Circle')
+        self.assertEqual(results[2]['body']['results'][0]['id'], self.post.id)
+        self.assertIn('ETag', results[2]['headers'])
+
+    def test_writes_share_the_user_and_run_in_order(self):
+        """A write sub-request acts as the batch's user and later reads see it"""
+        resp = self._batch([
+            {'method': 'PUT', 'path': f'/api/posts/{self.post.id}/like/'},
+            {'path': f'/api/posts/{self.post.id}/?fields=likes_count&include=liked'},
+        ])
+        like, read = resp.data['responses']
+        self.assertEqual(like['body'], {'liked': True, 'likes_count': 1})
+        self.assertEqual((read['body']['likes_count'], read['body']['liked']), (1, True))
+        self.assertTrue(Like.objects.filter(user=self.user, post=self.post).exists())
+
+    def test_authentication_is_checked_once(self):
+        """Sub-requests reuse the batch request's user instead of loading it again"""
+        with CaptureQueriesContext(connection) as ctx:
+            self._batch([{'path': '/api/auth/me/'}, {'path': '/api/auth/me/'}])
+        self.assertFalse([q for q in ctx.captured_queries if 'core_customuser' in q['sql']])
+
+    def test_parallel_reads(self):
+        """With parallel, read-only sub-requests still come back complete and in order"""
+        resp = self._batch([{'id': i, 'path': '/api/auth/me/'} for i in range(3)], parallel=True)
+        self.assertEqual([r['id'] for r in resp.data['responses']], [0, 1, 2])
+        self.assertTrue(all(r['body']['authenticated'] for r in resp.data['responses']))
+
+    def test_invalid_batches(self):
+        """Malformed, oversized and nested batches are rejected"""
+        self.assertEqual(self._batch([]).status_code, 400)
+        self.assertEqual(self._batch([{'path': 'api/posts/'}]).status_code, 400)
+        self.assertEqual(self._batch([{'path': '/api/posts/', 'headers': {'Cookie': 'x'}}]).status_code, 400)
+        self.assertEqual(self._batch([{'path': '/api/auth/me/'}] * 21).status_code, 400)
+        nested = self._batch([{'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}}])
+        self.assertEqual(nested.data['responses'][0]['status'], 400)
+
+    def test_async_endpoints_fail_alone(self):
+        """An async endpoint gets its own error; the rest of the batch still runs"""
+        resp = self._batch([{'id': 'live', 'path': '/api/live/?ids=1'}, {'id': 'me', 'path': '/api/auth/me/'}])
+        self.assertEqual(resp.status_code, 200)
+        live, me = resp.data['responses']
+        self.assertEqual(live['status'], 400)
+        self.assertEqual(me['status'], 200)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+
+from agora_backend.asgi import application
+from core import pubsub
+from core.models import Circle, CircleMembership, Message
+
+User = get_user_model()
+
+
+class CircleChatTest(TestCase):
+    """Test circle chat over the ASGI WebSocket entry point"""
+
+    def setUp(self):
+        self.circle = Circle.objects.create(name='Chatty')
+        self.alice = User.objects.create_user(username='alice', password='pass', netid='chat1')
+        self.bob = User.objects.create_user(username='bob', password='pass', netid='chat2')
+        self.outsider = User.objects.create_user(username='mallory', password='pass', netid='chat3')
+        for user in (self.alice, self.bob):
+            CircleMembership.objects.create(user=user, circle=self.circle)
+        self.cookies = {user.id: self._cookie(user) for user in (self.alice, self.bob, self.outsider)}
+
+    def _cookie(self, user):
+        client = Client()
+        client.force_login(user)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    async def _connect(self, user=None, path=None, origin='http://testserver'):
+        headers = [(b'host', b'testserver')]
+        if user is not None:
+            headers.append((b'cookie', self.cookies[user.id].encode()))
+        if origin is not None:
+            headers.append((b'origin', origin.encode()))
+        socket = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': path or f'/ws/circles/{self.circle.id}/chat/',
+            'headers': headers,
+        })
+        await socket.send_input({'type': 'websocket.connect'})
+        return socket, await socket.receive_output(timeout=5)
+
+    async def _say(self, socket, payload):
+        text = payload if isinstance(payload, str) else json.dumps(payload)
+        await socket.send_input({'type': 'websocket.receive', 'text': text})
+
+    async def _receive(self, socket):
+        return json.loads((await socket.receive_output(timeout=5))['text'])
+
+    async def _hang_up(self, *sockets):
+        for socket in sockets:
+            await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await socket.wait(timeout=5)
+
+    async def test_members_chat_in_realtime(self):
+        """A message is saved once and pushed to every member's socket, the sender's included"""
+        alice, accepted = await self._connect(self.alice)
+        self.assertEqual(accepted['type'], 'websocket.accept')
+        bob, _ = await self._connect(self.bob)
+        await self._say(alice, {'content': 'hello circle', 'is_anonymous': False})
+        for socket in (alice, bob):
+            event = await self._receive(socket)
+            self.assertEqual(event['type'], 'message')
+            self.assertEqual(event['message']['content'], 'hello circle')
+            self.assertEqual(event['message']['user']['username'], 'alice')
+        saved = await Message.objects.aget(circle=self.circle)
+        self.assertEqual((saved.user_id, saved.is_anonymous), (self.alice.id, False))
+        await self._hang_up(alice, bob)
+
+    async def test_anonymous_sender_is_redacted_for_others(self):
+        """Only the sender sees who wrote an anonymous message"""
+        alice, _ = await self._connect(self.alice)
+        bob, _ = await self._connect(self.bob)
+        await self._say(alice, {'content': 'guess who'})
+        self.assertEqual((await self._receive(alice))['message']['user']['username'], 'alice')
+        seen_by_bob = (await self._receive(bob))['message']
+        self.assertEqual(seen_by_bob['user'], {'id': None, 'username': 'Anonymous', 'display_name': 'Anonymous'})
+        self.assertNotIn('_author', seen_by_bob)
+        await self._hang_up(alice, bob)
+
+    async def test_invalid_frames_get_errors(self):
+        """Bad frames are answered on the same socket and nothing is saved"""
+        alice, _ = await self._connect(self.alice)
+        await self._say(alice, 'not json')
+        self.assertEqual((await self._receive(alice))['type'], 'error')
+        await self._say(alice, {'content': ''})
+        self.assertIn('content', (await self._receive(alice))['errors'])
+        self.assertFalse(await Message.objects.aexists())
+        await self._hang_up(alice)
+
+    async def test_handshake_is_refused(self):
+        """Anonymous readers, non-members, foreign origins and unknown paths are turned away"""
+        cases = [
+            ({}, 4401),
+            ({'user': self.outsider}, 4403),
+            ({'user': self.alice, 'origin': 'https://evil.example'}, 4403),
+            ({'user': self.alice, 'path': '/ws/circles/999999/chat/'}, 4404),
+            ({'user': self.alice, 'path': '/ws/elsewhere/'}, 4404),
+        ]
+        for kwargs, code in cases:
+            _, event = await self._connect(**kwargs)
+            self.assertEqual(event, {'type': 'websocket.close', 'code': code}, kwargs)
+
+    async def test_leaving_closes_the_socket(self):
+        """A member who leaves the circle is disconnected from its chat"""
+        bob, _ = await self._connect(self.bob)
+
+        def leave():
+            with self.captureOnCommitCallbacks(execute=True):
+                CircleMembership.objects.filter(user=self.bob, circle=self.circle).delete()
+
+        await sync_to_async(leave)()
+        self.assertEqual(await bob.receive_output(timeout=5), {'type': 'websocket.close', 'code': 4403})
+
+
+class InProcessBrokerTest(TestCase):
+    """Test the in-process pub/sub broker"""
+
+    async def test_fan_out_and_unsubscribe(self):
+        """Every subscriber of a channel gets each message; leaving the context unsubscribes"""
+        broker = pubsub.InProcessBroker()
+        async with broker.subscribe('room') as first, broker.subscribe('room') as second:
+            broker.publish('room', {'n': 1})
+            broker.publish('other', {'n': 2})
+            self.assertEqual(await asyncio.wait_for(anext(first), 5), {'n': 1})
+            self.assertEqual(await asyncio.wait_for(anext(second), 5), {'n': 1})
+        self.assertEqual(broker._subscribers, {})
+
+    async def test_log_numbers_and_replays(self):
+        """Logged messages are numbered in order, published, and replayed after a given number"""
+        broker = pubsub.InProcessBroker()
+        async with broker.subscribe('room') as messages:
+            first, second = {'n': 1}, {'n': 2}
+            broker.log('room', first)
+            broker.log('room', second)
+            self.assertEqual(second['id'], first['id'] + 1)
+            self.assertEqual(await asyncio.wait_for(anext(messages), 5), first)
+        self.assertEqual(broker.replay('room', first['id']), [second])
+        self.assertEqual(broker.replay('other', 0), [])
@@ -1,8 +1,16 @@
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from core.models import Circle, CircleMembership, Post
+from core.models import Circle, CircleMembership, Message, Post
 
 User = get_user_model()
 
@@ -61,3 +69,214 @@ class CirclesAPITest(TestCase):
         self.client.force_authenticate(self.user_member)
         resp4 = self.client.post('/api/posts/', {'title': 'Member Post', 'content': 'Hi', 'circle': self.circle.id}, format='json')
         self.assertEqual(resp4.status_code, 201)
+
+
+class MembershipCacheTest(TestCase):
+    """Test that visibility checks reuse the cached circle membership set"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.member = User.objects.create_user(username='regular', password='pass', netid='regular1')
+        self.circle = Circle.objects.create(name='Cached Circle')
+        CircleMembership.objects.create(user=self.member, circle=self.circle)
+        Post.objects.create(user=self.member, title='Inside', content='Body', circle=self.circle)
+        self.client.force_authenticate(self.member)
+
+    def _membership_queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = getattr(self.client, method)(*args, **kwargs)
+        return resp, [q['sql'] for q in ctx.captured_queries if 'core_circlemembership' in q['sql']]
+
+    def test_circle_feed_reuses_membership_across_requests(self):
+        """Only the first request loads the membership set"""
+        resp, queries = self._membership_queries('get', f'/api/posts/?circle={self.circle.id}')
+        self.assertEqual(len(resp.data), 1)
+        self.assertEqual(len(queries), 1)
+        resp, queries = self._membership_queries('get', f'/api/posts/?circle={self.circle.id}&page_size=5')
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(queries, [])
+
+    def test_leaving_takes_effect_immediately(self):
+        """Leaving bumps the membership version, so the cached set is not reused"""
+        self.client.get(f'/api/posts/?circle={self.circle.id}')
+        self.client.post(f'/api/circles/{self.circle.id}/leave/')
+        resp = self.client.get(f'/api/posts/?circle={self.circle.id}')
+        self.assertEqual(resp.data, [])
+        resp = self.client.post('/api/posts/', {'title': 'X', 'content': 'Y', 'circle': self.circle.id}, format='json')
+        self.assertEqual(resp.status_code, 403)
+
+    def test_directory_and_posting_share_the_set(self):
+        """The circles list and circle posting read memberships from the cache"""
+        self.client.get('/api/circles/')
+        resp, queries = self._membership_queries(
+            'post', '/api/posts/', {'title': 'Again', 'content': 'Hi', 'circle': self.circle.id}, format='json'
+        )
+        self.assertEqual(resp.status_code, 201)
+        # Fan-out still reads the circle's members; the poster's own memberships come from the cache.
+        self.assertFalse([q for q in queries if 'WHERE "core_circlemembership"."user_id"' in q])
+        resp = self.client.get('/api/circles/')
+        self.assertTrue(resp.data[0]['is_member'])
+
+
+class CircleDirectoryTest(TestCase):
+    """Test the circles directory: stored member counts, sorting, filtering and pages"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.viewer = User.objects.create_user(username='browser', password='pass', netid='browser1')
+        self.client.force_authenticate(self.viewer)
+        self.joiners = [
+            User.objects.create_user(username=f'joiner{i}', password='pass', netid=f'joiner{i}') for i in range(3)
+        ]
+
+    def _make_circles(self, count, start=0):
+        circles = []
+        for i in range(start, start + count):
+            circle = Circle.objects.create(name=f'Circle {i:02d}')
+            for user in self.joiners[:i % 4]:
+                CircleMembership.objects.create(user=user, circle=circle)
+            circles.append(circle)
+        return circles
+
+    def _list_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_circles(self):
+        """Listing 3 or 12 circles runs the same number of queries"""
+        self._make_circles(3)
+        cache.clear()
+        _, few = self._list_queries('/api/circles/')
+        self._make_circles(9, start=3)
+        cache.clear()
+        resp, many = self._list_queries('/api/circles/')
+        self.assertEqual(len(resp.data), 12)
+        self.assertEqual(few, many)
+
+    def test_member_count_follows_join_and_leave(self):
+        """Joining and leaving update the stored member_count"""
+        circle = Circle.objects.create(name='Counted')
+        self.client.post(f'/api/circles/{circle.id}/join/')
+        circle.refresh_from_db()
+        self.assertEqual(circle.member_count, 1)
+        resp = self.client.get('/api/circles/')
+        self.assertEqual(resp.data[0]['member_count'], 1)
+        self.assertTrue(resp.data[0]['is_member'])
+        self.client.post(f'/api/circles/{circle.id}/leave/')
+        circle.refresh_from_db()
+        self.assertEqual(circle.member_count, 0)
+
+    def test_sort_and_name_filter(self):
+        """?sort=size orders by members, ?sort=activity by latest post, ?name= filters"""
+        circles = self._make_circles(4)
+        resp = self.client.get('/api/circles/?sort=size')
+        self.assertEqual([c['member_count'] for c in resp.data], [3, 2, 1, 0])
+        Post.objects.create(user=self.viewer, title='Fresh', content='Body', circle=circles[1])
+        resp = self.client.get('/api/circles/?sort=activity')
+        self.assertEqual(resp.data[0]['id'], circles[1].id)
+        resp = self.client.get('/api/circles/?name=circle 02')
+        self.assertEqual([c['id'] for c in resp.data], [circles[2].id])
+
+    def test_chat_moves_activity_at_most_once_per_resolution(self):
+        """A busy chat moves the circle's activity (and the directory ETag) once, not per message"""
+        circle = self._make_circles(2)[1]
+        old = timezone.now() - timedelta(hours=1)
+        Circle.objects.filter(pk=circle.pk).update(last_activity_at=old)
+        etag = self.client.get('/api/circles/')['ETag']
+        Message.objects.create(circle=circle, user=self.joiners[0], content='First')
+        circle.refresh_from_db()
+        self.assertGreater(circle.last_activity_at, old)
+        etag_after_first = self.client.get('/api/circles/', HTTP_IF_NONE_MATCH=etag)['ETag']
+        self.assertNotEqual(etag_after_first, etag)
+        for i in range(3):
+            Message.objects.create(circle=circle, user=self.joiners[0], content=f'More {i}')
+        resp = self.client.get('/api/circles/', HTTP_IF_NONE_MATCH=etag_after_first)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_cursor_pages(self):
+        """page_size opts into keyset pages that walk the whole directory once"""
+        circles = self._make_circles(5)
+        seen = []
+        url = '/api/circles/?sort=size&page_size=2'
+        while url:
+            resp = self.client.get(url)
+            seen.extend(c['id'] for c in resp.data['results'])
+            url = resp.data['next']
+        self.assertEqual(sorted(seen), sorted(c.id for c in circles))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_reconcile_command_repairs_drift(self):
+        """reconcile_circle_counters rewrites member counts that drifted from the real rows"""
+        circle = self._make_circles(4)[3]
+        Circle.objects.filter(pk=circle.pk).update(member_count=99)
+        out = StringIO()
+        call_command('reconcile_circle_counters', '--chunk-size', '2', stdout=out)
+        circle.refresh_from_db()
+        self.assertEqual(circle.member_count, 3)
+        self.assertIn('fixed 1', out.getvalue())
+
+
+class CircleMessagesTest(TestCase):
+    """Test /api/circles/<id>/messages/: keyset-paginated chat history"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.member = User.objects.create_user(username='chatter', password='pass', netid='history1')
+        self.other = User.objects.create_user(username='lurker', password='pass', netid='history2')
+        self.outsider = User.objects.create_user(username='stranger', password='pass', netid='history3')
+        self.circle = Circle.objects.create(name='History')
+        for user in (self.member, self.other):
+            CircleMembership.objects.create(user=user, circle=self.circle)
+        self.messages = [
+            Message.objects.create(
+                circle=self.circle, user=self.member, content=f'Message {i}', is_anonymous=i % 2 == 0
+            )
+            for i in range(7)
+        ]
+        self.url = f'/api/circles/{self.circle.id}/messages/'
+
+    def test_scrolls_back_with_before_cursor(self):
+        """Pages run newest first and ``next`` continues just before the oldest message shown"""
+        self.client.force_authenticate(self.other)
+        ids, url = [], f'{self.url}?page_size=3'
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertLessEqual(len(resp.data['results']), 3)
+            ids += [message['id'] for message in resp.data['results']]
+            url = resp.data['next']
+            if url:
+                self.assertIn('before=', url)
+        self.assertEqual(ids, [message.id for message in reversed(self.messages)])
+
+    def test_page_is_one_query(self):
+        """A page of history is a single query once membership is known"""
+        self.client.force_authenticate(self.other)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'core_message' in q['sql']]), 1)
+
+    def test_anonymous_senders_are_redacted(self):
+        """Other members see anonymous messages without a sender; the sender still sees themselves"""
+        self.client.force_authenticate(self.other)
+        results = self.client.get(self.url).data['results']
+        anonymous = [message for message in results if message['is_anonymous']]
+        self.assertTrue(anonymous)
+        self.assertTrue(all(message['user']['id'] is None for message in anonymous))
+        self.client.force_authenticate(self.member)
+        results = self.client.get(self.url).data['results']
+        self.assertTrue(all(message['user']['id'] == self.member.id for message in results))
+
+    def test_members_only(self):
+        """Anonymous readers, non-members and unknown circles are refused"""
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get('/api/circles/999999/messages/').status_code, 404)
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get(f'{self.url}?before=garbage').status_code, 404)
@@ -0,0 +1,854 @@
+"""
+Tests for the posts feed API - pagination and query cost
+"""
+from datetime import timedelta
+from io import StringIO
+from itertools import pairwise
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core import like_buffer, likes, ranking, threads, timeline
+from core.models import Circle, CircleMembership, Comment, Like, Post, TimelineEntry, UserStats
+from core.pagination import PostCursorPagination
+from core.serializers import CommentSerializer, PostSerializer
+
+User = get_user_model()
+
+
+class FeedCursorPaginationTest(TestCase):
+    """Test keyset pagination on /api/posts/"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='reader', password='pass', netid='reader1')
+        # Several posts share a timestamp so the id tie-breaker is exercised
+        base = timezone.now()
+        self.posts = []
+        for i in range(7):
+            post = Post.objects.create(user=self.user, title=f'Post {i}', content='Body')
+            Post.objects.filter(pk=post.pk).update(created_at=base - timedelta(minutes=i // 2))
+            self.posts.append(post)
+
+    def _walk(self, url):
+        ids = []
+        pages = 0
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            ids.extend(p['id'] for p in resp.data['results'])
+            url = resp.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_unpaginated_list_by_default(self):
+        """Without cursor params the legacy bare list is returned"""
+        resp = self.client.get('/api/posts/')
+        self.assertIsInstance(resp.data, list)
+        self.assertEqual(len(resp.data), 7)
+
+    def test_cursor_walk_returns_every_post_once(self):
+        """Following `next` visits every post exactly once in feed order"""
+        ids, pages = self._walk('/api/posts/?page_size=3')
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def _seed_past_cap(self):
+        cap = PostCursorPagination.max_page_size
+        Post.objects.bulk_create(Post(user=self.user, title=f'Bulk {i}', content='Body') for i in range(cap))
+        return cap
+
+    def test_page_size_is_capped(self):
+        """Page size requests above the cap are clamped"""
+        cap = self._seed_past_cap()
+        resp = self.client.get('/api/posts/?page_size=100000')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['results']), cap)
+        self.assertIsNotNone(resp.data['next'])
+
+    def test_bare_list_is_capped(self):
+        """The legacy bare list holds at most one capped page of the newest posts"""
+        cap = self._seed_past_cap()
+        resp = self.client.get('/api/posts/')
+        self.assertIsInstance(resp.data, list)
+        newest = Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:cap]
+        self.assertEqual([post['id'] for post in resp.data], list(newest))
+
+    def test_invalid_cursor_returns_404(self):
+        """A tampered cursor is rejected"""
+        resp = self.client.get('/api/posts/?cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_circle_filter_is_paginated(self):
+        """The ?circle= filter composes with cursor pagination"""
+        circle = Circle.objects.create(name='Paged')
+        CircleMembership.objects.create(user=self.user, circle=circle)
+        for i in range(3):
+            Post.objects.create(user=self.user, title=f'Circle {i}', content='Body', circle=circle)
+        self.client.force_authenticate(self.user)
+        ids, pages = self._walk(f'/api/posts/?circle={circle.id}&page_size=2')
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(pages, 2)
+        self.assertTrue(all(Post.objects.get(pk=i).circle_id == circle.id for i in ids))
+
+
+class CommentTreeAssemblyTest(TestCase):
+    """Test that comment trees and previews are loaded in a single query"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass', netid='author1')
+        self.commenter = User.objects.create_user(username='commenter', password='pass', netid='commenter1')
+        for i in range(3):
+            post = Post.objects.create(user=self.author, title=f'Post {i}', content='Body', is_anonymous=False)
+            for j in range(3):
+                top = Comment.objects.create(post=post, user=self.commenter, content=f'Top {j}', is_anonymous=(j == 0))
+                Comment.objects.create(post=post, user=self.author, content=f'Reply {j}', parent=top, is_anonymous=False)
+        self.post = post
+
+    def test_detail_tree_costs_one_query(self):
+        """The post (with author) plus every comment and reply cost two queries (plus version lookups)"""
+        with self.assertNumQueries(4):
+            resp = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(len(resp.data['comments']), 3)
+
+    def test_tree_matches_per_object_serialization(self):
+        """The preloaded tree renders the same JSON (including redaction) as the fallback path"""
+        resp = self.client.get(f'/api/posts/{self.post.id}/')
+        request = APIRequestFactory().get('/')
+        request.user = AnonymousUser()
+        expected = PostSerializer(self.post, context={'request': request}).data
+        self.assertEqual(resp.data['comments'], expected['comments'])
+        comments = resp.data['comments']
+        self.assertEqual([c['content'] for c in comments], ['Top 2', 'Top 1', 'Top 0'])
+        self.assertEqual(comments[2]['user']['username'], 'Anonymous')
+        self.assertEqual(comments[2]['replies'][0]['content'], 'Reply 0')
+
+    def test_lone_comments_nest_like_the_tree(self):
+        """Without a preloaded tree, grand-replies still nest, as they do in the detail view"""
+        reply = Comment.objects.filter(post=self.post, content='Reply 1').get()
+        Comment.objects.create(post=self.post, user=self.author, content='Deeper', parent=reply, is_anonymous=False)
+        request = APIRequestFactory().get('/')
+        request.user = AnonymousUser()
+        top = CommentSerializer(reply.parent, context={'request': request}).data
+        self.assertEqual(top['replies'][0]['replies'][0]['content'], 'Deeper')
+        resp = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(resp.data['comments'][1], top)
+
+    def test_feed_list_carries_count_and_preview(self):
+        """Feed items get comments_count plus the latest two top-level comments, in constant queries"""
+        with self.assertNumQueries(4):
+            resp = self.client.get('/api/posts/')
+        item = resp.data[0]
+        self.assertNotIn('comments', item)
+        self.assertEqual(item['comments_count'], 6)
+        self.assertEqual([c['content'] for c in item['comments_preview']], ['Top 2', 'Top 1'])
+        self.assertNotIn('replies', item['comments_preview'][0])
+
+
+class CommentThreadEndpointTest(TestCase):
+    """Test /api/posts/{id}/comments/ pagination"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='threader', password='pass', netid='threader1')
+        self.post = Post.objects.create(user=self.user, title='Busy', content='Body')
+        self.roots = [Comment.objects.create(post=self.post, user=self.user, content=f'Root {i}') for i in range(3)]
+        self.replies = [
+            Comment.objects.create(post=self.post, user=self.user, content=f'Reply {i}', parent=self.roots[0])
+            for i in range(5)
+        ]
+
+    def test_top_level_pages_and_reply_cursor(self):
+        """Threads page newest first and long threads expose a replies_next cursor"""
+        url = f'/api/posts/{self.post.id}/comments/?page_size=2'
+        resp = self.client.get(url)
+        self.assertEqual([c['content'] for c in resp.data['results']], ['Root 2', 'Root 1'])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([c['content'] for c in resp.data['results']], ['Root 0'])
+        self.assertIsNone(resp.data['next'])
+
+        thread = resp.data['results'][0]
+        self.assertEqual([r['content'] for r in thread['replies']], ['Reply 0', 'Reply 1', 'Reply 2'])
+        more = self.client.get(thread['replies_next'])
+        self.assertEqual([r['content'] for r in more.data['results']], ['Reply 3', 'Reply 4'])
+        self.assertIsNone(more.data['next'])
+
+    def test_short_threads_have_no_reply_cursor(self):
+        """Threads that fit in the preview have replies_next = null"""
+        resp = self.client.get(f'/api/posts/{self.post.id}/comments/')
+        by_content = {c['content']: c for c in resp.data['results']}
+        self.assertIsNone(by_content['Root 1']['replies_next'])
+        self.assertEqual(by_content['Root 1']['replies'], [])
+
+    def test_private_circle_threads_need_membership(self):
+        """Non-members get a 404 for the comments of a private circle's post; members read them"""
+        circle = Circle.objects.create(name='Threads Circle')
+        post = Post.objects.create(user=self.user, title='Members', content='Only', circle=circle)
+        Comment.objects.create(post=post, user=self.user, content='Secret')
+        outsider = User.objects.create_user(username='outsider', password='pass', netid='threader2')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(f'/api/posts/{post.id}/comments/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/posts/{post.id}/comments/?parent=1').status_code, 404)
+        CircleMembership.objects.create(user=outsider, circle=circle)
+        resp = self.client.get(f'/api/posts/{post.id}/comments/')
+        self.assertEqual([c['content'] for c in resp.data['results']], ['Secret'])
+
+
+class MaterializedPathTest(TestCase):
+    """Test materialized comment paths: subtree queries, deep rendering and the backfill"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='nester', password='pass', netid='nester1')
+        self.post = Post.objects.create(user=self.user, title='Deep', content='Body')
+        self.chain = []
+        parent = None
+        for i in range(6):
+            parent = Comment.objects.create(post=self.post, user=self.user, content=f'Level {i}', parent=parent)
+            self.chain.append(parent)
+        self.sibling = Comment.objects.create(post=self.post, user=self.user, content='Side', parent=self.chain[1])
+
+    def test_paths_follow_ancestry(self):
+        """Each path extends its parent's, and depth counts the levels"""
+        for parent, child in pairwise(self.chain):
+            parent.refresh_from_db()
+            child.refresh_from_db()
+            self.assertTrue(child.path.startswith(parent.path))
+            self.assertEqual(child.depth, parent.depth + 1)
+        self.assertEqual([c.id for c in threads.subtree(self.chain[4])], [c.id for c in self.chain[4:]])
+        self.assertEqual(threads.descendant_count(self.chain[1]), 5)
+
+    def test_deep_chain_renders_in_constant_queries(self):
+        """The detail view nests every level, and a deeper chain costs no extra query"""
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(f'/api/posts/{self.post.id}/')
+        for i in range(6, 10):
+            Comment.objects.create(post=self.post, user=self.user, content=f'Level {i}', parent=self.chain[-1])
+            self.chain.append(Comment.objects.latest('id'))
+        with CaptureQueriesContext(connection) as deep:
+            resp = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(len(shallow.captured_queries), len(deep.captured_queries))
+        node = resp.data['comments'][0]
+        levels = 0
+        while node['replies']:
+            node = node['replies'][0]
+            levels += 1
+        self.assertEqual((levels, node['content']), (9, 'Level 9'))
+
+    def test_thread_endpoint(self):
+        """?thread= returns one subtree in display order; &depth= caps it"""
+        url = f'/api/posts/{self.post.id}/comments/?thread={self.chain[1].id}'
+        resp = self.client.get(url)
+        self.assertEqual(resp.data['descendants_count'], 5)
+        self.assertEqual([r['content'] for r in resp.data['replies']], ['Level 2', 'Side'])
+        resp = self.client.get(url + '&depth=1')
+        self.assertEqual(resp.data['descendants_count'], 5)
+        self.assertEqual([r['replies'] for r in resp.data['replies']], [[], []])
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/comments/?thread=0').status_code, 404)
+
+    def test_depth_cap(self):
+        """Replies deeper than MAX_DEPTH are rejected"""
+        Comment.objects.filter(pk=self.chain[-1].pk).update(depth=threads.MAX_DEPTH)
+        self.client.force_authenticate(self.user)
+        resp = self.client.post(
+            f'/api/posts/{self.post.id}/comment/', {'content': 'Too deep', 'parent': self.chain[-1].id}, format='json'
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_orm_replies_past_the_cap_are_reattached(self):
+        """A reply made outside the API under a comment at MAX_DEPTH joins that comment's siblings"""
+        parent = self.chain[-1]
+        while parent.depth < threads.MAX_DEPTH:
+            parent = Comment.objects.create(post=self.post, user=self.user, content='Deeper', parent=parent)
+        reply = Comment.objects.create(post=self.post, user=self.user, content='Too deep', parent=parent)
+        reply.refresh_from_db()
+        self.assertEqual(reply.depth, threads.MAX_DEPTH)
+        self.assertEqual(reply.parent_id, parent.parent_id)
+        self.assertLessEqual(len(reply.path), Comment._meta.get_field('path').max_length)
+        self.assertEqual(reply.path[:-threads.SEGMENT_WIDTH], parent.path[:-threads.SEGMENT_WIDTH])
+
+    def test_backfill_command(self):
+        """backfill_comment_paths restores missing paths"""
+        expected = {c.id: (c.path, c.depth) for c in Comment.objects.all()}
+        Comment.objects.update(path='', depth=0)
+        out = StringIO()
+        call_command('backfill_comment_paths', '--chunk-size', '2', stdout=out)
+        self.assertEqual({c.id: (c.path, c.depth) for c in Comment.objects.all()}, expected)
+        self.assertIn('7 comment(s)', out.getvalue())
+
+    def test_backfill_flattens_over_deep_threads(self):
+        """Replies nested past MAX_DEPTH are re-attached at the deepest allowed level"""
+        parent = self.chain[-1]
+        deep = []
+        for i in range(threads.MAX_DEPTH + 2 - parent.depth):
+            parent = Comment.objects.create(post=self.post, user=self.user, content=f'Deep {i}', parent=parent)
+            deep.append(parent)
+        # Rows from before the cap: every reply hangs off the one before it.
+        for parent, child in pairwise([self.chain[-1], *deep]):
+            Comment.objects.filter(pk=child.pk).update(parent=parent)
+        Comment.objects.update(path='', depth=0)
+        out = StringIO()
+        call_command('backfill_comment_paths', '--chunk-size', '3', stdout=out)
+        rows = {c.id: c for c in Comment.objects.all()}
+        self.assertEqual(max(c.depth for c in rows.values()), threads.MAX_DEPTH)
+        self.assertTrue(all(len(c.path) <= Comment._meta.get_field('path').max_length for c in rows.values()))
+        capped = [rows[c.id] for c in deep if rows[c.id].depth == threads.MAX_DEPTH]
+        self.assertEqual(len(capped), 3)
+        self.assertEqual({c.parent_id for c in capped}, {capped[0].parent_id})
+        self.assertIn('moved 2 over-deep', out.getvalue())
+
+
+class LikedFlagBatchingTest(TestCase):
+    """Test that `liked` flags are resolved with one query per page"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = User.objects.create_user(username='viewer', password='pass', netid='viewer1')
+        self.posts = [
+            Post.objects.create(user=self.viewer, title=f'Post {i}', content='Body') for i in range(5)
+        ]
+        Like.objects.create(user=self.viewer, post=self.posts[1])
+        Like.objects.create(user=self.viewer, post=self.posts[3])
+        self.client.force_authenticate(self.viewer)
+
+    def test_liked_flags(self):
+        """Only the posts the viewer liked are flagged"""
+        resp = self.client.get('/api/posts/')
+        liked = {p['id'] for p in resp.data if p['liked']}
+        self.assertEqual(liked, {self.posts[1].id, self.posts[3].id})
+
+    def test_page_cost_does_not_grow_with_posts(self):
+        """Posts, comment trees and liked flags cost the same queries for 5 or 10 posts"""
+        with self.assertNumQueries(5):
+            self.client.get('/api/posts/')
+        for i in range(5):
+            Post.objects.create(user=self.viewer, title=f'More {i}', content='Body')
+        with self.assertNumQueries(5):
+            resp = self.client.get('/api/posts/')
+        self.assertEqual(len(resp.data), 10)
+
+
+class PostCountersTest(TestCase):
+    """Test denormalized likes/comments counters on Post"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='counter', password='pass', netid='counter1')
+        self.other = User.objects.create_user(username='counter2', password='pass', netid='counter2')
+        self.post = Post.objects.create(user=self.user, title='Counted', content='Body')
+
+    def test_like_toggle_updates_counter(self):
+        """Liking and unliking through the API moves likes_count both ways"""
+        self.client.force_authenticate(self.user)
+        resp = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(resp.data, {'liked': True, 'likes_count': 1})
+        resp = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(resp.data, {'liked': False, 'likes_count': 0})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_put_and_delete_like_are_idempotent(self):
+        """Repeating PUT or DELETE on /like/ leaves the state and counter where they were"""
+        self.client.force_authenticate(self.user)
+        url = f'/api/posts/{self.post.id}/like/'
+        for _ in range(2):
+            resp = self.client.put(url)
+            self.assertEqual(resp.data, {'liked': True, 'likes_count': 1})
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        for _ in range(2):
+            resp = self.client.delete(url)
+            self.assertEqual(resp.data, {'liked': False, 'likes_count': 0})
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def test_like_does_not_load_the_post(self):
+        """A toggle writes the like and counter without SELECTing the post, and refreshes the hot score"""
+        Like.objects.create(user=self.other, post=self.post)
+        self.post.refresh_from_db()
+        before = self.post.hot_score
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(resp.data, {'liked': True, 'likes_count': 2})
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'FROM "core_post"' in sql])
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.hot_score, before)
+
+    def test_like_unknown_post(self):
+        """Liking a post that does not exist is a 404 and writes nothing"""
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post('/api/posts/999999/like/').status_code, 404)
+        self.assertEqual(self.client.put('/api/posts/999999/like/').status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+    def test_comment_counter_follows_cascades(self):
+        """Deleting a comment also discounts its cascaded replies"""
+        top = Comment.objects.create(post=self.post, user=self.user, content='Top')
+        Comment.objects.create(post=self.post, user=self.other, content='Reply', parent=top)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        top.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reconcile_command_repairs_drift(self):
+        """reconcile_post_counters rewrites counters that drifted from the real rows"""
+        Like.objects.create(user=self.other, post=self.post)
+        Comment.objects.create(post=self.post, user=self.other, content='Hi')
+        Post.objects.filter(pk=self.post.pk).update(likes_count=42, comments_count=-3, hot_score=0)
+        before = self.client.get(f'/api/posts/{self.post.pk}/')['ETag']
+        out = StringIO()
+        call_command('reconcile_post_counters', '--chunk-size', '1', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+        self.assertEqual(self.post.hot_score, ranking.hot_score(1, 1, self.post.created_at))
+        self.assertNotEqual(self.client.get(f'/api/posts/{self.post.pk}/')['ETag'], before)
+        self.assertIn('fixed 1', out.getvalue())
+
+
+@override_settings(LIKE_WRITE_BEHIND=True, LIKE_FLUSH_SECONDS=0)
+class LikeWriteBehindTest(TestCase):
+    """Test buffered likes: coalesced in the cache, merged into reads, applied by a flush"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='burst', password='pass', netid='burst1')
+        self.other = User.objects.create_user(username='burst2', password='pass', netid='burst2')
+        self.post = Post.objects.create(user=self.other, title='Viral', content='Body')
+        self.client.force_authenticate(self.user)
+
+    def test_buffered_like_is_visible_before_flush(self):
+        """The liker sees their like and the count at once, while nothing is written yet"""
+        resp = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(resp.data, {'liked': True, 'likes_count': 1})
+        self.assertFalse(Like.objects.exists())
+        item = self.client.get('/api/posts/').data[0]
+        self.assertEqual((item['liked'], item['likes_count']), (True, 1))
+        self.assertEqual(likes.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertTrue(Like.objects.filter(user=self.user, post=self.post).exists())
+        item = self.client.get('/api/posts/').data[0]
+        self.assertEqual((item['liked'], item['likes_count']), (True, 1))
+
+    def test_toggles_coalesce(self):
+        """Three toggles and a repeated PUT apply as a single like"""
+        for _ in range(3):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        resp = self.client.put(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(resp.data, {'liked': True, 'likes_count': 1})
+        likes.flush()
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        resp = self.client.delete(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(resp.data, {'liked': False, 'likes_count': 0})
+        call_command('flush_like_buffer', stdout=StringIO())
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_replayed_batch_is_not_counted_twice(self):
+        """A batch applied again after its acknowledgement was lost moves no counter"""
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        entries = like_buffer.drain(likes.FLUSH_BATCH)
+        for _ in range(2):
+            likes._apply(entries)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(UserStats.objects.get(pk=self.other.pk).likes_received, 1)
+
+    def test_buffered_like_changes_etag(self):
+        """A revalidation after a buffered like is not answered with a stale 304"""
+        etag = self.client.get('/api/posts/')['ETag']
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        resp = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.data[0]['liked'])
+
+
+class PostStateTest(TestCase):
+    """Test /api/posts/state/: counters and liked flags for many posts in one call"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='poller', password='pass', netid='poller1')
+        self.author = User.objects.create_user(username='polled', password='pass', netid='polled1')
+        self.posts = [Post.objects.create(user=self.author, title=f'P{i}', content='Body') for i in range(10)]
+        Like.objects.create(user=self.reader, post=self.posts[2])
+        Comment.objects.create(post=self.posts[3], user=self.author, content='Hi')
+        self.circle = Circle.objects.create(name='Hidden')
+        self.hidden = Post.objects.create(user=self.author, title='Secret', content='Body', circle=self.circle)
+        self.client.force_authenticate(self.reader)
+
+    def _state(self, posts):
+        return self.client.get('/api/posts/state/?ids=' + ','.join(str(p.id) for p in posts))
+
+    def test_counters_and_liked(self):
+        """Results follow the requested order and carry counters and the liked flag"""
+        resp = self._state([self.posts[3], self.posts[2]])
+        self.assertEqual(resp.data['results'], [
+            {'id': self.posts[3].id, 'likes_count': 0, 'comments_count': 1, 'liked': False},
+            {'id': self.posts[2].id, 'likes_count': 1, 'comments_count': 0, 'liked': True},
+        ])
+
+    def test_circle_visibility(self):
+        """Circle posts are left out for non-members and included for members"""
+        resp = self._state([self.hidden, self.posts[0]])
+        self.assertEqual([r['id'] for r in resp.data['results']], [self.posts[0].id])
+        CircleMembership.objects.create(user=self.reader, circle=self.circle)
+        resp = self._state([self.hidden])
+        self.assertEqual([r['id'] for r in resp.data['results']], [self.hidden.id])
+
+    def test_query_count_is_constant(self):
+        """Two or ten posts cost the same queries"""
+        self._state(self.posts[:1])
+        with CaptureQueriesContext(connection) as few:
+            self._state(self.posts[:2])
+        with CaptureQueriesContext(connection) as many:
+            self._state(self.posts)
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertLessEqual(len(many.captured_queries), 2)
+
+    def test_invalid_ids(self):
+        """Non-numeric or too many ids are a 400"""
+        self.assertEqual(self.client.get('/api/posts/state/?ids=1,x').status_code, 400)
+        ids = ','.join(str(i) for i in range(1, 302))
+        self.assertEqual(self.client.get(f'/api/posts/state/?ids={ids}').status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/state/').data, {'results': []})
+
+
+class HomeTimelineTest(TestCase):
+    """Test the fan-out-on-write home timeline behind /api/posts/"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='poster', password='pass', netid='poster1')
+        self.reader = User.objects.create_user(username='follower', password='pass', netid='follower1')
+        self.circle = Circle.objects.create(name='Private')
+        CircleMembership.objects.create(user=self.author, circle=self.circle)
+        self.public = Post.objects.create(user=self.author, title='Public', content='Body')
+        self.private = Post.objects.create(user=self.author, title='Private', content='Body', circle=self.circle)
+
+    def _feed_ids(self, user=None):
+        self.client.force_authenticate(user)
+        return [p['id'] for p in self.client.get('/api/posts/').data]
+
+    def test_fan_out_respects_circle_membership(self):
+        """Readers see public posts; circle posts only reach members"""
+        self.assertEqual(self._feed_ids(self.reader), [self.public.id])
+        self.assertEqual(self._feed_ids(self.author), [self.private.id, self.public.id])
+        self.assertEqual(TimelineEntry.objects.filter(post=self.private).count(), 1)
+
+    def test_anonymous_feed_is_public_only(self):
+        """Visitors without an account only get public posts"""
+        self.assertEqual(self._feed_ids(None), [self.public.id])
+
+    def test_join_backfills_and_leave_prunes(self):
+        """Joining a circle copies its posts in; leaving removes them"""
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/circles/{self.circle.id}/join/')
+        self.assertEqual(self._feed_ids(self.reader), [self.private.id, self.public.id])
+        self.client.post(f'/api/circles/{self.circle.id}/leave/')
+        self.assertEqual(self._feed_ids(self.reader), [self.public.id])
+
+    @override_settings(CORE_TASKS_ALWAYS_EAGER=False)
+    def test_late_backfill_after_leave_adds_nothing(self):
+        """A join's backfill that only runs after the user left leaves no circle posts behind"""
+        membership = CircleMembership.objects.create(user=self.reader, circle=self.circle)
+        membership.delete()
+        # The deferred task finally runs.
+        timeline.backfill_user(self.reader.id, self.circle.id)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader, post__circle=self.circle).exists())
+
+    def test_late_fan_out_skips_former_members(self):
+        """A circle post's fan-out that runs after a member left does not reach them"""
+        CircleMembership.objects.create(user=self.reader, circle=self.circle)
+        with override_settings(CORE_TASKS_ALWAYS_EAGER=False):
+            post = Post.objects.create(user=self.author, title='Later', content='Body', circle=self.circle)
+        CircleMembership.objects.filter(user=self.reader, circle=self.circle).delete()
+        timeline.fan_out_post(post.id)
+        self.assertEqual(list(TimelineEntry.objects.filter(post=post).values_list('user_id', flat=True)), [self.author.id])
+
+    def test_moving_a_post_redelivers_it(self):
+        """A post moved into a circle leaves non-members' timelines; moved out, it reaches everyone"""
+        self.client.force_authenticate(self.author)
+        resp = self.client.patch(f'/api/posts/{self.public.id}/', {'circle': self.circle.id}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._feed_ids(self.reader), [])
+        self.assertEqual(self._feed_ids(self.author), [self.private.id, self.public.id])
+
+        self.private.circle = None
+        self.private.save()
+        self.assertEqual(self._feed_ids(self.reader), [self.private.id])
+
+    def test_timeline_feed_paginates(self):
+        """Cursor pagination walks the timeline ordering"""
+        self.client.force_authenticate(self.author)
+        resp = self.client.get('/api/posts/?page_size=1')
+        self.assertEqual([p['id'] for p in resp.data['results']], [self.private.id])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([p['id'] for p in resp.data['results']], [self.public.id])
+        self.assertIsNone(resp.data['next'])
+
+    def test_rebuild_command_restores_lost_entries(self):
+        """rebuild_timelines --missing repairs timelines whose fan-out was lost"""
+        TimelineEntry.objects.filter(user=self.reader).delete()
+        call_command('rebuild_timelines', '--missing', stdout=StringIO())
+        self.assertEqual(self._feed_ids(self.reader), [self.public.id])
+
+
+class HotFeedTest(TestCase):
+    """Test the precomputed ?feed=top ranking"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(username=f'fan{i}', password='pass', netid=f'fan{i}') for i in range(3)
+        ]
+        self.older = Post.objects.create(user=self.users[0], title='Popular', content='Body')
+        self.newer = Post.objects.create(user=self.users[0], title='Quiet', content='Body')
+
+    def test_engagement_outranks_recency(self):
+        """Likes and comments lift an older post above a newer quiet one"""
+        for user in self.users:
+            Like.objects.create(user=user, post=self.older)
+        Comment.objects.create(post=self.older, user=self.users[1], content='Nice')
+        self.older.refresh_from_db()
+        self.newer.refresh_from_db()
+        self.assertGreater(self.older.hot_score, self.newer.hot_score)
+
+        resp = self.client.get('/api/posts/?feed=top&page_size=10')
+        self.assertEqual([p['id'] for p in resp.data['results']], [self.older.id, self.newer.id])
+        resp = self.client.get('/api/posts/?feed=new')
+        self.assertEqual([p['id'] for p in resp.data], [self.newer.id, self.older.id])
+
+    def test_refresh_command_recomputes_scores(self):
+        """refresh_hot_scores restores scores from counters and age"""
+        Like.objects.create(user=self.users[1], post=self.older)
+        self.older.refresh_from_db()
+        expected = self.older.hot_score
+        Post.objects.update(hot_score=0)
+        before = self.client.get('/api/posts/?feed=top&page_size=10')['ETag']
+        call_command('refresh_hot_scores', '--days', '0', stdout=StringIO())
+        self.older.refresh_from_db()
+        self.assertAlmostEqual(self.older.hot_score, expected)
+        self.assertNotEqual(self.client.get('/api/posts/?feed=top&page_size=10')['ETag'], before)
+
+
+class SparseFieldsetTest(TestCase):
+    """Test ?fields= and ?include= on /api/posts/"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='narrow', password='pass', netid='narrow1')
+        self.post = Post.objects.create(user=self.user, title='Narrow', content='Body', is_anonymous=True)
+        top = Comment.objects.create(post=self.post, user=self.user, content='Top')
+        Comment.objects.create(post=self.post, user=self.user, content='Reply', parent=top)
+        Like.objects.create(user=self.user, post=self.post)
+        self.client.force_authenticate(self.user)
+
+    def test_fields_whitelist_skips_extra_queries(self):
+        """Narrow views cost one query (plus the ETag lookup) and render only the requested keys"""
+        with self.assertNumQueries(2):
+            resp = self.client.get('/api/posts/?fields=id,title,created_at,likes_count')
+        self.assertEqual(set(resp.data[0]), {'id', 'title', 'created_at', 'likes_count'})
+        self.assertEqual(resp.data[0]['likes_count'], 1)
+
+    def test_include_adds_full_comment_tree(self):
+        """?include=comments embeds the full tree in feed items"""
+        resp = self.client.get('/api/posts/?include=comments')
+        item = resp.data[0]
+        self.assertEqual(item['comments'][0]['replies'][0]['content'], 'Reply')
+        self.assertIn('comments_preview', item)
+
+    def test_fields_with_include(self):
+        """Opt-in extras combine with a whitelist"""
+        resp = self.client.get('/api/posts/?fields=title&include=liked')
+        self.assertEqual(resp.data[0], {'id': self.post.id, 'title': 'Narrow', 'liked': True})
+
+    def test_whitelist_does_not_drop_written_fields(self):
+        """?fields= on a write only narrows the response, never the saved data"""
+        circle = Circle.objects.create(name='Written')
+        CircleMembership.objects.create(user=self.user, circle=circle)
+        resp = self.client.post(
+            '/api/posts/?fields=id',
+            {'title': 'Kept', 'content': 'Saved body', 'circle': circle.id, 'is_anonymous': False},
+            format='json',
+        )
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(set(resp.data), {'id'})
+        saved = Post.objects.get(pk=resp.data['id'])
+        self.assertEqual((saved.title, saved.content, saved.circle_id), ('Kept', 'Saved body', circle.id))
+
+
+class ConditionalGetTest(TestCase):
+    """Test ETag / Last-Modified validators on posts and circles"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='poller', password='pass', netid='poller1')
+        self.other = User.objects.create_user(username='poster', password='pass', netid='poster1')
+        self.post = Post.objects.create(user=self.other, title='Polled', content='Body', is_anonymous=False)
+        self.client.force_authenticate(self.user)
+
+    def _revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        return first['ETag']
+
+    def test_unchanged_list_is_not_modified_without_serializing(self):
+        """A matching If-None-Match costs only the version lookup"""
+        etag = self._revalidate('/api/posts/')
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        self.assertEqual(resp.content, b'')
+
+    def test_writes_change_the_validators(self):
+        """Likes and comments invalidate both the feed and the post"""
+        list_etag = self._revalidate('/api/posts/')
+        detail_etag = self._revalidate(f'/api/posts/{self.post.id}/')
+        Like.objects.create(user=self.other, post=self.post)
+        self.assertEqual(self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        resp = self.client.get(f'/api/posts/{self.post.id}/', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['likes_count'], 1)
+
+        detail_etag = resp['ETag']
+        Comment.objects.create(post=self.post, user=self.other, content='New')
+        resp = self.client.get(f'/api/posts/{self.post.id}/', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(CORE_TASKS_ALWAYS_EAGER=False)
+    def test_deferred_fan_out_changes_the_feed_validator(self):
+        """A feed validated before the fan-out ran is not kept once the post reaches the timeline"""
+        post = Post.objects.create(user=self.other, title='Fresh', content='Body')
+        etag = self._revalidate('/api/posts/')
+        timeline.fan_out_post(post.id)
+        resp = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(post.id, [p['id'] for p in resp.data])
+
+    @override_settings(CORE_TASKS_ALWAYS_EAGER=False)
+    def test_deferred_backfill_changes_the_feed_validator(self):
+        """Joining a circle invalidates the feed again once the backfill has run"""
+        circle = Circle.objects.create(name='Late')
+        CircleMembership.objects.create(user=self.other, circle=circle)
+        timeline.backfill_user(self.other.id, circle.id)
+        post = Post.objects.create(user=self.other, title='Inside', content='Body', circle=circle)
+        timeline.fan_out_post(post.id)
+        CircleMembership.objects.create(user=self.user, circle=circle)
+        etag = self._revalidate('/api/posts/')
+        timeline.backfill_user(self.user.id, circle.id)
+        resp = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(post.id, [p['id'] for p in resp.data])
+
+    def test_unrelated_post_keeps_detail_validator(self):
+        """Writes to another post leave a post's ETag alone"""
+        etag = self._revalidate(f'/api/posts/{self.post.id}/')
+        other = Post.objects.create(user=self.other, title='Other', content='Body')
+        Like.objects.create(user=self.user, post=other)
+        resp = self.client.get(f'/api/posts/{self.post.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_validator_is_per_viewer(self):
+        """Another reader never gets a 304 for someone else's representation"""
+        etag = self._revalidate(f'/api/posts/{self.post.id}/')
+        self.client.force_authenticate(self.other)
+        resp = self.client.get(f'/api/posts/{self.post.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_last_modified_is_honoured(self):
+        """If-Modified-Since alone also yields a 304"""
+        first = self.client.get('/api/posts/')
+        resp = self.client.get('/api/posts/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_circle_directory_follows_membership(self):
+        """Joining a circle invalidates the circles list"""
+        circle = Circle.objects.create(name='Pollers')
+        etag = self._revalidate('/api/circles/')
+        self.assertEqual(self.client.get('/api/circles/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        CircleMembership.objects.create(user=self.other, circle=circle)
+        resp = self.client.get('/api/circles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data[0]['member_count'], 1)
+
+
+class SharedRepresentationTest(TestCase):
+    """Test the cached viewer-independent post render and its per-viewer overlay"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='ghost', password='pass', netid='ghost1')
+        self.reader = User.objects.create_user(username='lurker', password='pass', netid='lurker1')
+        self.staff = User.objects.create_user(username='mod', password='pass', netid='mod1', is_staff=True)
+        self.post = Post.objects.create(user=self.author, title='Secret', content='Body', is_anonymous=True)
+        Comment.objects.create(post=self.post, user=self.author, content='Me again', is_anonymous=True)
+        Like.objects.create(user=self.reader, post=self.post)
+        self.url = f'/api/posts/{self.post.id}/'
+
+    def _get(self, user, url=None):
+        self.client.force_authenticate(user)
+        return self.client.get(url or self.url).data
+
+    def test_second_reader_skips_the_comment_tree(self):
+        """Once rendered, a post costs the validator, the row and the stamps lookup"""
+        self._get(self.reader)
+        self.client.force_authenticate(self.author)
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+    def test_overlay_is_per_viewer(self):
+        """The shared render is redacted; owner and staff get the author back"""
+        for user in (self.reader, self.author, self.staff, self.reader):
+            data = self._get(user)
+            revealed = user != self.reader
+            self.assertEqual(data['user']['id'], self.author.id if revealed else None)
+            self.assertEqual(data['comments'][0]['user']['id'], self.author.id if revealed else None)
+            self.assertEqual(data['liked'], user == self.reader)
+            self.assertNotIn('_author', data)
+            self.assertNotIn('_author', data['comments'][0])
+
+    def test_feed_items_share_renders(self):
+        """Feed previews are overlaid the same way"""
+        self._get(self.author, '/api/posts/')
+        item = self._get(self.reader, '/api/posts/')[0]
+        self.assertEqual(item['user']['username'], 'Anonymous')
+        self.assertEqual(item['comments_preview'][0]['user']['username'], 'Anonymous')
+        self.assertTrue(item['liked'])
+
+    def test_writes_invalidate_the_render(self):
+        """A new comment is visible on the next read"""
+        self._get(self.reader)
+        Comment.objects.create(post=self.post, user=self.reader, content='Fresh', is_anonymous=False)
+        data = self._get(self.reader)
+        self.assertEqual(data['comments'][0]['content'], 'Fresh')
+        self.assertEqual(data['comments_count'], 2)
+
+
+class QueryPlanAuditTest(TestCase):
+    """Test the audit_query_plans command"""
+
+    def test_hot_queries_use_indexes(self):
+        """Every hot query plan is index-only on a seeded database, and the seed is rolled back"""
+        out = StringIO()
+        call_command('audit_query_plans', '--rows', '300', stdout=out)
+        self.assertIn('All hot queries are served by indexes', out.getvalue())
+        self.assertFalse(Post.objects.exists())
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core import likes, live
+from core.models import Circle, CircleMembership, Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(LIVE_TICK_SECONDS=0.2, LIVE_HEARTBEAT_SECONDS=60)
+class LiveUpdatesTest(TestCase):
+    """Test the Server-Sent Events stream of live post updates"""
+
+    def setUp(self):
+        cache.clear()
+        self.circle = Circle.objects.create(name='Live Circle')
+        self.alice = User.objects.create_user(username='alice', password='pass', netid='live1')
+        self.bob = User.objects.create_user(username='bob', password='pass', netid='live2')
+        CircleMembership.objects.create(user=self.alice, circle=self.circle)
+        self.post = Post.objects.create(user=self.alice, title='Hello', content='World')
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', password='pass', netid=f'livefan{i}') for i in range(5)
+        ]
+
+    async def _open(self, user, ids, last_event_id=None):
+        stream = live.stream(user, ids, last_event_id)
+        self.assertEqual(await self._chunk(stream), f'retry: {live.RETRY_MS}\n\n')
+        return stream
+
+    async def _chunk(self, stream):
+        return await asyncio.wait_for(anext(stream), 5)
+
+    async def _update(self, stream):
+        chunk = await self._chunk(stream)
+        lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        self.assertEqual(lines['event'], 'update')
+        return int(lines['id']), json.loads(lines['data'])
+
+    async def _close(self, stream):
+        await stream.aclose()
+
+    def _write(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            return action()
+
+    async def test_likes_in_one_tick_are_one_entry(self):
+        """A burst of likes reaches the reader as one entry with the final counts"""
+        stream = await self._open(self.bob, [self.post.id])
+
+        def burst():
+            for fan in self.fans:
+                likes.like(fan.id, self.post.id)
+
+        await sync_to_async(self._write)(burst)
+        _, data = await self._update(stream)
+        self.assertEqual(data['posts'], [
+            {'id': self.post.id, 'likes_count': 5, 'comments_count': 0, 'new_comment_ids': []},
+        ])
+        self.assertEqual(data['new_posts'], [])
+        await self._close(stream)
+
+    async def test_new_posts_respect_circle_visibility(self):
+        """Readers hear of new posts they may see, and follow them from then on"""
+        stream = await self._open(self.bob, [])
+
+        def write():
+            Post.objects.create(user=self.alice, title='Members only', content='Shh', circle=self.circle)
+            return Post.objects.create(user=self.alice, title='Public', content='Hi')
+
+        public = await sync_to_async(self._write)(write)
+        _, data = await self._update(stream)
+        self.assertEqual(data['new_posts'], [{'id': public.id, 'circle_id': None}])
+
+        def comment():
+            return Comment.objects.create(post=public, user=self.alice, content='First')
+
+        comment = await sync_to_async(self._write)(comment)
+        _, data = await self._update(stream)
+        self.assertEqual(data['posts'][0]['id'], public.id)
+        self.assertEqual(data['posts'][0]['comments_count'], 1)
+        self.assertEqual(data['posts'][0]['new_comment_ids'], [comment.id])
+        await self._close(stream)
+
+    async def test_reconnect_replays_missed_events(self):
+        """Last-Event-ID brings back what happened while the reader was away"""
+        stream = await self._open(self.bob, [self.post.id])
+        await sync_to_async(self._write)(lambda: likes.like(self.fans[0].id, self.post.id))
+        seen, _ = await self._update(stream)
+        await self._close(stream)
+
+        await sync_to_async(self._write)(lambda: likes.like(self.fans[1].id, self.post.id))
+        stream = await self._open(self.bob, [self.post.id], last_event_id=seen)
+        replayed, data = await self._update(stream)
+        self.assertGreater(replayed, seen)
+        self.assertEqual(data['posts'][0]['likes_count'], 2)
+        await self._close(stream)
+
+    @override_settings(LIVE_TICK_SECONDS=0.01, LIVE_HEARTBEAT_SECONDS=0.05)
+    async def test_idle_stream_gets_heartbeats(self):
+        """An idle stream sends comment lines to keep proxies from closing it"""
+        stream = await self._open(self.bob, [self.post.id])
+        self.assertEqual(await self._chunk(stream), ': heartbeat\n\n')
+        await self._close(stream)
+
+    async def test_endpoint(self):
+        """The view streams with SSE headers, rejects bad ids and needs the ASGI server"""
+        await self.async_client.aforce_login(self.bob)
+        response = await self.async_client.get('/api/live/', {'ids': f'{self.post.id}'}, headers={'Last-Event-ID': '7'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertTrue(response.streaming)
+        self.assertEqual((await self.async_client.get('/api/live/', {'ids': '1,two'})).status_code, 400)
+        self.assertEqual((await sync_to_async(self.client.get)('/api/live/')).status_code, 501)
@@ -1,7 +1,15 @@
 # core/tests.py
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import likes
+from core.models import Circle, CircleMembership, Comment, Like, Post, UserStats
 
 
 class ProfileViewTest(TestCase):
@@ -33,3 +41,146 @@ class ProfileViewTest(TestCase):
         self.assertNotIn('</script>', u.bio)
         # allowed tags stripped; we remove <b> as well because we strip all tags
         self.assertNotIn('<b>', u.bio)
+
+
+class UserStatsTest(TestCase):
+    """Test the per-user counters behind the profile stats and Agora Sparks score"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user_model = get_user_model()
+        self.author = user_model.objects.create_user(username='sparky', password='pass', netid='sparky1')
+        self.reader = user_model.objects.create_user(username='reader', password='pass', netid='sparky2')
+        self.post = Post.objects.create(user=self.author, title='Lit', content='Body')
+
+    def _stats(self, user):
+        return UserStats.objects.filter(pk=user.pk).values_list(
+            'posts_count', 'comments_count', 'likes_received'
+        ).first()
+
+    def test_counters_follow_writes(self):
+        """Posts, comments and likes (ORM and like API alike) move the counters both ways"""
+        comment = Comment.objects.create(post=self.post, user=self.reader, content='Nice')
+        Like.objects.create(post=self.post, user=self.author)
+        self.client.force_authenticate(self.reader)
+        self.client.put(f'/api/posts/{self.post.id}/like/')
+        self.client.put(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(self._stats(self.author), (1, 0, 2))
+        self.assertEqual(self._stats(self.reader), (0, 1, 0))
+        self.client.delete(f'/api/posts/{self.post.id}/like/')
+        comment.delete()
+        self.assertEqual(self._stats(self.author), (1, 0, 1))
+        self.assertEqual(self._stats(self.reader), (0, 0, 0))
+        self.post.delete()
+        self.assertEqual(self._stats(self.author), (0, 0, 0))
+
+    @override_settings(LIKE_WRITE_BEHIND=True, LIKE_FLUSH_SECONDS=0)
+    def test_buffered_likes_count_when_flushed(self):
+        """Write-behind likes reach the author's likes_received once they are applied"""
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(self._stats(self.author), (1, 0, 0))
+        likes.flush()
+        self.assertEqual(self._stats(self.author), (1, 0, 1))
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        likes.flush()
+        self.assertEqual(self._stats(self.author), (1, 0, 0))
+
+    def test_profile_api_reports_real_counts(self):
+        """The profile API scores the signed-in user's own counts in one lookup"""
+        Comment.objects.create(post=self.post, user=self.author, content='Me too')
+        Like.objects.create(post=self.post, user=self.reader)
+        self.client.force_login(self.author)
+        with self.assertNumQueries(3):  # session, user, stats
+            stats = self.client.get(reverse('api_profile')).json()['stats']
+        self.assertEqual((stats['posts'], stats['comments'], stats['likes']), (1, 1, 1))
+        self.assertEqual(stats['score'], 8)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_profile')).json()['stats']['score'], 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        """rebuild_user_stats fixes drifted counters and creates missing rows"""
+        UserStats.objects.filter(pk=self.author.pk).update(posts_count=9, likes_received=-2)
+        UserStats.objects.filter(pk=self.reader.pk).delete()
+        Comment.objects.create(post=self.post, user=self.reader, content='Hi')
+        UserStats.objects.filter(pk=self.reader.pk).delete()
+        out = StringIO()
+        call_command('rebuild_user_stats', '--chunk-size', '1', '--dry-run', stdout=out)
+        self.assertIn('would fix 2', out.getvalue())
+        self.assertEqual(self._stats(self.author), (9, 0, -2))
+        call_command('rebuild_user_stats', '--chunk-size', '1', stdout=out)
+        self.assertEqual(self._stats(self.author), (1, 0, 0))
+        self.assertEqual(self._stats(self.reader), (0, 1, 0))
+
+
+class LeaderboardTest(TestCase):
+    """Test /api/leaderboard/: top users by stored score and a user's rank"""
+
+    def setUp(self):
+        self.client = APIClient()
+        user_model = get_user_model()
+        self.users = [
+            user_model.objects.create_user(username=f'leader{i}', password='pass', netid=f'leader{i}')
+            for i in range(4)
+        ]
+        for user, posts in zip(self.users, [3, 1, 3, 0], strict=True):
+            for n in range(posts):
+                Post.objects.create(user=user, title=f'Post {n}', content='Body', is_anonymous=False)
+        self.circle = Circle.objects.create(name='Leaders')
+        for user in self.users[1:]:
+            CircleMembership.objects.create(user=user, circle=self.circle)
+        self.client.force_authenticate(self.users[1])
+
+    def test_score_follows_counters(self):
+        """The stored score moves with every counter bump"""
+        Comment.objects.create(
+            post=Post.objects.filter(user=self.users[0]).first(), user=self.users[3], content='Hi', is_anonymous=False
+        )
+        self.assertEqual(UserStats.objects.get(pk=self.users[3].pk).score, 2)
+        self.assertEqual(UserStats.objects.get(pk=self.users[0].pk).score, 15)
+
+    def test_anonymous_content_does_not_score(self):
+        """Liking an anonymous post cannot reveal its author through the leaderboard"""
+        secret = Post.objects.create(user=self.users[3], title='Who?', content='Body', is_anonymous=True)
+        Comment.objects.create(post=secret, user=self.users[3], content='Still me', is_anonymous=True)
+        before = self.client.get(f'/api/leaderboard/?user={self.users[3].id}').data['rank']
+        self.client.put(f'/api/posts/{secret.id}/like/')
+        Like.objects.create(post=secret, user=self.users[2])
+        after = self.client.get(f'/api/leaderboard/?user={self.users[3].id}').data['rank']
+        self.assertEqual(after, before)
+        self.assertEqual(after['score'], 0)
+        stats = UserStats.objects.get(pk=self.users[3].pk)
+        # The author's own counters still include it.
+        self.assertEqual((stats.posts_count, stats.comments_count, stats.likes_received), (1, 1, 2))
+        call_command('rebuild_user_stats', stdout=StringIO())
+        stats.refresh_from_db()
+        self.assertEqual(stats.score, 0)
+
+    def test_global_board_and_rank(self):
+        """Ties share a rank, and the reader's own rank comes from a count, not a sort"""
+        resp = self.client.get('/api/leaderboard/')
+        self.assertEqual(resp.status_code, 200)
+        board = [(row['rank'], row['user']['username'], row['score']) for row in resp.data['results']]
+        self.assertEqual(board, [(1, 'leader0', 15), (1, 'leader2', 15), (3, 'leader1', 5)])
+        self.assertEqual(resp.data['rank'], {'user_id': self.users[1].id, 'rank': 3, 'score': 5})
+        other = self.client.get(f'/api/leaderboard/?user={self.users[3].id}&limit=1')
+        self.assertEqual(len(other.data['results']), 1)
+        self.assertEqual(other.data['rank']['rank'], 4)
+
+    def test_circle_board(self):
+        """A circle's board ranks its members only and is hidden from non-members"""
+        resp = self.client.get(f'/api/leaderboard/?circle={self.circle.id}')
+        self.assertEqual([row['user']['username'] for row in resp.data['results']], ['leader2', 'leader1'])
+        self.assertEqual(resp.data['rank']['rank'], 2)
+        outsider = self.client.get(f'/api/leaderboard/?circle={self.circle.id}&user={self.users[0].id}')
+        self.assertIsNone(outsider.data['rank'])
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(f'/api/leaderboard/?circle={self.circle.id}').status_code, 403)
+
+    def test_requires_sign_in_and_valid_params(self):
+        """Anonymous readers, bad parameters and unknown users are rejected"""
+        self.assertEqual(self.client.get('/api/leaderboard/?limit=ten').status_code, 400)
+        self.assertEqual(self.client.get('/api/leaderboard/?user=999999').status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/leaderboard/').status_code, 401)
@@ -0,0 +1,119 @@
+"""
+Tests for the search and autocomplete APIs - indexes and visibility
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.autocomplete import circle_index
+from core.models import Circle, CircleMembership, Comment, Post
+
+User = get_user_model()
+
+
+class PostSearchTest(TestCase):
+    """Test /api/search/?q= over posts and comments"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='seeker', password='pass', netid='seeker1')
+        self.titled = Post.objects.create(user=self.user, title='Bicycle repair tips', content='Pumps and tubes')
+        self.bodied = Post.objects.create(user=self.user, title='Weekend', content='Went bicycle shopping downtown')
+        self.commented = Post.objects.create(user=self.user, title='Lost keys', content='Near the library')
+        Comment.objects.create(post=self.commented, user=self.user, content='Check the bicycle racks')
+        Post.objects.create(user=self.user, title='Unrelated', content='Nothing to see')
+
+    def _ids(self, query, user=None):
+        self.client.force_authenticate(user)
+        resp = self.client.get('/api/search/', {'q': query})
+        self.assertEqual(resp.status_code, 200)
+        return [item['id'] for item in resp.data['results']]
+
+    def test_title_body_and_comment_matches_are_ranked(self):
+        """Title matches outrank body matches, which outrank comment matches"""
+        self.assertEqual(self._ids('bicycle'), [self.titled.id, self.bodied.id, self.commented.id])
+
+    def test_words_are_stemmed_and_combined(self):
+        """All words must match, in any inflection"""
+        self.assertEqual(self._ids('repairing bicycles'), [self.titled.id])
+        self.assertEqual(self._ids('bicycle "unknownword"'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Saving or deleting content updates the index right away"""
+        self.bodied.content = 'Went shoe shopping downtown'
+        self.bodied.save()
+        self.commented.comments.all().delete()
+        self.assertEqual(self._ids('bicycle'), [self.titled.id])
+        self.assertEqual(self._ids('shoe'), [self.bodied.id])
+
+    def test_circle_posts_need_membership(self):
+        """Posts in a circle only show up for its members and staff"""
+        circle = Circle.objects.create(name='Cyclists')
+        hidden = Post.objects.create(user=self.user, title='Tandem meetup', content='Secret', circle=circle)
+        outsider = User.objects.create_user(username='outsider', password='pass', netid='outsider1')
+        staff = User.objects.create_user(username='staffer', password='pass', netid='staffer1', is_staff=True)
+        self.assertEqual(self._ids('tandem', outsider), [])
+        self.assertEqual(self._ids('tandem'), [])
+        self.assertEqual(self._ids('tandem', staff), [hidden.id])
+        CircleMembership.objects.create(user=outsider, circle=circle)
+        self.assertEqual(self._ids('tandem', outsider), [hidden.id])
+
+    def test_blank_or_symbol_queries_return_nothing(self):
+        """Empty queries and bare punctuation are not errors"""
+        self.assertEqual(self._ids(''), [])
+        self.assertEqual(self._ids('"*()'), [])
+
+
+class AutocompleteTest(TestCase):
+    """Test /api/autocomplete/ for users and circles"""
+
+    def setUp(self):
+        circle_index.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='typist', password='pass', netid='typist1')
+        User.objects.create_user(username='alex', password='pass', netid='alex1', display_name='Al')
+        User.objects.create_user(username='alexandra', password='pass', netid='alexandra1')
+        User.objects.create_user(username='kim', password='pass', netid='kim1', program='Alexander Technique')
+        User.objects.create_user(username='alexis', password='pass', netid='alexis1', is_active=False)
+        self.chess = Circle.objects.create(name='Chess Club')
+        self.climbing = Circle.objects.create(name='Rock Climbing')
+        Circle.objects.create(name='Cooking')
+
+    def tearDown(self):
+        circle_index.reset()
+
+    def test_users_ranked_by_username_prefix(self):
+        """Username prefixes first, shorter names first, inactive users hidden"""
+        self.client.force_authenticate(self.user)
+        resp = self.client.get('/api/autocomplete/', {'q': 'alex', 'type': 'users'})
+        self.assertEqual([u['username'] for u in resp.data['users']], ['alex', 'alexandra', 'kim'])
+
+    def test_short_queries_match_prefixes_only(self):
+        """Below three characters only prefixes match"""
+        self.client.force_authenticate(self.user)
+        resp = self.client.get('/api/autocomplete/', {'q': 'im', 'type': 'users'})
+        self.assertEqual(resp.data['users'], [])
+
+    def test_users_need_a_signed_in_reader(self):
+        """Anonymous visitors only get circles"""
+        resp = self.client.get('/api/autocomplete/', {'q': 'al'})
+        self.assertNotIn('users', resp.data)
+        self.assertIn('circles', resp.data)
+
+    def test_circles_match_any_word_prefix(self):
+        """Name prefixes rank before word prefixes"""
+        resp = self.client.get('/api/autocomplete/', {'q': 'c', 'type': 'circles'})
+        self.assertEqual([c['name'] for c in resp.data['circles']], ['Chess Club', 'Cooking', 'Rock Climbing'])
+        resp = self.client.get('/api/autocomplete/', {'q': 'rock cl', 'type': 'circles'})
+        self.assertEqual(resp.data['circles'], [{'id': self.climbing.id, 'name': 'Rock Climbing'}])
+
+    def test_circle_index_follows_committed_writes(self):
+        """Renames, creations and deletions reach the loaded index on commit"""
+        self.assertEqual(len(circle_index.search('ch')), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chess.name = 'Go Club'
+            self.chess.save()
+            Circle.objects.create(name='Choir')
+            self.climbing.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual([name for _, name in circle_index.search('c')], ['Choir', 'Cooking', 'Go Club'])
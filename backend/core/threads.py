@@ -0,0 +1,80 @@
+"""Materialized paths for comment threads.
+
+Every comment stores ``path``: the zero-padded ids of its ancestors and
+itself, ``SEGMENT_WIDTH`` digits each, root first. A comment's subtree is
+then the contiguous ``path`` range ``[path, successor(path))``, which one
+index range scan returns already in display order: depth-first, replies
+in the order they were written. ``depth`` (0 for top-level comments) lets
+the same query stop at a maximum depth.
+
+Paths contain nothing but digits, so they compare the same under any
+database collation. The path is assigned right after insert (the id is
+part of it) by core.signals; ``backfill_comment_paths`` fills in rows that
+predate it.
+"""
+
+from .models import Comment
+
+SEGMENT_WIDTH = 10
+# Replies nest at most this deep; the path column holds MAX_DEPTH + 1 segments.
+MAX_DEPTH = 24
+
+
+def segment(comment_id):
+    return str(comment_id).zfill(SEGMENT_WIDTH)
+
+
+def path_for(comment_id, parent_path=''):
+    return parent_path + segment(comment_id)
+
+
+def reply_position(parent_path, parent_depth):
+    """``(parent_id, parent_path, parent_depth)`` a reply to that comment is stored under.
+
+    A comment already at ``MAX_DEPTH`` cannot take replies; older threads
+    that nested deeper are flattened by attaching such replies to its parent
+    instead (the parent is the second-to-last path segment).
+    """
+    if parent_depth >= MAX_DEPTH:
+        parent_path, parent_depth = parent_path[:-SEGMENT_WIDTH], parent_depth - 1
+    return int(parent_path[-SEGMENT_WIDTH:]), parent_path, parent_depth
+
+
+def successor(path):
+    """Smallest path greater than every path in the subtree rooted at ``path``."""
+    head, last = path[:-SEGMENT_WIDTH], path[-SEGMENT_WIDTH:]
+    return head + segment(int(last) + 1)
+
+
+def assign_path(comment):
+    """Store ``path`` and ``depth`` for a freshly inserted comment.
+
+    The API refuses replies past ``MAX_DEPTH``; one made some other way (the
+    ORM, the admin) is re-attached where ``reply_position`` puts it, so its
+    path still fits the column.
+    """
+    if comment.parent_id is None:
+        parent_path, depth = '', 0
+    else:
+        parent = comment.parent
+        parent_id, parent_path, parent_depth = reply_position(parent.path, parent.depth)
+        if parent_id != parent.id:
+            comment.parent_id = parent_id
+        depth = parent_depth + 1
+    comment.path = path_for(comment.id, parent_path)
+    comment.depth = depth
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path, depth=depth, parent_id=comment.parent_id)
+
+
+def subtree(comment, max_depth=None):
+    """``comment`` and its descendants in display order, at most ``max_depth`` levels below it."""
+    comments = Comment.objects.filter(
+        post_id=comment.post_id, path__gte=comment.path, path__lt=successor(comment.path)
+    )
+    if max_depth is not None:
+        comments = comments.filter(depth__lte=comment.depth + max_depth)
+    return comments.order_by('path')
+
+
+def descendant_count(comment):
+    return subtree(comment).count() - 1
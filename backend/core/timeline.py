@@ -0,0 +1,129 @@
+"""Fan-out-on-write home timelines.
+
+Each reader has TimelineEntry rows for the posts they may see: public posts
+and posts in circles they belong to. Rows are pushed when a post is created
+(or moved to another circle) and when memberships change, so the home feed
+never recomputes visibility.
+
+Fan-out and backfill run later, in core.tasks, so the reader may have left
+the circle by the time they write. Circle entries are therefore inserted
+while the reader's membership row is locked and still present; leaving
+deletes that row before pruning, so whichever runs second sees the other.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import versions
+from .models import CircleMembership, Post, TimelineEntry
+
+# How many recent posts a new reader (or new circle member) is seeded with.
+BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 500)
+BATCH_SIZE = 1000
+
+
+def _insert(pairs):
+    """Bulk insert ``(user_id, post)`` pairs, skipping rows that already exist."""
+    entries = [TimelineEntry(user_id=user_id, post_id=post.id, created_at=post.created_at) for user_id, post in pairs]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def _recipient_ids(post):
+    if post.circle_id is not None:
+        return CircleMembership.objects.filter(circle_id=post.circle_id).values_list('user_id', flat=True)
+    return get_user_model().objects.values_list('id', flat=True)
+
+
+def add_author_entry(post):
+    """Put a post in its author's timeline right away, ahead of the fan-out."""
+    _insert([(post.user_id, post)])
+
+
+def _locked_members(circle_id, user_ids):
+    """Lock and return those of ``user_ids`` still in the circle (call inside a transaction)."""
+    members = CircleMembership.objects.select_for_update().filter(circle_id=circle_id, user_id__in=user_ids)
+    return set(members.values_list('user_id', flat=True))
+
+
+def _deliver(post, user_ids):
+    if post.circle_id is None:
+        _insert((user_id, post) for user_id in user_ids)
+        return
+    with transaction.atomic():
+        _insert((user_id, post) for user_id in _locked_members(post.circle_id, user_ids))
+
+
+def fan_out_post(post_id):
+    """Push a new post into the timeline of everyone who can see it."""
+    post = Post.objects.filter(pk=post_id).only('id', 'user_id', 'circle_id', 'created_at').first()
+    if post is None:
+        return
+    batch = []
+    for user_id in _recipient_ids(post).order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        batch.append(user_id)
+        if len(batch) >= BATCH_SIZE:
+            _deliver(post, batch)
+            batch = []
+    _deliver(post, batch)
+    # The post's own write bumped the feed before these entries existed.
+    versions.bump(versions.FEED)
+
+
+def filter_visible(queryset, user_id):
+    """Restrict a Post queryset to public posts and ``user_id``'s circles."""
+    member_circles = CircleMembership.objects.filter(user_id=user_id).values('circle_id')
+    return queryset.filter(Q(circle__isnull=True) | Q(circle__in=member_circles))
+
+
+def visible_posts(user_id, circle_id=None):
+    """Posts ``user_id`` may see, optionally restricted to one circle."""
+    if circle_id is not None:
+        return Post.objects.filter(circle_id=circle_id)
+    return filter_visible(Post.objects.all(), user_id)
+
+
+def backfill_user(user_id, circle_id=None):
+    """Seed a timeline with recent visible posts (all of them, or one circle's)."""
+    posts = visible_posts(user_id, circle_id).only('id', 'created_at').order_by('-created_at', '-id')[:BACKFILL_LIMIT]
+    if circle_id is None:
+        _insert((user_id, post) for post in posts)
+    else:
+        with transaction.atomic():
+            if _locked_members(circle_id, [user_id]):
+                _insert((user_id, post) for post in posts)
+    # Readers validate their home feed against their member stamp.
+    versions.bump(versions.member_key(user_id))
+
+
+def prune_post(post):
+    """Drop ``post`` from the timelines of readers who can no longer see it (after a move)."""
+    if post.circle_id is None:
+        return
+    members = CircleMembership.objects.filter(circle_id=post.circle_id).values('user_id')
+    TimelineEntry.objects.filter(post_id=post.id).exclude(user_id=post.user_id).exclude(user_id__in=members).delete()
+
+
+def prune_circle(user_id, circle_id):
+    """Drop a circle's posts from a timeline after the user leaves it."""
+    TimelineEntry.objects.filter(user_id=user_id, post__circle_id=circle_id).delete()
+
+
+def rebuild_user(user_id):
+    """Recreate a timeline from scratch (repair after lost fan-out work)."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    backfill_user(user_id)
+
+
+def timeline_posts(queryset, user):
+    """Restrict a Post queryset to ``user``'s timeline, newest first.
+
+    The feed position is annotated as ``feed_at``/``feed_post`` so ordering
+    and cursor filters hit the ``(user, created_at, post)`` index.
+    """
+    return (
+        queryset.filter(timeline_entries__user=user)
+        .annotate(feed_at=F('timeline_entries__created_at'), feed_post=F('timeline_entries__post_id'))
+        .order_by('-feed_at', '-feed_post')
+    )
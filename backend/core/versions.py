@@ -0,0 +1,143 @@
+"""Version stamps behind conditional GETs (ETag / Last-Modified).
+
+Writes bump a small set of keys (see core.signals):
+
+* ``feed``         any post, comment, like or membership change, and the
+                   timeline fan-out that follows a new post
+* ``post:<id>``    that post, its comments and likes
+* ``circle:<id>``  that circle, its members and its posts
+* ``circles``      the circle directory (circles and memberships)
+* ``users``        author profiles shown next to posts
+* ``member:<id>``  that user's circle memberships and timeline backfills
+
+Read endpoints derive their validators from the stamps of the keys they
+depend on, so answering ``If-None-Match`` costs one primary-key lookup and
+a ``304`` never touches the serializer.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import like_buffer
+from .models import ContentVersion
+
+FEED = 'feed'
+CIRCLES = 'circles'
+USERS = 'users'
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def circle_key(circle_id):
+    return f'circle:{circle_id}'
+
+
+def member_key(user_id):
+    return f'member:{user_id}'
+
+
+def bump(*keys):
+    """Advance the stamp of every key in ``keys``, creating missing ones."""
+    keys = set(keys)
+    if not keys:
+        return
+    now = timezone.now()
+    stamps = ContentVersion.objects.filter(key__in=keys)
+    if stamps.update(version=F('version') + 1, updated_at=now) < len(keys):
+        ContentVersion.objects.bulk_create(
+            [ContentVersion(key=key, version=0, updated_at=now) for key in keys], ignore_conflicts=True
+        )
+        # Bumping existing rows twice is harmless: stamps only need to change.
+        stamps.update(version=F('version') + 1, updated_at=now)
+
+
+def read(keys):
+    """``{key: (version, updated_at)}`` for the stamps that exist, in one query."""
+    rows = ContentVersion.objects.filter(key__in=keys).values_list('key', 'version', 'updated_at')
+    return {key: (version, updated_at) for key, version, updated_at in rows}
+
+
+def token(stamps, key):
+    """Cache-key fragment for ``key``'s stamp in a ``read()`` result.
+
+    The timestamp keeps tokens unique even if the stamp table is ever reset.
+    """
+    if key not in stamps:
+        return '0'
+    version, updated_at = stamps[key]
+    return f"{version}.{int(updated_at.timestamp() * 1000000)}"
+
+
+def current(request, key):
+    """``token()`` for ``key``, reusing the stamps this request already validated against."""
+    validated = getattr(request, '_version_stamps', None)
+    if validated is not None and key in validated[0]:
+        return token(validated[1], key)
+    return token(read([key]), key)
+
+
+def _viewer(request):
+    user = getattr(request, 'user', None)
+    if not user or not getattr(user, 'is_authenticated', False):
+        return 'anon'
+    return f"{user.pk}:{int(bool(user.is_staff))}{like_buffer.viewer_token(user.pk)}"
+
+
+def conditional(keys_func):
+    """View decorator answering conditional GETs from version stamps.
+
+    ``keys_func(request, *args, **kwargs)`` returns the keys the response
+    depends on (or None to skip validation). The ETag also covers the full
+    URL, the viewer (including likes they have buffered, see core.like_buffer)
+    and the ``Accept`` header, because the body varies with each of them.
+    Responses are marked ``private, no-cache`` so browsers revalidate
+    instead of reusing a stale copy.
+    """
+
+    def _stamps(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if not hasattr(request, '_version_stamps'):
+            keys = keys_func(request, *args, **kwargs)
+            request._version_stamps = None if keys is None else (sorted(keys), read(keys))
+        return request._version_stamps
+
+    def etag(request, *args, **kwargs):
+        stamps = _stamps(request, *args, **kwargs)
+        if stamps is None:
+            return None
+        keys, found = stamps
+        parts = [f"{key}={found.get(key, (0,))[0]}" for key in keys]
+        parts += [request.get_full_path(), _viewer(request), request.META.get('HTTP_ACCEPT', '')]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        stamps = _stamps(request, *args, **kwargs)
+        if stamps is None:
+            return None
+        # Keys without a stamp were never written, so they cannot be newer.
+        found = stamps[1]
+        if not found:
+            return None
+        return max(updated_at for _, updated_at in found.values())
+
+    def decorator(view):
+        validated = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = validated(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -4,33 +4,52 @@ from django.contrib.auth.decorators import (
         login_required,  # retained for future gated views (not used for public profile now)
 )
 from django.contrib.auth.tokens import default_token_generator
+from django.core.handlers.asgi import ASGIRequest
 from django.core.mail import send_mail
-from django.db import IntegrityError
-from django.db.models import Count
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.decorators.http import require_GET
 
 # DRF imports for Posts API
 from rest_framework import status, viewsets
-from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-
-from .models import Comment, Like, Post
-from .serializers import CommentSerializer, PostSerializer
+from rest_framework.utils.urls import replace_query_param
+
+from . import like_buffer, likes, live, membership, sparks, threads, versions
+from .autocomplete import MAX_RESULTS as MAX_SUGGESTIONS
+from .autocomplete import circle_index, suggest_users
+from .feed import REPLY_PREVIEW_SIZE, CommentTree, build_page_context, load_liked_post_ids, load_reply_previews
+from .models import CircleMembership, Comment, Post
+from .pagination import REPLY_ORDERING, CommentCursorPagination, PostCursorPagination, encode_position
+from .ranking import HOT_ORDERING
+from .search import MAX_RESULTS, search_post_ids
+from .serializers import (
+        CommentPreviewSerializer,
+        CommentSerializer,
+        PostListSerializer,
+        PostSerializer,
+        UserLiteSerializer,
+)
+from .timeline import timeline_posts
 
 """Profile-focused views only.
 
 Registration & email verification functionality has been removed per project
 direction. This module now provides:
  - profile_view: HTML profile page
- - profile_api_view: JSON stats endpoint (placeholder data until posts/comments added)
+ - profile_api_view: JSON stats endpoint
 
-Future work will replace mock stats with real counts and extend user fields.
+Stats are the viewer's real post, comment and received-like counts, read
+from the incrementally maintained UserStats row (see core.sparks).
 """
 
 User = get_user_model()
@@ -52,23 +71,19 @@ def _calc_level(score: int):
         for r in LEVELS:
                 if r["min"] <= score <= r["max"]:
                         return r
-        return LEVELS[0]
+        # Real counts can run past the top band; they stay at the top level.
+        return LEVELS[-1] if score > LEVELS[-1]["max"] else LEVELS[0]
 
 # ============================================================================
 # VIEWS: PROFILE
 # ============================================================================
 
-def profile_view(request):
-    """Render the user profile page"""
-    # Mock statistics (will be replaced with real data once posts/comments features are ready)
-    stats = {
-        "posts": 3,
-        "comments": 4,
-        "likes": 10,
-    }
+def _sparks_stats(user):
+    """Posts, comments and likes received for ``user``, plus the Agora Sparks score and level."""
+    stats = sparks.counts(user)
 
     # Calculate Agora Sparks score
-    score = stats["posts"] * 5 + stats["comments"] * 2 + stats["likes"]
+    score = sparks.score(stats["posts"], stats["comments"], stats["likes"])
     level = _calc_level(score)
 
     # Add score and level to stats
@@ -77,6 +92,12 @@ def profile_view(request):
         "level_name": level["name"],
         "level_hint": level["hint"]
     })
+    return stats
+
+
+def profile_view(request):
+    """Render the user profile page"""
+    stats = _sparks_stats(request.user)
 
     return render(request, "profile.html", {"stats": stats})
 
@@ -95,23 +116,7 @@ def my_comments_view(request):
 
 def profile_api_view(request):
     """API endpoint for profile data (JSON)"""
-    # Mock statistics (can be replaced with real data from database)
-    stats = {
-        "posts": 3,
-        "comments": 4,
-        "likes": 10,
-    }
-
-    # Calculate Agora Sparks score
-    score = stats["posts"] * 5 + stats["comments"] * 2 + stats["likes"]
-    level = _calc_level(score)
-
-    # Add score and level to stats
-    stats.update({
-        "score": score,
-        "level_name": level["name"],
-        "level_hint": level["hint"]
-    })
+    stats = _sparks_stats(request.user)
 
     # If user is authenticated, include basic user info and preferences
     user_data = None
@@ -327,14 +332,59 @@ def verify_email_view(request, uidb64, token):
 # Posts API (for React frontend)
 # =============================
 
+def _csv_param(request, name):
+    """Parse a comma-separated query parameter into a set (None when absent)."""
+    raw = request.query_params.get(name)
+    if raw is None:
+        return None
+    return {part.strip() for part in raw.split(',') if part.strip()}
+
+
+def _post_list_versions(request, *args, **kwargs):
+    # A circle's feed only changes with that circle; every other listing follows the global feed.
+    circle_id = request.query_params.get('circle')
+    scope = versions.circle_key(circle_id) if circle_id else versions.FEED
+    keys = [scope, versions.USERS]
+    if request.user and request.user.is_authenticated:
+        # Validating against the viewer's memberships also primes core.membership.
+        keys.append(versions.member_key(request.user.id))
+    return keys
+
+
+def _post_detail_versions(request, pk=None, **kwargs):
+    return [versions.post_key(pk), versions.USERS]
+
+
+# Ids accepted by one /api/posts/state/ call.
+MAX_STATE_IDS = 300
+
+
 class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at').annotate(likes_count=Count('likes'))
+    queryset = Post.objects.all().order_by('-created_at', '-id')
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = PostCursorPagination
+
+    @method_decorator(versions.conditional(_post_list_versions))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(versions.conditional(_post_detail_versions))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Post.objects.all().order_by('-created_at').annotate(likes_count=Count('likes'))
+        queryset = self._visible_queryset()
+        if self.action == 'list':
+            queryset = self._trim_columns(queryset)
+            if not self._paginated():
+                # The legacy bare list keeps its shape but never serializes the whole table.
+                queryset = queryset[:self.paginator.max_page_size]
+        return queryset
+
+    def _visible_queryset(self):
+        queryset = Post.objects.select_related('user').order_by('-created_at', '-id')
         # If filtering by circle, enforce membership visibility: non-members (and non-staff)
         # should not see posts from private circles.
         circle_id = self.request.query_params.get('circle')
@@ -344,39 +394,211 @@ class PostViewSet(viewsets.ModelViewSet):
             except Exception:
                 return queryset.none()
             queryset = queryset.filter(circle_id=circle_id_int)
+            # Staff can always see; anonymous readers and non-members get an empty queryset
+            if not membership.can_see_circle(self.request, circle_id_int):
+                return queryset.none()
+            return self._order_feed(queryset)
+        # Home feed: signed-in readers get their materialized timeline (public posts plus
+        # their circles'), staff see everything and anonymous visitors only public posts.
+        if self.action == 'list':
             user = getattr(self.request, 'user', None)
-            # Staff can always see
-            if user and getattr(user, 'is_staff', False):
-                return queryset
-            # If user is not authenticated or not a member, return empty queryset
             if not user or not getattr(user, 'is_authenticated', False):
-                return queryset.none()
-            from core.models import CircleMembership
-            is_member = CircleMembership.objects.filter(circle_id=circle_id_int, user=user).exists()
-            if not is_member:
-                return queryset.none()
+                return self._order_feed(queryset.filter(circle__isnull=True))
+            if not user.is_staff:
+                if self._feed() == 'top':
+                    circle_ids = membership.circle_ids(self.request)
+                    return self._order_feed(queryset.filter(Q(circle__isnull=True) | Q(circle_id__in=circle_ids)))
+                self.cursor_ordering = ('-feed_at', '-feed_post')
+                return timeline_posts(queryset, user)
+        return self._order_feed(queryset)
+
+    def _trim_columns(self, queryset):
+        # With ?fields=, load only the columns those fields need (plus what redaction
+        # and the cursor read) and skip the author join when `user` is not wanted.
+        wanted = _csv_param(self.request, 'fields')
+        if wanted is None:
+            return queryset
+        wanted |= _csv_param(self.request, 'include') or set()
+        concrete = {f.name for f in Post._meta.concrete_fields}
+        columns = {'id', 'user', 'is_anonymous', 'created_at', 'hot_score'} | (wanted & concrete)
+        if 'user' not in wanted:
+            queryset = queryset.select_related(None)
+        return queryset.only(*columns)
+
+    def _feed(self):
+        return self.request.query_params.get('feed') if self.action == 'list' else None
+
+    def _order_feed(self, queryset):
+        # ?feed=top ranks by the precomputed hot score (an index scan, no aggregate sort).
+        if self._feed() == 'top':
+            self.cursor_ordering = HOT_ORDERING
+            return queryset.order_by(*HOT_ORDERING)
         return queryset
 
+    def _paginated(self):
+        params = self.request.query_params
+        paginator = self.paginator
+        return paginator is not None and (
+            paginator.cursor_query_param in params or paginator.page_size_query_param in params
+        )
+
+    def paginate_queryset(self, queryset):
+        # Cursor pagination is opt-in: clients that send ?cursor= or ?page_size= get
+        # capped pages with a `next` link, older callers still receive a bare list of
+        # at most `max_page_size` of the newest posts (see get_queryset).
+        if not self._paginated():
+            return None
+        return super().paginate_queryset(queryset)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
+        # Sparse fieldsets: ?fields=id,title,... and ?include=comments,liked
+        context['fields'] = _csv_param(self.request, 'fields')
+        context['include'] = _csv_param(self.request, 'include')
         return context
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
-    def like(self, request, pk=None):
+    def get_serializer_class(self):
+        # Feed lists carry a comment count and preview; the full thread is paginated
+        # separately under /api/posts/{id}/comments/.
+        if self.action == 'list':
+            return PostListSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        # When rendering existing posts, preload what the serializer would otherwise
+        # query per post (comment trees or previews, liked flags) once for the whole
+        # page, and only for the fields that will actually be rendered. Posts that
+        # render comments come from the shared representation cache when possible.
+        if not args or 'data' in kwargs:
+            return super().get_serializer(*args, **kwargs)
+        many = kwargs.get('many', False)
+        posts = list(args[0]) if many else [args[0]]
+        if many:
+            args = (posts,) + args[1:]
+        context = kwargs.setdefault('context', self.get_serializer_context())
+        serializer = super().get_serializer(*args, **kwargs)
+        rendered = serializer.child if many else serializer
+        context.update(build_page_context(posts, self.request, rendered.fields, type(rendered).__name__))
+        return serializer
+
+    @action(detail=True, methods=['get'], url_path='comments', pagination_class=CommentCursorPagination)
+    def comments(self, request, pk=None):
+        """Cursor-paginated comment threads of one post.
+
+        Without ``?parent=`` returns top-level comments (newest first), each with its
+        first few replies and a ``replies_next`` link; ``?parent=<comment id>`` pages
+        through the rest of that thread oldest first. ``?thread=<comment id>`` returns
+        that comment with its whole reply tree (``&depth=N`` stops N levels below it)
+        and ``descendants_count``, fetched with one range query over comment paths.
+        """
         post = self.get_object()
+        if post.circle_id is not None and not membership.can_see_circle(request, post.circle_id):
+            raise NotFound()
+        paginator = self.paginator
+        context = self.get_serializer_context()
+        queryset = Comment.objects.filter(post=post).select_related('user')
+
+        thread = request.query_params.get('thread')
+        if thread:
+            try:
+                root = Comment.objects.only('id', 'post_id', 'path', 'depth').get(post=post, pk=int(thread))
+                depth = request.query_params.get('depth')
+                depth = None if depth in (None, '') else max(0, int(depth))
+            except (TypeError, ValueError, Comment.DoesNotExist):
+                raise NotFound('Unknown comment thread') from None
+            rows = list(threads.subtree(root, depth).select_related('user'))
+            context['comment_tree'] = CommentTree(rows)
+            data = CommentSerializer(rows[0], context=context).data
+            data['descendants_count'] = len(rows) - 1 if depth is None else threads.descendant_count(root)
+            return Response(data)
+
+        parent = request.query_params.get('parent')
+        if parent:
+            try:
+                queryset = queryset.filter(parent_id=int(parent))
+            except (TypeError, ValueError):
+                raise NotFound('Unknown comment thread') from None
+            self.cursor_ordering = REPLY_ORDERING
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            return paginator.get_paginated_response(CommentPreviewSerializer(page, many=True, context=context).data)
+
+        page = paginator.paginate_queryset(queryset.filter(parent__isnull=True), request, view=self)
+        # One extra reply per thread tells us whether a "load more replies" link is needed.
+        previews = load_reply_previews([c.id for c in page], REPLY_PREVIEW_SIZE + 1)
+        shown = {parent_id: replies[:REPLY_PREVIEW_SIZE] for parent_id, replies in previews.items()}
+        context['comment_tree'] = CommentTree(reply for replies in shown.values() for reply in replies)
+        data = CommentSerializer(page, many=True, context=context).data
+
+        thread_url = request.build_absolute_uri(request.path)
+        for item in data:
+            replies = previews.get(item['id'], [])
+            item['replies_next'] = None
+            if len(replies) > REPLY_PREVIEW_SIZE:
+                url = replace_query_param(thread_url, 'parent', item['id'])
+                item['replies_next'] = replace_query_param(
+                    url, paginator.cursor_query_param, encode_position(replies[REPLY_PREVIEW_SIZE - 1], REPLY_ORDERING)
+                )
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'], url_path='state')
+    def state(self, request):
+        """Live counters for posts already on screen: ``GET /api/posts/state/?ids=1,2,3``.
+
+        Returns ``likes_count``, ``comments_count`` and ``liked`` for up to
+        ``MAX_STATE_IDS`` posts, in the requested order. Posts that do not
+        exist or that the reader may not see are left out.
+        """
+        try:
+            raw = (request.query_params.get('ids') or '').split(',')
+            ids = list(dict.fromkeys(int(part) for part in raw if part.strip()))
+        except ValueError:
+            raise ValidationError({'ids': 'Expected a comma-separated list of post ids.'}) from None
+        if len(ids) > MAX_STATE_IDS:
+            raise ValidationError({'ids': f'At most {MAX_STATE_IDS} ids per request.'})
+        posts = Post.objects.filter(pk__in=ids)
+        user = request.user
+        if not user.is_authenticated:
+            posts = posts.filter(circle__isnull=True)
+        elif not user.is_staff:
+            # A subquery rather than core.membership: keeps this poll at two queries.
+            member_of = CircleMembership.objects.filter(user=user).values('circle_id')
+            posts = posts.filter(Q(circle__isnull=True) | Q(circle_id__in=member_of))
+        counters = {
+            post_id: (likes_count, comments_count)
+            for post_id, likes_count, comments_count in posts.values_list('id', 'likes_count', 'comments_count')
+        }
+        liked = load_liked_post_ids(user, counters)
+        pending = like_buffer.pending_deltas(counters) if like_buffer.enabled() else {}
+        return Response({'results': [
+            {
+                'id': post_id,
+                'likes_count': counters[post_id][0] + pending.get(post_id, 0),
+                'comments_count': counters[post_id][1],
+                'liked': post_id in liked,
+            }
+            for post_id in ids if post_id in counters
+        ]})
+
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticatedOrReadOnly])
+    def like(self, request, pk=None):
+        """POST toggles the viewer's like; PUT likes and DELETE unlikes, so retries are safe.
+
+        The post is not loaded: core.likes writes the Like row and the counter
+        and returns both in one statement.
+        """
         user = request.user
         if not user or not user.is_authenticated:
             return Response({'detail': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
-
-        like, created = Like.objects.get_or_create(user=user, post=post)
-        if not created:
-            like.delete()
-            liked = False
-        else:
-            liked = True
-
-        likes_count = post.likes.count()
+        try:
+            post_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound() from None
+        write = {'POST': likes.toggle, 'PUT': likes.like, 'DELETE': likes.unlike}[request.method]
+        result = write(user.id, post_id)
+        if result is None:
+            raise NotFound()
+        liked, likes_count = result
         return Response({'liked': liked, 'likes_count': likes_count})
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
@@ -392,7 +614,8 @@ class PostViewSet(viewsets.ModelViewSet):
         # We no longer inject `post` into the incoming data; instead we attach it on save.
         serializer = CommentSerializer(data=data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(user=user, post=post)
+            with transaction.atomic():
+                serializer.save(user=user, post=post)
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
@@ -407,10 +630,8 @@ class PostViewSet(viewsets.ModelViewSet):
             is_anonymous = not bool(getattr(user, 'post_with_real_name', False))
         # If posting to a circle, require membership (unless staff)
         circle = serializer.validated_data.get('circle')
-        if circle is not None and not user.is_staff:
-            from core.models import CircleMembership
-            if not CircleMembership.objects.filter(circle=circle, user=user).exists():
-                raise PermissionDenied('Must be a member of the circle to post')
+        if circle is not None and not membership.can_see_circle(self.request, circle.id):
+            raise PermissionDenied('Must be a member of the circle to post')
 
         serializer.save(user=user, is_anonymous=is_anonymous)
 
@@ -424,5 +645,127 @@ class PostViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_view(request):
+    """Full-text search: ``GET /api/search/?q=<words>[&limit=N]``.
+
+    Matches post titles, post bodies and comments (a comment match returns its
+    post), best match first, limited to posts the reader may see. Results use
+    the feed representation.
+    """
+    query = (request.query_params.get('q') or '').strip()
+    try:
+        limit = int(request.query_params.get('limit') or 20)
+    except (TypeError, ValueError):
+        limit = 20
+    limit = max(1, min(limit, MAX_RESULTS))
+    if not query:
+        return Response({'query': query, 'results': []})
+
+    post_ids = search_post_ids(query, request.user, limit)
+    found = Post.objects.select_related('user').in_bulk(post_ids)
+    posts = [found[post_id] for post_id in post_ids if post_id in found]
+    context = {'request': request, 'fields': None, 'include': None}
+    serializer = PostListSerializer(posts, many=True, context=context)
+    context.update(build_page_context(posts, request, serializer.child.fields, 'PostListSerializer'))
+    return Response({'query': query, 'results': serializer.data})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete_view(request):
+    """Typeahead: ``GET /api/autocomplete/?q=<prefix>[&type=users|circles][&limit=N]``.
+
+    Circles are open to everyone; user suggestions (for mentions) require a
+    signed-in reader and are omitted otherwise.
+    """
+    query = (request.query_params.get('q') or '').strip()
+    kind = request.query_params.get('type')
+    try:
+        limit = int(request.query_params.get('limit') or MAX_SUGGESTIONS)
+    except (TypeError, ValueError):
+        limit = MAX_SUGGESTIONS
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+    data = {}
+    if kind in (None, 'circles'):
+        data['circles'] = [{'id': circle_id, 'name': name} for circle_id, name in circle_index.search(query, limit)]
+    if kind in (None, 'users') and request.user and request.user.is_authenticated:
+        data['users'] = UserLiteSerializer(suggest_users(query, limit), many=True).data
+    return Response(data)
+
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def leaderboard_view(request):
+    """Agora Sparks leaderboard: ``GET /api/leaderboard/[?circle=<id>][&limit=N][&user=<id>]``.
+
+    Returns the top ``limit`` users by score (the members of ``circle`` when
+    given) and ``rank``: the rank and score of ``user``, the reader by
+    default, or null when that user is not on the board. Signed-in readers
+    only; a circle's board is visible to its members.
+    """
+    if not request.user or not request.user.is_authenticated:
+        return Response({'detail': 'Authentication required'}, status=401)
+    params = request.query_params
+    try:
+        circle_id = int(params['circle']) if params.get('circle') else None
+        user_id = int(params['user']) if params.get('user') else request.user.id
+        limit = int(params.get('limit') or 20)
+    except ValueError:
+        raise ValidationError({'detail': 'circle, user and limit must be integers.'}) from None
+    limit = max(1, min(limit, sparks.MAX_LEADERS))
+    if circle_id is not None and circle_id not in membership.circle_ids(request) and not request.user.is_staff:
+        raise PermissionDenied('Only members can see a circle\'s leaderboard.')
+
+    user = request.user if user_id == request.user.id else User.objects.filter(pk=user_id).first()
+    if user is None:
+        raise NotFound('User not found.')
+    ranked = sparks.rank(user, circle_id)
+    return Response({
+        'circle': circle_id,
+        'results': [
+            {
+                'rank': position,
+                'score': stats.score,
+                'level_name': _calc_level(stats.score)['name'],
+                'user': UserLiteSerializer(stats.user).data,
+            }
+            for position, stats in sparks.top(limit, circle_id)
+        ],
+        'rank': None if ranked is None else {'user_id': user.id, 'rank': ranked[0], 'score': ranked[1]},
+    })
+
+
+@require_GET
+async def live_view(request):
+    """Live post updates as Server-Sent Events: ``GET /api/live/?ids=1,2,3``.
+
+    Streams ``update`` frames for the listed posts (at most
+    ``MAX_STATE_IDS``, like ``/api/posts/state/``) and for new posts the
+    reader may see; see core.live. Browsers resume with the ``Last-Event-ID``
+    header on reconnect; ``?last_event_id=`` does the same for a fresh
+    ``EventSource``. Needs the ASGI server (agora_backend.asgi).
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Live updates are only served by the ASGI application.'}, status=501)
+    try:
+        raw = (request.GET.get('ids') or '').split(',')
+        ids = list(dict.fromkeys(int(part) for part in raw if part.strip()))
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return JsonResponse({'ids': 'Expected a comma-separated list of post ids.'}, status=400)
+    if len(ids) > MAX_STATE_IDS:
+        return JsonResponse({'ids': f'At most {MAX_STATE_IDS} ids per request.'}, status=400)
+    user = await request.auser()
+    response = StreamingHttpResponse(live.stream(user, ids, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Registration & email verification views removed.
 # (register_view, email_verification_view, email_verification_confirm_view, email_verification_api_view)
@@ -1,9 +1,17 @@
 from rest_framework import generics, pagination
 
-from .models import Post
+from .models import Like, Post
 from .serializers import PostSerializer
 
 
+def _csv_param(request, name):
+    """Parse a comma-separated query parameter into a set (None when absent)."""
+    raw = request.query_params.get(name)
+    if raw is None:
+        return None
+    return {part.strip() for part in raw.split(',') if part.strip()}
+
+
 class StandardResultsSetPagination(pagination.PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
@@ -16,6 +24,14 @@ class PostListAPIView(generics.ListAPIView):
 
     def get_queryset(self):
         queryset = Post.objects.select_related('user').order_by('-created_at')
+        # ?fields= trims the columns loaded (and the author join when `user` is not wanted)
+        wanted = _csv_param(self.request, 'fields')
+        if wanted is not None:
+            wanted |= _csv_param(self.request, 'include') or set()
+            concrete = {f.name for f in Post._meta.concrete_fields}
+            if 'user' not in wanted:
+                queryset = queryset.select_related(None)
+            queryset = queryset.only(*({'id', 'user', 'created_at'} | (wanted & concrete)))
         # support feed param: 'new' -> newest first, 'all' -> default ordering
         feed = self.request.query_params.get('feed')
         if feed == 'new':
@@ -25,6 +41,29 @@ class PostListAPIView(generics.ListAPIView):
             return queryset
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Sparse fieldsets: ?fields=id,title,... and ?include=comments,liked
+        context['fields'] = _csv_param(self.request, 'fields')
+        context['include'] = _csv_param(self.request, 'include')
+        return context
+
+    def get_serializer(self, *args, **kwargs):
+        # Resolve the viewer's likes for the whole page in one query instead of one per post,
+        # unless the client did not ask for `liked`.
+        if kwargs.get('many') and args:
+            posts = list(args[0])
+            args = (posts,) + args[1:]
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            serializer = super().get_serializer(*args, **kwargs)
+            user = self.request.user
+            if 'liked' in serializer.child.fields and user and user.is_authenticated:
+                context['liked_post_ids'] = set(
+                    Like.objects.filter(user=user, post_id__in=[p.id for p in posts]).values_list('post_id', flat=True)
+                )
+            return serializer
+        return super().get_serializer(*args, **kwargs)
+
 
 class PostDetailAPIView(generics.RetrieveAPIView):
     queryset = Post.objects.select_related('user')
@@ -47,7 +47,21 @@ class CommentSerializer(serializers.ModelSerializer):
         return data
 
 
-class PostSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Render only the fields requested via the ``fields`` / ``include`` context sets."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        wanted = self.context.get('fields')
+        if wanted is not None:
+            wanted = wanted | (self.context.get('include') or set()) | {'id'}
+            for name in list(fields):
+                if name not in wanted:
+                    fields.pop(name)
+        return fields
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserLiteSerializer(read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
     liked = serializers.SerializerMethodField()
@@ -61,6 +75,9 @@ class PostSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user or not request.user.is_authenticated:
             return False
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
         return obj.likes.filter(user=request.user).exists()
 
     def get_comments(self, obj):
@@ -42,6 +42,11 @@ run_test "Circles API Tests" "core.tests.test_circles"
 run_test "Model Tests" "core.tests.test_models"
 run_test "View Tests" "core.tests.test_views"
 run_test "Serializer Tests" "core.tests.test_serializers"
+run_test "Feed Tests" "core.tests.test_feed"
+run_test "Search Tests" "core.tests.test_search"
+run_test "Batch Tests" "core.tests.test_batch"
+run_test "Chat Tests" "core.tests.test_chat"
+run_test "Live Update Tests" "core.tests.test_live"
 
 echo "========================================="
 echo "Test Summary Complete"
@@ -53,3 +58,8 @@ echo "  python manage.py test core.tests.test_circles --settings=$SETTINGS"
 echo "  python manage.py test core.tests.test_models --settings=$SETTINGS"
 echo "  python manage.py test core.tests.test_views --settings=$SETTINGS"
 echo "  python manage.py test core.tests.test_serializers --settings=$SETTINGS"
+echo "  python manage.py test core.tests.test_feed --settings=$SETTINGS"
+echo "  python manage.py test core.tests.test_search --settings=$SETTINGS"
+echo "  python manage.py test core.tests.test_batch --settings=$SETTINGS"
+echo "  python manage.py test core.tests.test_chat --settings=$SETTINGS"
+echo "  python manage.py test core.tests.test_live --settings=$SETTINGS"